@@ -295,6 +295,9 @@ class ExpMember:
             raise TypeError("should_be_shown must be an instance of bool")
         self._should_be_shown = b
 
+        if self.section is not None:
+            self.section._tree_changed()
+
     @property
     def title(self) -> str:
         """
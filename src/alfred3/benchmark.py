@@ -0,0 +1,364 @@
+"""
+Load benchmark and simulator for quotas and randomizers.
+
+The simulator runs many experiment sessions concurrently against a
+:class:`~alfred3.quota.SessionQuota` or :class:`~alfred3.randomizer.ListRandomizer`.
+Each simulated session asks for a slot and then finishes, aborts, or
+times out at configurable rates. Sessions are lightweight stand-ins for
+:class:`~alfred3.experiment.ExperimentSession` objects, providing only
+what quotas and randomizers need. Data is stored either locally, or in
+a mongo collection (by default a :mod:`mongomock` collection).
+
+Usage::
+
+    from alfred3.benchmark import simulate
+
+    result = simulate(conditions=[("a", 50), ("b", 50)], sessions=300, concurrency=20)
+    print(result)
+
+The same benchmark is available on the command line::
+
+    $ alfred3 quota-benchmark --conditions a:50,b:50 --sessions 300
+"""
+
+import time
+import random
+import logging
+import tempfile
+import threading
+from configparser import ConfigParser
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Tuple
+from uuid import uuid4
+
+from . import quota as quota_module
+from .quota import SessionQuota
+from .randomizer import ListRandomizer
+from .data_manager import DataManager
+from .saving_agent import SavingMetrics, SessionIndex, write_json_atomic
+
+
+class SimulatedSession:
+    """
+    Stand-in for an experiment session in quota benchmarks.
+
+    Args:
+        env (_Environment): The simulated deployment.
+        session_id (str): The session id.
+    """
+
+    def __init__(self, env, session_id: str):
+        self.env = env
+        self.exp_id = "benchmark"
+        self.version = "1.0"
+        self.session_id = session_id
+        self.config = env.config
+        self.secrets = env.secrets
+        self.session_timeout = env.session_timeout
+        self.log = logging.getLogger(__name__)
+        self.aborted = False
+        self.aborted_because = None
+        self.start_time = time.time()
+
+    @property
+    def db_main(self):
+        return self.env.collection
+
+    @property
+    def db_misc(self):
+        return self.env.collection
+
+    def subpath(self, path) -> Path:
+        path = Path(path)
+        return path if path.is_absolute() else self.env.directory / path
+
+    def abort(self, reason: str, **kwargs):
+        self.aborted = True
+        self.aborted_because = reason
+
+    def append_plugin_data_query(self, query):
+        pass
+
+    def save(self, finished: bool = False, aborted: bool = False):
+        """Saves the session's status, like a saving agent would."""
+        doc = {
+            "exp_id": self.exp_id,
+            "exp_version": self.version,
+            "exp_session_id": self.session_id,
+            "type": DataManager.EXP_DATA,
+            "exp_start_time": self.start_time,
+            "exp_save_time": time.time(),
+            "exp_finished": finished,
+            "exp_aborted": aborted,
+        }
+
+        if self.env.collection is not None:
+            q = {"exp_session_id": self.session_id, "type": DataManager.EXP_DATA}
+            self.env.collection.replace_one(q, doc, upsert=True)
+            return
+
+        directory = self.subpath(self.config.get("local_saving_agent", "path"))
+        filename = f"{self.session_id}.json"
+        write_json_atomic(directory / filename, doc, fsync="never")
+        SessionIndex.get(directory).update(doc, file=filename)
+
+
+class _SerializedCollection:
+    """
+    Wraps a collection, such that only one operation runs at a time.
+    Mongomock is not thread-safe, while single operations on a real
+    MongoDB are atomic.
+    """
+
+    def __init__(self, collection):
+        self._collection = collection
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            with self._lock:
+                result = attr(*args, **kwargs)
+                # cursors are evaluated lazily
+                return list(result) if name == "find" else result
+
+        return call
+
+
+class _Environment:
+    """Configuration and storage shared by all simulated sessions."""
+
+    def __init__(self, directory: Path, collection, session_timeout: int):
+        self.directory = directory
+        self.collection = collection
+        self.session_timeout = session_timeout
+
+        self.config = ConfigParser()
+        self.config.read_dict(
+            {
+                "data": {"save_directory": "save"},
+                "local_saving_agent": {"use": "true", "path": "save/exp", "fsync": "never"},
+            }
+        )
+        if directory is not None:
+            (directory / "save" / "exp").mkdir(parents=True, exist_ok=True)
+
+        self.secrets = ConfigParser()
+        self.secrets.read_dict({"mongo_saving_agent": {"use": str(collection is not None)}})
+
+
+@dataclass
+class BenchmarkResult:
+    """
+    Results of a quota benchmark.
+
+    Attributes:
+        storage (str): 'local' or 'mongo'.
+        sessions (int): Number of simulated sessions.
+        concurrency (int): Number of concurrently running sessions.
+        latency (dict): Allocation latency in seconds (count, mean, p50,
+            p95 and max), measured from the initialization of the quota
+            until a slot is assigned or the session is turned away.
+        lock_wait (dict): Lock wait times in seconds (count, mean, p50,
+            p95, and max). Empty, if no locks were acquired.
+        conflicts (int): Number of optimistic updates that failed,
+            because another session changed the quota data first.
+        targets (dict): Number of slots per label.
+        allocated (dict): Number of sessions that received each label.
+        finished (dict): Number of finished sessions per label.
+        rejected (int): Number of sessions that were turned away,
+            because the quota was full.
+    """
+
+    storage: str
+    sessions: int
+    concurrency: int
+    latency: dict
+    lock_wait: dict
+    conflicts: int
+    targets: dict
+    allocated: dict = field(default_factory=dict)
+    finished: dict = field(default_factory=dict)
+    rejected: int = 0
+
+    @property
+    def overbooked(self) -> int:
+        """int: Number of finished sessions beyond the slots of their label."""
+        return sum(max(0, self.finished.get(label, 0) - n) for label, n in self.targets.items())
+
+    @property
+    def balance(self) -> float:
+        """
+        float: Accuracy of the distribution of finished sessions across
+        labels, compared to the distribution of slots. 1 is perfect
+        balance, 0 means that no finished session had a target label.
+        """
+        nfinished = sum(self.finished.values())
+        if not nfinished:
+            return 1.0
+
+        ntargets = sum(self.targets.values())
+        labels = set(self.targets) | set(self.finished)
+        distance = sum(
+            abs(self.finished.get(label, 0) / nfinished - self.targets.get(label, 0) / ntargets)
+            for label in labels
+        )
+        return 1 - distance / 2
+
+    def __str__(self) -> str:
+        lines = [
+            f"Quota benchmark: {self.sessions} sessions, {self.concurrency} concurrent, {self.storage} storage",
+            "Allocation latency (ms): " + self._format(self.latency),
+            "Lock wait (ms):          " + (self._format(self.lock_wait) if self.lock_wait else "-"),
+            f"Update conflicts:        {self.conflicts}",
+            f"Rejected sessions:       {self.rejected}",
+            f"Overbooked slots:        {self.overbooked}",
+            f"Balance accuracy:        {self.balance:.3f}",
+            "Label      slots  allocated  finished",
+        ]
+        for label, n in self.targets.items():
+            allocated = self.allocated.get(label, 0)
+            finished = self.finished.get(label, 0)
+            lines.append(f"{label:<10} {n:>5}  {allocated:>9}  {finished:>8}")
+        return "\n".join(lines)
+
+    @staticmethod
+    def _format(summary: dict) -> str:
+        values = [f"{key}={summary[key] * 1000:.1f}" for key in ("mean", "p50", "p95", "max")]
+        return f"n={summary['count']} " + " ".join(values)
+
+
+def simulate(
+    nslots: int = None,
+    conditions: List[Tuple[str, int]] = None,
+    sessions: int = 100,
+    concurrency: int = 10,
+    finish_rate: float = 0.8,
+    abort_rate: float = 0.1,
+    timeout_rate: float = 0.1,
+    inclusive: bool = False,
+    storage: str = "local",
+    collection=None,
+    directory=None,
+    seed=None,
+) -> BenchmarkResult:
+    """
+    Simulates concurrent sessions using a quota or randomizer.
+
+    Each session saves its data, asks for a slot, and then finishes,
+    aborts, or times out. The outcome is drawn according to the given
+    rates. Timed out sessions are saved with a start time that lies
+    beyond the session timeout.
+
+    Args:
+        nslots: Number of slots of a :class:`~alfred3.quota.SessionQuota`.
+        conditions: Conditions and their number of slots for a
+            :class:`~alfred3.randomizer.ListRandomizer`, e.g.
+            ``[("a", 10), ("b", 10)]``. If specified, *nslots* is
+            ignored.
+        sessions: Number of simulated sessions.
+        concurrency: Number of sessions running at the same time.
+        finish_rate, abort_rate, timeout_rate: Relative frequencies of
+            the possible outcomes of sessions that received a slot.
+        inclusive: Passed on to the quota or randomizer.
+        storage: 'local' or 'mongo'.
+        collection: Collection for mongo storage. Defaults to a
+            :mod:`mongomock` collection, which requires the mongomock
+            package.
+        directory: Directory for local storage. Defaults to a temporary
+            directory.
+        seed: Random seed for session outcomes and the randomizer.
+
+    Returns:
+        BenchmarkResult: The benchmark results.
+    """
+    if storage not in ("local", "mongo"):
+        raise ValueError("Parameter 'storage' must be 'local' or 'mongo'.")
+
+    if conditions is None and nslots is None:
+        raise ValueError("You must specify either 'nslots' or 'conditions'.")
+
+    if storage == "mongo" and collection is None:
+        try:
+            import mongomock
+        except ImportError:
+            raise ImportError("Mongo benchmarks without a collection require the 'mongomock' package.")
+        collection = _SerializedCollection(mongomock.MongoClient().benchmark.data)
+
+    seed = seed if seed is not None else time.time()
+    tmp = None
+    if storage == "local" and directory is None:
+        tmp = tempfile.TemporaryDirectory()
+        directory = tmp.name
+
+    env = _Environment(
+        Path(directory) if directory else None,
+        collection if storage == "mongo" else None,
+        session_timeout=60 * 60,
+    )
+    targets = dict(conditions) if conditions else {"slot": nslots}
+    outcomes = ["finish", "abort", "timeout"]
+    weights = [finish_rate, abort_rate, timeout_rate]
+
+    latency = SavingMetrics(window=sessions)
+    quota_module.lock_metrics.reset()
+    quota_module.conflicts.clear()
+
+    def run_session(i: int) -> tuple:
+        session = SimulatedSession(env, f"sid-{uuid4().hex}")
+        session.save()
+
+        start = time.perf_counter()
+        if conditions:
+            rd = ListRandomizer(*conditions, exp=session, inclusive=inclusive, random_seed=seed)
+            label = rd.get_condition()
+        else:
+            label = SessionQuota(nslots, session, inclusive=inclusive).count()
+        latency.record("allocation", time.perf_counter() - start)
+
+        if session.aborted:
+            session.save(aborted=True)
+            return None, None
+
+        outcome = random.Random(f"{seed}-{i}").choices(outcomes, weights)[0]
+        if outcome == "finish":
+            session.save(finished=True)
+        elif outcome == "abort":
+            session.save(aborted=True)
+        else:
+            session.start_time -= env.session_timeout + 1
+            session.save()
+
+        return label, outcome
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(run_session, range(sessions)))
+    finally:
+        if tmp is not None:
+            tmp.cleanup()
+
+    result = BenchmarkResult(
+        storage=storage,
+        sessions=sessions,
+        concurrency=concurrency,
+        latency=latency.summary()["allocation"],
+        lock_wait=next(iter(quota_module.lock_metrics.summary().values()), {}),
+        conflicts=sum(quota_module.conflicts.values()),
+        targets=targets,
+    )
+
+    for label, outcome in results:
+        if label is None:
+            result.rejected += 1
+            continue
+        result.allocated[label] = result.allocated.get(label, 0) + 1
+        if outcome == "finish":
+            result.finished[label] = result.finished.get(label, 0) + 1
+
+    return result
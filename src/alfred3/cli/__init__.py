@@ -21,8 +21,11 @@ These are the currently available commands::
     --help  Show this message and exit.
 
     Commands:
+    export
     json-to-csv
+    quota-benchmark
     run
+    serve
     template
 
 """
@@ -32,7 +35,10 @@ import click
 
 from .template import template
 from .run import run
+from .serve import serve
 from .extract import json_to_csv
+from .benchmark import quota_benchmark
+from .export import export
 
 @click.group()
 def cli():
@@ -40,4 +46,7 @@ def cli():
 
 cli.add_command(template)
 cli.add_command(run)
-cli.add_command(json_to_csv)
\ No newline at end of file
+cli.add_command(serve)
+cli.add_command(json_to_csv)
+cli.add_command(quota_benchmark)
+cli.add_command(export)
\ No newline at end of file
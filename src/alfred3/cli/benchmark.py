@@ -0,0 +1,51 @@
+import click
+from alfred3.benchmark import simulate
+
+
+def _parse_conditions(ctx, param, value):
+    if not value:
+        return None
+    try:
+        return [(label, int(n)) for label, n in (c.split(":") for c in value.split(","))]
+    except ValueError:
+        raise click.BadParameter("Use the format 'label:nslots,label:nslots'.")
+
+
+@click.command()
+@click.option("--slots", default=50, type=int, help="Number of slots of a session quota. [default: 50]")
+@click.option(
+    "--conditions",
+    default=None,
+    callback=_parse_conditions,
+    help="Benchmark a list randomizer with these conditions, e.g. 'a:50,b:50'. Overrides --slots.",
+)
+@click.option("--sessions", default=200, type=int, help="Number of simulated sessions. [default: 200]")
+@click.option("--concurrency", default=20, type=int, help="Number of concurrent sessions. [default: 20]")
+@click.option("--finish-rate", default=0.8, type=float, help="Relative frequency of finished sessions. [default: 0.8]")
+@click.option("--abort-rate", default=0.1, type=float, help="Relative frequency of aborted sessions. [default: 0.1]")
+@click.option("--timeout-rate", default=0.1, type=float, help="Relative frequency of timed out sessions. [default: 0.1]")
+@click.option("--inclusive", is_flag=True, help="Allow sessions to take pending slots.")
+@click.option(
+    "--storage",
+    default="local",
+    type=click.Choice(["local", "mongo"]),
+    help="Storage backend. Mongo storage uses mongomock. [default: local]",
+)
+@click.option("--seed", default=None, help="Random seed.")
+def quota_benchmark(
+    slots, conditions, sessions, concurrency, finish_rate, abort_rate, timeout_rate, inclusive, storage, seed
+):
+    """Simulate concurrent sessions using a quota or randomizer."""
+    result = simulate(
+        nslots=slots,
+        conditions=conditions,
+        sessions=sessions,
+        concurrency=concurrency,
+        finish_rate=finish_rate,
+        abort_rate=abort_rate,
+        timeout_rate=timeout_rate,
+        inclusive=inclusive,
+        storage=storage,
+        seed=seed,
+    )
+    click.echo(str(result))
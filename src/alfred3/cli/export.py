@@ -0,0 +1,62 @@
+import click
+from pathlib import Path
+
+from alfred3.config import ExperimentConfig, ExperimentSecrets
+from alfred3.data_manager import DataManager
+from alfred3.cli.extract import Extractor
+
+DATA_TYPES = {
+    DataManager.EXP_DATA: "export_exp_data",
+    DataManager.UNLINKED_DATA: "export_unlinked_data",
+    DataManager.CODEBOOK_DATA: "export_codebook",
+    DataManager.HISTORY: "export_move_history",
+}
+
+
+def _subpath(expdir: Path, path: str) -> Path:
+    path = Path(path)
+    return path if path.is_absolute() else expdir / path
+
+
+@click.command()
+@click.option("--path", default=Path.cwd(), help="Path to the experiment directory. [default: current working directory]")
+@click.option(
+    "--dtype",
+    "dtypes",
+    multiple=True,
+    type=click.Choice(list(DATA_TYPES)),
+    help="Data type to export. Can be given multiple times. [default: all data types enabled in config.conf]",
+)
+def export(path, dtypes):
+    """Build an experiment's csv files from its local data."""
+    expdir = Path(path).resolve()
+    config = ExperimentConfig(expdir=expdir)
+    secrets = ExperimentSecrets(expdir=expdir)
+
+    if not dtypes:
+        dtypes = [dtype for dtype, option in DATA_TYPES.items() if config.getboolean("data", option)]
+
+    key = None
+    if config.getboolean("local_saving_agent_unlinked", "decrypt_csv_export"):
+        key = secrets.get("encryption", "key", fallback=None)
+
+    csv_dir = _subpath(expdir, config.get("data", "csv_directory"))
+    csv_dir.mkdir(parents=True, exist_ok=True)
+    kwargs = dict(out_path=csv_dir, delimiter=config.get("data", "csv_delimiter"), overwrite=True)
+
+    exp_dir = _subpath(expdir, config.get("local_saving_agent", "path"))
+    unlinked_dir = _subpath(expdir, config.get("local_saving_agent_unlinked", "path"))
+    extractor = Extractor(in_path=exp_dir, **kwargs)
+
+    for dtype in dtypes:
+        if dtype == DataManager.EXP_DATA:
+            csvname = extractor.extract_exp_data()
+        elif dtype == DataManager.HISTORY:
+            csvname = extractor.extract_move_history()
+        elif dtype == DataManager.CODEBOOK_DATA:
+            csvname = extractor.extract_codebook(exp_version=config.get("metadata", "version"))
+        elif dtype == DataManager.UNLINKED_DATA:
+            unlinked = Extractor(in_path=unlinked_dir, key=key.encode() if key else None, **kwargs)
+            csvname = unlinked.extract_unlinked_data()
+
+        click.echo(f"Exported {dtype} to '{csv_dir / csvname}'.")
@@ -1,11 +1,82 @@
+import os
+import json
+import tempfile
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import partial
 from pathlib import Path
-from itertools import chain
+from itertools import chain, islice
+from typing import Callable, Iterable, Iterator, List, Tuple
 
-from alfred3.data_manager import DataManager
+from alfred3.data_manager import DataManager, decrypt_recursively
+from alfred3.saving_agent import read_segments
 from alfred3.export import Exporter, find_unique_name
 import click
 
 
+def _flat(doc: dict) -> List[dict]:
+    return [DataManager.flatten(doc)]
+
+
+def _moves(doc: dict) -> List[dict]:
+    return doc["exp_move_history"]
+
+
+def _codebook(doc: dict) -> List[dict]:
+    return [DataManager.extract_codebook_data(doc)]
+
+
+def _read_rows(transform: Callable, data_type: str, paths: List[Path]) -> List[dict]:
+    """
+    Reads the .json files in *paths* and returns the rows that
+    *transform* creates from the documents of type *data_type*.
+    """
+    rows = []
+    for fp in paths:
+        doc = DataManager.read_local_file(fp, data_type)
+        if doc is not None:
+            rows += transform(doc)
+    return rows
+
+
+def _spool(rows: Iterable[dict], spool_dir: str) -> Tuple[str, List[str]]:
+    """
+    Writes *rows* to a temporary .jsonl file in *spool_dir*.
+
+    Returns:
+        tuple: The path of the file and the fieldnames of the rows, in
+        the order in which they were found.
+    """
+    fieldnames = {}
+    with tempfile.NamedTemporaryFile(
+        "w", encoding="utf-8", suffix=".jsonl", dir=spool_dir, delete=False
+    ) as f:
+        for row in rows:
+            row.pop("_id", None)  # remove mongoDB doc ID, if there is one
+            fieldnames.update(dict.fromkeys(row))
+            f.write(json.dumps(row) + "\n")
+    return f.name, list(fieldnames)
+
+
+def _spool_rows(
+    transform: Callable, data_type: str, paths: List[Path], spool_dir: str
+) -> Tuple[str, List[str]]:
+    """
+    Like :func:`_read_rows`, but writes the rows to a temporary .jsonl
+    file (see :func:`_spool`) instead of returning them.
+    """
+    return _spool(_read_rows(transform, data_type, paths), spool_dir)
+
+
+def _read_spool(paths: List[str]) -> Iterator[dict]:
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+
 class Extractor:
     """
     Turns uncurated alfred data from json format into csv format.
@@ -18,6 +89,23 @@ class Extractor:
             directory will be used.
         delimiter (str): Delimiter to use in the resulting csv file.
             Defaults to ";"
+        overwrite (bool): If True, the output files get the standard
+            names (e.g. 'exp_data.csv'), replacing existing files, and
+            the header sidecar files used for appending data are
+            updated. If False (default), a unique name is chosen for
+            each output file.
+        key (bytes): Encryption key. If given, unlinked data is
+            decrypted. Defaults to None.
+        workers (int): Number of processes for reading .json files. If
+            None (default), one process per CPU is used. With 1, files
+            are read in the current process.
+
+    The json files are read once, in chunks of :attr:`.chunksize`
+    files, distributed across a pool of spawned processes. While the
+    fieldnames are collected, the rows are written to temporary .jsonl
+    files, from which they are streamed to the csv file. Thus, memory
+    usage does not grow with the number of files. Data from .jsonl
+    segment files is read in the current process.
 
     Examples:
         The extractor is used by calling one of its four methods. The
@@ -30,10 +118,106 @@ class Extractor:
 
     """
 
-    def __init__(self, in_path: str = None, out_path: str = None, delimiter: str = ";"):
+    chunksize: int = 100
+    """int: Number of .json files that are handed to a worker process at once."""
+
+    def __init__(
+        self,
+        in_path: str = None,
+        out_path: str = None,
+        delimiter: str = ";",
+        overwrite: bool = False,
+        key: bytes = None,
+        workers: int = None,
+    ):
         self.in_path = Path(in_path) if in_path is not None else Path.cwd()
         self.out_path = Path(out_path) if out_path is not None else Path.cwd()
         self.delimiter = delimiter
+        self.overwrite = overwrite
+        self.key = key
+        self.workers = workers if workers is not None else os.cpu_count() or 1
+
+    def _chunks(self) -> Iterator[List[Path]]:
+        files = (fp for fp in self.in_path.iterdir() if fp.suffix == ".json")
+        while True:
+            chunk = list(islice(files, self.chunksize))
+            if not chunk:
+                return
+            yield chunk
+
+    def _map(self, func: Callable, transform: Callable, data_type: str) -> Iterator[list]:
+        """
+        Applies *func* to chunks of .json files in a process pool and
+        yields the results in order. At most two chunks per process are
+        processed ahead of the consumer, which keeps memory bounded.
+        """
+        if self.workers == 1:
+            for chunk in self._chunks():
+                yield func(transform, data_type, chunk)
+            return
+
+        # spawned workers do not inherit the saving threads of this
+        # process, which would not survive a fork
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as pool:
+            pending = deque()
+            for chunk in self._chunks():
+                pending.append(pool.submit(func, transform, data_type, chunk))
+                if len(pending) >= 2 * self.workers:
+                    yield pending.popleft().result()
+
+            while pending:
+                yield pending.popleft().result()
+
+    def _segment_rows(self, transform: Callable, data_type: str) -> Iterator[dict]:
+        for doc in read_segments(self.in_path):
+            if doc.get("type") == data_type:
+                yield from transform(doc)
+
+    def _rows(self, transform: Callable, data_type: str) -> Iterator[dict]:
+        rows = chain.from_iterable(self._map(_read_rows, transform, data_type))
+        for row in chain(rows, self._segment_rows(transform, data_type)):
+            row.pop("_id", None)  # remove mongoDB doc ID, if there is one
+            yield row
+
+    @contextmanager
+    def _spooled(self, transform: Callable, data_type: str):
+        """
+        Reads all rows that *transform* creates from the documents of
+        type *data_type* into temporary files.
+
+        Yields:
+            tuple: The fieldnames of all rows, in the order in which 
+            they were found, and an iterator over the rows.
+        """
+        with tempfile.TemporaryDirectory(prefix="alfred3-extract-") as spool_dir:
+            func = partial(_spool_rows, spool_dir=spool_dir)
+            segments = _spool(self._segment_rows(transform, data_type), spool_dir)
+
+            paths, fieldnames = [], {}
+            for path, names in chain(self._map(func, transform, data_type), [segments]):
+                paths.append(path)
+                fieldnames.update(dict.fromkeys(names))
+
+            yield list(fieldnames), _read_spool(paths)
+
+    def _write(self, data, fieldnames: list, filename: str) -> str:
+        """
+        Writes data to a csv file in the Extractors *out_path*.
+
+        Returns:
+            str: The name of the csv file.
+        """
+        if not self.overwrite:
+            csvname = find_unique_name(directory=self.out_path, filename=filename)
+            Exporter.write(data, fieldnames, self.out_path / csvname, self.delimiter)
+            return csvname
+
+        path = self.out_path / filename
+        with Exporter.locked(path):
+            Exporter.write(data, fieldnames, path, self.delimiter)
+            Exporter.write_header(path, fieldnames, self.delimiter)
+        return filename
 
     def extract_exp_data(self):
         """
@@ -48,20 +232,9 @@ class Extractor:
             >>> ex = Extractor()
             >>> ex.extract_exp_data()
         """
-        data = list(
-            DataManager.iterate_local_data(data_type=DataManager.EXP_DATA, directory=self.in_path)
-        )
-        fieldnames = DataManager.extract_ordered_fieldnames(data)
-        alldata = [DataManager.flatten(d) for d in data]
-        csvname = find_unique_name(directory=self.out_path, filename="exp_data.csv")
-        Exporter.write(
-            data=alldata,
-            fieldnames=fieldnames,
-            path=self.out_path / csvname,
-            delimiter=self.delimiter,
-        )
-
-        return csvname
+        with self._spooled(_flat, DataManager.EXP_DATA) as (fieldnames, data):
+            fieldnames = DataManager.order_fieldnames(fieldnames)
+            return self._write(data, fieldnames, "exp_data.csv")
 
     def extract_unlinked_data(self):
         """
@@ -76,22 +249,10 @@ class Extractor:
             >>> ex = Extractor()
             >>> ex.extract_unlinked_data()
         """
-        existing_data = list(
-            DataManager.iterate_local_data(
-                data_type=DataManager.UNLINKED_DATA, directory=self.in_path
-            )
-        )
-        data = [DataManager.flatten(d) for d in existing_data]
-        fieldnames = DataManager.extract_fieldnames(data)
-        csvname = find_unique_name(directory=self.out_path, filename="unlinked.csv")
-        Exporter.write(
-            data=data,
-            fieldnames=fieldnames,
-            path=self.out_path / csvname,
-            delimiter=self.delimiter,
-        )
-
-        return csvname
+        with self._spooled(_flat, DataManager.UNLINKED_DATA) as (fieldnames, data):
+            if self.key:
+                data = (decrypt_recursively(row, key=self.key) for row in data)
+            return self._write(data, fieldnames, "unlinked.csv")
 
     def extract_codebook(self, exp_version: str):
         """
@@ -110,40 +271,17 @@ class Extractor:
             >>> ex = Extractor()
             >>> ex.extract_codebook("1.0")
         """
-        cursor = DataManager.iterate_local_data(
-            data_type=DataManager.EXP_DATA, directory=self.in_path, exp_version=exp_version
-        )
-
-        cursor_unlinked = DataManager.iterate_local_data(
-            data_type=DataManager.UNLINKED_DATA, directory=self.in_path, exp_version=exp_version
-        )
-
-        # extract individual codebooks for each experimen session
-        cbdata_collection = []
-        for entry in cursor:
-            cb = DataManager.extract_codebook_data(entry)
-            cbdata_collection.append(cb)
-        for entry in cursor_unlinked:
-            cb = DataManager.extract_codebook_data(entry)
-            cbdata_collection.append(cb)
-
-        # combine them to a single dictionary, overwriting old values
-        # with newer ones
+        # combine the codebooks of all sessions to a single dictionary,
+        # overwriting old values with newer ones
         data = {}
-        for entry in cbdata_collection:
+        for entry in self._rows(_codebook, DataManager.EXP_DATA):
+            data.update(entry)
+        for entry in self._rows(_codebook, DataManager.UNLINKED_DATA):
             data.update(entry)
 
         fieldnames = DataManager.extract_fieldnames(data.values())
         fieldnames = DataManager.sort_codebook_fieldnames(fieldnames)
-        csvname = find_unique_name(directory=self.out_path, filename=f"codebook_{exp_version}.csv")
-        Exporter.write(
-            data=data.values(),
-            fieldnames=fieldnames,
-            path=self.out_path / csvname,
-            delimiter=self.delimiter,
-        )
-
-        return csvname
+        return self._write(data.values(), fieldnames, f"codebook_{exp_version}.csv")
 
     def extract_move_history(self):
         """
@@ -158,21 +296,8 @@ class Extractor:
             >>> ex = Extractor()
             >>> ex.extract_move_history()
         """
-        existing_data = DataManager.iterate_local_data(
-            data_type=DataManager.EXP_DATA, directory=self.in_path
-        )
-        history = [d["exp_move_history"] for d in existing_data]
-        fieldnames = DataManager.extract_fieldnames(chain(*history))
-        history = chain(*history)
-        csvname = find_unique_name(directory=self.out_path, filename="move_history.csv")
-        Exporter.write(
-            data=history,
-            fieldnames=fieldnames,
-            path=self.out_path / csvname,
-            delimiter=self.delimiter,
-        )
-
-        return csvname
+        with self._spooled(_moves, DataManager.EXP_DATA) as (fieldnames, history):
+            return self._write(history, fieldnames, "move_history.csv")
 
 
 @click.command()
@@ -200,8 +325,14 @@ class Extractor:
 @click.option(
     "--delimiter", default=";", help="Delimiter to use in the resulting csv file. Defaults to ';'"
 )
-def json_to_csv(dtype, in_path, out_path, exp_version, delimiter):
-    extractor = Extractor(in_path=in_path, out_path=out_path, delimiter=delimiter)
+@click.option(
+    "--workers",
+    default=None,
+    type=int,
+    help="Number of processes for reading json files. If None (default), one process per CPU is used.",
+)
+def json_to_csv(dtype, in_path, out_path, exp_version, delimiter, workers):
+    extractor = Extractor(in_path=in_path, out_path=out_path, delimiter=delimiter, workers=workers)
 
     if dtype == "exp_data":
         csvname = extractor.extract_exp_data()
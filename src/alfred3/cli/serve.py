@@ -0,0 +1,24 @@
+import click
+from pathlib import Path
+from alfred3.run import ExperimentRunner
+
+@click.command()
+@click.option("--path", default=Path.cwd())
+@click.option("--host", default=None, help="Host to listen on. [default: value from config.conf]")
+@click.option("--port", default=None, type=int, help="Port to listen on. [default: value from config.conf]")
+@click.option(
+    "--workers",
+    default=None,
+    type=int,
+    help="Number of worker processes. Each worker listens on a port of its own (port, port + 1, ...). [default: value from config.conf]",
+)
+@click.option(
+    "--threads",
+    default=None,
+    type=int,
+    help="Number of request handling threads per worker. [default: value from config.conf]",
+)
+def serve(path, host, port, workers, threads):
+    """Serve an experiment to many participants at once."""
+    runner = ExperimentRunner(path)
+    runner.serve(host=host, port=port, workers=workers, threads=threads)
@@ -19,6 +19,7 @@ from typing import Union
 from typing import List
 from typing import Dict
 from typing import Iterator
+from typing import Iterable
 
 from dataclasses import asdict
 
@@ -26,6 +27,7 @@ from cryptography.fernet import Fernet, InvalidToken
 
 from .config import ExperimentSecrets
 from .saving_agent import AutoMongoClient
+from .saving_agent import read_segments, SessionIndex
 from .alfredlog import QueuedLoggingInterface
 from .util import flatten_dict
 from .util import prefix_keys_safely
@@ -79,6 +81,10 @@ class DataManager:
         self._experiment = experiment
         self.exp = experiment
         self.additional_data = {}
+        self._move_history = []
+        #: int: Counter that is increased whenever the data of a page
+        #: changes. Used to invalidate data-dependent caches.
+        self._data_version = 0
         self.log = QueuedLoggingInterface(base_logger=__name__)
         self.log.add_queue_logger(self, __name__)
 
@@ -119,7 +125,14 @@ class DataManager:
     
     @property
     def move_history(self):
-        return [asdict(move) for move in self.exp.movement_manager.history]
+        # moves are complete when they are recorded, so each move is
+        # converted only once
+        history = self.exp.movement_manager.history
+        if len(self._move_history) > len(history):
+            self._move_history = []
+        for move in history[len(self._move_history):]:
+            self._move_history.append(asdict(move))
+        return list(self._move_history)
 
     @property
     def values(self):
@@ -166,11 +179,10 @@ class DataManager:
         meta["exp_version"] = exp_data["exp_version"]
 
         codebook = exp_data.pop("exp_data")
-        for entry in codebook.values():
-            entry.pop("value", None)
-            entry.update(meta)
-
-        return codebook
+        return {
+            name: {**{k: v for k, v in entry.items() if k != "value"}, **meta}
+            for name, entry in codebook.items()
+        }
 
     @staticmethod
     def extract_fieldnames(data: Iterator) -> list:
@@ -220,35 +232,41 @@ class DataManager:
             4. Additional data
 
         """
-        metadata = []
-        client_info = []
-        adata = []
-        elements = {}
-
+        fieldnames = {}
         for dataset in data:
-            d = cls.flatten(copy.copy(dataset))
-
-            for entry in list(d.keys()):
-                if entry in cls._client_data_keys:
-                    d.pop(entry)
-                    client_info.append(entry)
-                elif entry in cls._metadata_keys:
-                    d.pop(entry)
-                    metadata.append(entry)
-                elif entry.startswith("additional_data"):
-                    d.pop(entry)
-                    adata.append(entry)
-            elements.update(d)
-
-        metadata = [name for name in metadata if not name.startswith("additional_data")]
-
-        element_names = sorted(list(elements))
-        metadata = sorted(list(set(metadata)))
-        client_info = sorted(list(set(client_info)))
-        adata = sorted(list(set(adata)))
-
-        fieldnames = metadata + client_info + element_names + adata
-        return fieldnames
+            fieldnames.update(dict.fromkeys(cls.flatten(copy.copy(dataset))))
+
+        return cls.order_fieldnames(fieldnames)
+
+    @classmethod
+    def order_fieldnames(cls, fieldnames: Iterable[str]) -> list:
+        """
+        Orders the fieldnames of flattened experiment datasets, as
+        described in :meth:`.extract_ordered_fieldnames`.
+
+        Args:
+            fieldnames: The fieldnames of all datasets. Duplicates are
+                allowed.
+
+        Returns:
+            list: List of fieldnames
+        """
+        metadata = set()
+        client_info = set()
+        adata = set()
+        elements = set()
+
+        for entry in fieldnames:
+            if entry in cls._client_data_keys:
+                client_info.add(entry)
+            elif entry in cls._metadata_keys:
+                metadata.add(entry)
+            elif entry.startswith("additional_data"):
+                adata.add(entry)
+            else:
+                elements.add(entry)
+
+        return sorted(metadata) + sorted(client_info) + sorted(elements) + sorted(adata)
 
     @staticmethod
     def sort_fieldnames(fieldnames: List[str], template: List[str]) -> List[str]:
@@ -355,15 +373,19 @@ class DataManager:
 
     def encrypt_values(self, data: dict) -> dict:
         data = copy.copy(data)
-        for eldata in data["exp_data"].values():
-            eldata["value"] = self.exp.encrypt(eldata["value"])
+        data["exp_data"] = {
+            name: {**eldata, "value": self.exp.encrypt(eldata["value"])}
+            for name, eldata in data["exp_data"].items()
+        }
         return data
 
     def decrypt_values(self, data: dict) -> dict:
         data = copy.copy(data)
-        for eldata in data["exp_data"].values():
-            eldata["value"] = self.exp.decrypt(eldata["value"])
-            return data
+        data["exp_data"] = {
+            name: {**eldata, "value": self.exp.decrypt(eldata["value"])}
+            for name, eldata in data["exp_data"].items()
+        }
+        return data
 
     def get_page_data(self, name: str) -> dict:
         return self.experiment.root_section.all_pages[name].data
@@ -458,9 +480,12 @@ class DataManager:
         data_type: str,
         directory: Union[str, Path],
         exp_version: str = None,
+        fields: List[str] = None,
+        session_ids: List[str] = None,
+        use_index: bool = True,
     ) -> Iterator[dict]:
         """Generator function, iterating over experiment data .json files
-        in the specified directory.
+        and .jsonl segment files in the specified directory.
 
         .. versionadded:: 1.5
 
@@ -469,12 +494,25 @@ class DataManager:
             for doc in cursor:
                 ...
 
+        If the directory holds a :class:`~alfred3.saving_agent.SessionIndex`,
+        *session_ids* are looked up in the index, such that only the
+        files holding these sessions are read. If none of the *fields*
+        is a payload field (element data, movement history, and 
+        additional data), the data is served from the index' header
+        records without reading any data file.
+
         Args:
             data_type: The type of data to be collected. Can be
                 'exp_data' or 'unlinked'.
             exp_version: If specified, data will only be queried for
                 this specific version.
             directory: The directory in which to look for data.
+            fields: If specified, only these fields are included in 
+                the returned documents.
+            session_ids: If specified, only data of these sessions is
+                returned.
+            use_index: If *False*, the session index is ignored and all
+                files are read.
         """
         path = Path(directory).resolve()
         if not path.is_absolute():
@@ -483,25 +521,67 @@ class DataManager:
         if not path.exists():
             return
 
-        for fp in path.iterdir():
-            if not fp.suffix == ".json":
-                continue
+        if session_ids is not None:
+            session_ids = set(session_ids)
 
-            try:
-                with open(fp, "r", encoding="utf-8") as f:
-                    doc = json.load(f)
-            except json.decoder.JSONDecodeError:
-                continue
-            except IsADirectoryError:
-                continue
+        index = None
+        # documents without session id (e.g. unlinked data) are not indexed
+        indexed = session_ids is not None or data_type == cls.EXP_DATA
+        if use_index and indexed and (path / SessionIndex.FILENAME).exists():
+            index = SessionIndex.get(path)
 
-            doctype = doc.get("type")
+        header_only = fields is not None and not set(fields) & set(SessionIndex.PAYLOAD_FIELDS)
 
-            if data_type != doctype:
-                continue
+        if index is not None and header_only:
+            docs = index.headers(data_type, session_ids)
+        elif index is not None and session_ids is not None:
+            docs = index.load(session_ids, data_type)
+        else:
+            docs = cls._read_local_data(data_type, path)
+            if session_ids is not None:
+                docs = (doc for doc in docs if doc.get("exp_session_id") in session_ids)
 
+        for doc in docs:
+            if fields is not None:
+                doc = {key: doc[key] for key in fields if key in doc}
             yield doc
 
+    @staticmethod
+    def read_local_file(fp: Path, data_type: str) -> dict:
+        """
+        Reads a single .json data file.
+
+        Returns:
+            dict: The document, or *None*, if the file is not a valid
+            .json file or holds data of another type.
+        """
+        if not fp.suffix == ".json":
+            return None
+
+        try:
+            with open(fp, "r", encoding="utf-8") as f:
+                doc = json.load(f)
+        except json.decoder.JSONDecodeError:
+            return None
+        except IsADirectoryError:
+            return None
+
+        if doc.get("type") != data_type:
+            return None
+
+        return doc
+
+    @classmethod
+    def _read_local_data(cls, data_type: str, path: Path) -> Iterator[dict]:
+        for fp in path.iterdir():
+            doc = cls.read_local_file(fp, data_type)
+            if doc is not None:
+                yield doc
+
+        for doc in read_segments(path):
+            if doc.get("type") == data_type:
+                yield doc
+
 
 def decrypt_recursively(
     data: Union[list, dict, int, float, str, bytes], key: bytes
@@ -555,10 +635,29 @@ def get_session_mongo(exp, sid) -> dict:
     return exp.db_main.find_one(q)
 
 
+def local_session_index(exp) -> SessionIndex:
+    """
+    Returns the :class:`~alfred3.saving_agent.SessionIndex` of the
+    experiment's local data directory, or *None*, if the index is
+    switched off or the directory does not exist.
+    """
+    if not exp.config.getboolean("local_saving_agent", "session_index", fallback=True):
+        return None
+
+    path = exp.config.get("local_saving_agent", "path")
+    path = exp.subpath(path)
+    if not path.is_dir():
+        return None
+    return SessionIndex.get(path)
+
+
 def get_session_local(exp, sid) -> dict:
     path = exp.config.get("local_saving_agent", "path")
     path = exp.subpath(path)
-    data = DataManager.iterate_local_data(DataManager.EXP_DATA, path)
+    index = local_session_index(exp)  # builds the index on first use
+    data = DataManager.iterate_local_data(
+        DataManager.EXP_DATA, path, session_ids=[sid], use_index=index is not None
+    )
     return next(s for s in data if s["exp_session_id"] == sid)
 
 
@@ -287,6 +287,7 @@ class Element:
         if not isinstance(value, dict):
             raise TypeError("Showif must be of type 'dict'.")
         self._showif = value
+        self._compiled_showif = None
 
     @property
     def converted_width(self) -> List[str]:
@@ -548,20 +549,14 @@ class Element:
             whether it is met or not.
         """
 
-        if self.showif:
-            conditions = []
-            for name, condition in self.showif.items():
+        if not self.showif:
+            return [True]
 
-                # skip current page (showifs for current pages are checked elsewhere)
-                if name in self.page.all_input_elements:
-                    continue
+        compiled = self._compiled_showif
+        if compiled is None or compiled.outdated(self):
+            compiled = self._compiled_showif = _CompiledShowif(self)
 
-                val = self.exp.data_manager.flat_session_data[name]
-                conditions.append(condition == val)
-
-            return conditions
-        else:
-            return [True]
+        return compiled.evaluate(self)
 
     def _activate_showif_on_current_page(self):
         """Adds JavaScript to self for dynamic showif functionality."""
@@ -620,6 +615,7 @@ class Element:
             raise TypeError(f"{page} is not a Page.")
 
         self.page = page
+        self._compiled_showif = None
         if self.name is None:
             self.name = self.page._generate_element_name(self)
 
@@ -815,6 +811,99 @@ class Element:
         self._js_code.append((priority, code))
 
 
+@dataclass
+class _ShowifCondition:
+    """
+    A single showif condition.
+
+    Attributes:
+        name (str): Name of the value that the condition refers to.
+        value: Required value.
+        element (InputElement): The input element of this name. If
+            *None*, the value is looked up in the flat session data.
+    """
+
+    name: str
+    value: object
+    element: "InputElement" = None
+
+    def __call__(self, exp) -> bool:
+        if self.element is not None:
+            value = self.element.page.data[self.name]["value"]
+            # dict values appear as one value per key in the flat data
+            if not isinstance(value, dict):
+                return value == self.value
+
+        return exp.data_manager.flat_session_data[self.name] == self.value
+
+
+class _CompiledShowif:
+    """
+    Showif conditions of an element, compiled for repeated evaluation.
+
+    Conditions that refer to input elements on other pages are bound
+    to these elements. Their results are cached until the data of one
+    of the pages that they depend on changes. All other conditions,
+    e.g. conditions on experiment metadata, are evaluated on every call.
+
+    Args:
+        element (Element): The element, whose showif conditions are
+            compiled.
+
+    Attributes:
+        dependencies (set): Names of the input elements that the bound
+            conditions depend on.
+    """
+
+    def __init__(self, element):
+        root = element.exp.root_section
+        self.showif = dict(element.showif)
+        self.tree_version = root._tree_version
+        self.bound = []
+        self.unbound = []
+
+        for name, value in self.showif.items():
+            target = root._element_registry.get(name)
+            if not isinstance(target, InputElement):
+                self.unbound.append(_ShowifCondition(name, value))
+            elif target.page is not element.page:
+                self.bound.append(_ShowifCondition(name, value, target))
+
+        self.dependencies = {condition.name for condition in self.bound}
+        self._pages = list({id(c.element.page): c.element.page for c in self.bound}.values())
+        self._versions = None
+        self._results = []
+
+    def outdated(self, element) -> bool:
+        """
+        True, if the element's showif changed, or if elements were
+        added to the experiment since compilation and some conditions
+        could not be bound.
+        """
+        if self.showif != element.showif:
+            return True
+        return bool(self.unbound) and self.tree_version != element.exp.root_section._tree_version
+
+    def evaluate(self, element) -> List[bool]:
+        """
+        Returns a list of booleans, indicating for each condition that
+        does not refer to the element's own page, whether it is met.
+        """
+        versions = [page._data_version for page in self._pages]
+        if versions != self._versions:
+            self._results = [condition(element.exp) for condition in self.bound]
+            self._versions = versions
+
+        results = list(self._results)
+        for condition in self.unbound:
+            # skip current page (showifs for current pages are checked elsewhere)
+            if condition.name in element.page.all_input_elements:
+                continue
+            results.append(condition(element.exp))
+
+        return results
+
+
 class RowLayout:
     """
     Provides layouting functionality for responsive horizontal
@@ -1954,6 +2043,19 @@ class InputElement(LabelledElement):
     def input(self, value):
         self._input = value
 
+    @property
+    def _input(self):
+        return self._input_value
+
+    @_input.setter
+    def _input(self, value):
+        # all input setters store the input here, so the page's data
+        # cache can be invalidated in one place
+        self._input_value = value
+        page = getattr(self, "page", None)
+        if page is not None:
+            page._data_changed()
+
     @property
     def data(self) -> dict:
         """
@@ -910,7 +910,7 @@ class SingleChoice(ChoiceElement):
             choice.value = i
             choice.name = self.name
             choice.id = f"{self.name}_choice{i}"
-            if choice.id in self.exp.root_section.all_elements:
+            if choice.id in self.exp.root_section._element_registry:
                 msg = (
                     f"You have a SingleChoice-type element of name {self.name}, which means "
                     f"that the name '{choice.id}' must be reserved. Please check if you are using "
@@ -1125,7 +1125,7 @@ class MultipleChoice(ChoiceElement):
             choice.value = i
             choice.id = f"{self.name}_choice{i}"
 
-            if choice.id in self.exp.root_section.all_elements:
+            if choice.id in self.exp.root_section._element_registry:
                 msg = (
                     f"You have a MultipleChoice-type element of name {self.name}, which means "
                     f"that the name '{choice.id}' must be reserved. Please check if you are using "
@@ -1265,7 +1265,7 @@ class SingleChoiceList(SingleChoice):
             choice.value = choice.label
             choice.name = self.name
             choice.id = f"{self.name}_choice{i}"
-            if choice.id in self.exp.root_section.all_elements:
+            if choice.id in self.exp.root_section._element_registry:
                 msg = (
                     f"You have a SingleChoice-type element of name {self.name}, which means "
                     f"that the name '{choice.id}' must be reserved. Please check if you are using "
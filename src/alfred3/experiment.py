@@ -52,7 +52,7 @@ from . import saving_agent
 from .alfredlog import QueuedLoggingInterface
 from ._helper import _DictObj
 from .data_manager import DataManager
-from .export import Exporter
+from .export import Exporter, export_worker
 from .saving_agent import DataSaver, MongoSavingAgent
 from .ui_controller import UserInterface
 from .ui_controller import MovementManager
@@ -1086,17 +1086,26 @@ class ExperimentSession:
             self.log.debug("Option 'save_data' was 'false'. Not exporting any data.")
             return
 
-        exporter = Exporter(self)
+        data_types = []
         if cfg.getboolean("export_exp_data") and self.config.getboolean(
             "local_saving_agent", "use"
         ):
-            exporter.export(DataManager.EXP_DATA)
+            data_types.append(DataManager.EXP_DATA)
         if cfg.getboolean("export_unlinked_data") and self.root_section.unlinked_data:
-            exporter.export(DataManager.UNLINKED_DATA)
+            data_types.append(DataManager.UNLINKED_DATA)
         if cfg.getboolean("export_codebook"):
-            exporter.export(DataManager.CODEBOOK_DATA)
+            data_types.append(DataManager.CODEBOOK_DATA)
         if cfg.getboolean("export_move_history") and cfg.getboolean("record_move_history"):
-            exporter.export(DataManager.HISTORY)
+            data_types.append(DataManager.HISTORY)
+
+        exporter = Exporter(self)
+        background = cfg.getboolean("export_in_background")
+        delay = cfg.getfloat("export_delay")
+        for data_type in data_types:
+            if background:
+                export_worker.schedule(exporter, data_type, delay=delay)
+            else:
+                exporter.export(data_type)
 
     def _save_data(self, sync: bool = False):
         """
@@ -1553,17 +1562,15 @@ class ExperimentSession:
         return self
 
     def __contains__(self, key):
-        try:
-            return key.name in self.all_members or key.name in self.root_section.all_elements
-        except AttributeError:
-            return key in self.all_members or key in self.root_section.all_elements
+        name = getattr(key, "name", key)
+        return name in self.root_section._member_registry or name in self.root_section._element_registry
 
     def __getitem__(self, name):
-        return self.root_section.all_members[name]
+        return self.root_section._member_registry[name]
 
     def __getattr__(self, name):
         try:
-            return self.root_section.all_members[name]
+            return self.root_section._member_registry[name]
         except KeyError:
             raise AttributeError(f"The experiment session has no attribute '{name}'.")
 
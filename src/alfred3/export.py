@@ -33,7 +33,11 @@ import csv
 import json
 import io
 import os
+import time
+import atexit
 import random
+import tempfile
+import threading
 
 from typing import Union
 from typing import List, Iterator
@@ -42,7 +46,12 @@ from itertools import chain
 
 import click
 
-from .saving_agent import AutoMongoClient
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+from .saving_agent import AutoMongoClient, write_json_atomic, _file_mode
 from .data_manager import DataManager
 from .data_manager import decrypt_recursively
 from .config import ExperimentConfig, ExperimentSecrets
@@ -59,8 +68,15 @@ class Exporter:
     2. If yes, append the data from the current session to this file.
     3. If not, scan all available .json files and produce a new,
        complete csv file.
+
+    Experiment data and movement history are appended row by row. The
+    header of these files is kept in a small sidecar file
+    (e.g. ``.exp_data.csv.header``). The csv file is rewritten only if
+    a session introduces a new column.
     """
 
+    _lock = threading.Lock()
+
     def __init__(self, experiment):
         self.experiment = experiment
         self.exp = experiment
@@ -68,7 +84,7 @@ class Exporter:
         self.delimiter = self.exp.config.get("data", "csv_delimiter")
         self.save_dir = self.exp.subpath(self.exp.config.get("local_saving_agent", "path"))
 
-    def export(self, data_type: str):
+    def export(self, data_type: str, data=None):
         """
         Calls the appropriate specialized export function, depending
         on data type.
@@ -76,17 +92,43 @@ class Exporter:
         Args:
             data_type (str): One of 'exp_data', 'unlinked', 'codebook',
                 'move_history'.
+            data: Data to export, as returned by :meth:`.session_data`.
+                If *None* (default), the data of the current session
+                is exported.
 
         """
         self.csv_dir.mkdir(parents=True, exist_ok=True)
         if data_type == DataManager.CODEBOOK_DATA:
-            self.export_codebook()
+            self.export_codebook(data)
+        elif data_type == DataManager.HISTORY:
+            self.export_move_history(data)
+        elif data_type == DataManager.UNLINKED_DATA:
+            self.export_unlinked(data)
+        elif data_type == DataManager.EXP_DATA:
+            self.export_exp_data(data)
+
+    def session_data(self, data_type: str):
+        """
+        Returns the data of the current session for export.
+
+        Args:
+            data_type (str): One of 'exp_data', 'unlinked', 'codebook',
+                'move_history'.
+
+        Returns:
+            A list of rows or, for codebook data, a dictionary of
+            codebook entries.
+        """
+        if data_type == DataManager.CODEBOOK_DATA:
+            return self.exp.data_manager.codebook_data
         elif data_type == DataManager.HISTORY:
-            self.export_move_history()
+            return self.exp.data_manager.move_history
         elif data_type == DataManager.UNLINKED_DATA:
-            self.export_unlinked()
+            agent = self.exp.data_saver.unlinked.agents["local_unlinked"]
+            data = self.exp.data_manager.unlinked_data_with(agent)
+            return [self.exp.data_manager.flatten(data)]
         elif data_type == DataManager.EXP_DATA:
-            self.export_exp_data()
+            return [self.exp.data_manager.flat_session_data]
 
     def _load(self, path: Union[str, Path]) -> list:
         """
@@ -132,64 +174,163 @@ class Exporter:
             writer.writeheader()
             writer.writerows(data)
 
-    def export_exp_data(self):
+    @staticmethod
+    def header_path(path: Path) -> Path:
+        """Returns the path of the header sidecar file of a csv file."""
+        return path.with_name(f".{path.name}.header")
+
+    def _read_header(self, path: Path) -> List[str]:
+        """
+        Returns the fieldnames of an existing csv file.
+
+        The fieldnames are read from the header sidecar file. If the
+        sidecar is missing or out of date, they are read from the first
+        line of the csv file.
+        """
+        try:
+            header = json.loads(self.header_path(path).read_text(encoding="utf-8"))
+            if header["size"] == path.stat().st_size and header["delimiter"] == self.delimiter:
+                return header["fieldnames"]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+        with open(path, "r", encoding="utf-8", newline="") as csvfile:
+            return next(csv.reader(csvfile, delimiter=self.delimiter), [])
+
+    @classmethod
+    def write_header(cls, path: Path, fieldnames: List[str], delimiter: str):
+        """
+        Writes the header sidecar file of a csv file.
+
+        The sidecar records the fieldnames of the csv file, such that
+        appending to the file does not require reading its first line.
+        It also records the size of the csv file after writing, which
+        is used to detect whether the file was changed without updating
+        the sidecar. In this case, :meth:`._read_header` falls back to
+        reading the first line of the csv file.
+
+        Must be called after the csv file was written.
+
+        Args:
+            path: Path of the csv file.
+            fieldnames: Fieldnames of the csv file, in order.
+            delimiter: Delimiter of the csv file. The sidecar is only
+                used for reading, if this delimiter matches the
+                exporter's configured delimiter.
+        """
+        header = {
+            "fieldnames": fieldnames,
+            "delimiter": delimiter,
+            "size": path.stat().st_size,
+        }
+        write_json_atomic(cls.header_path(path), header, fsync="never")
+
+    def _rewrite(self, path: Path, fieldnames: List[str], rows: List[dict]):
+        """
+        Rewrites an existing csv file with new fieldnames, streaming the
+        existing rows, and appends *rows*.
+        """
+        fd, tmp = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.name}.", suffix=".tmp")
+        try:
+            with open(fd, "w", encoding="utf-8", newline="") as out:
+                with open(path, "r", encoding="utf-8", newline="") as src:
+                    writer = csv.DictWriter(out, fieldnames=fieldnames, delimiter=self.delimiter)
+                    writer.writeheader()
+                    writer.writerows(csv.DictReader(src, delimiter=self.delimiter))
+                    writer.writerows(rows)
+            os.chmod(tmp, _file_mode(path))
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    def _append(self, path: Path, rows: List[dict], order) -> List[str]:
+        """
+        Appends *rows* to an existing csv file.
+
+        If the rows contain new columns, the file is rewritten with the
+        fieldnames returned by *order*, which receives the old and new
+        fieldnames in the order in which they were found.
+
+        Returns:
+            list: The fieldnames of the csv file.
+        """
+        fieldnames = self._read_header(path)
+        known = set(fieldnames)
+        new = [name for row in rows for name in row if name not in known]
+
+        if not new:
+            with open(path, "a", encoding="utf-8", newline="") as csvfile:
+                writer = csv.DictWriter(csvfile, fieldnames=fieldnames, delimiter=self.delimiter)
+                writer.writerows(rows)
+            return fieldnames
+
+        fieldnames = order(list(dict.fromkeys(fieldnames + new)))
+        self._rewrite(path, fieldnames, rows)
+        return fieldnames
+
+    @classmethod
+    def locked(cls, path: Path):
+        """
+        Context manager that locks a csv file against concurrent
+        exports from other threads and processes.
+        """
+        return _ExportLock(cls._lock, path.with_name(f".{path.name}.lock"))
+
+    def export_exp_data(self, rows: List[dict] = None):
         csv_name = "exp_data.csv"
         path = self.csv_dir / csv_name
 
-        if path.exists() and path.read_text(encoding="utf-8"):
-            alldata = self._load(path)
-            sessiondata = self.exp.data_manager.flat_session_data
-            alldata.append(sessiondata)
-
-            # get fieldnames from list of flat datasets
-            metadata = list(self.exp.data_manager.metadata.keys())
-            client_info = list(self.exp.data_manager.client_data.keys())
-            element_names = []
-            for row in alldata:
-                for colname in row:
-                    if not colname in metadata + client_info:
-                        if not colname in element_names:
-                            element_names.append(colname)
-            fieldnames = metadata + client_info + sorted(element_names)
-        else:
-            data = list(
-                DataManager.iterate_local_data(
-                    data_type=DataManager.EXP_DATA, directory=self.save_dir
+        with self.locked(path):
+            if path.exists() and path.stat().st_size:
+                metadata = list(self.exp.data_manager.metadata.keys())
+                client_info = list(self.exp.data_manager.client_data.keys())
+                leading = set(metadata + client_info)
+
+                def order(names):
+                    element_names = sorted(name for name in names if name not in leading)
+                    return metadata + client_info + element_names
+
+                if rows is None:
+                    rows = self.session_data(DataManager.EXP_DATA)
+                fieldnames = self._append(path, rows, order)
+            else:
+                data = list(
+                    DataManager.iterate_local_data(
+                        data_type=DataManager.EXP_DATA, directory=self.save_dir
+                    )
                 )
-            )
-            fieldnames = DataManager.extract_ordered_fieldnames(data)
-            alldata = [DataManager.flatten(d) for d in data]
-        self._write(alldata, fieldnames, path)
+                fieldnames = DataManager.extract_ordered_fieldnames(data)
+                alldata = (DataManager.flatten(d) for d in data)
+                self._write(alldata, fieldnames, path)
+            self.write_header(path, fieldnames, self.delimiter)
         self.exp.log.info(f"Exported main experiment data to {path.parent.name}/{path.name}.")
 
-    def export_move_history(self):
+    def export_move_history(self, rows: List[dict] = None):
         csv_name = "move_history.csv"
-        data = self.exp.data_manager.move_history
-        fieldnames = DataManager.extract_fieldnames(data)
         path = self.csv_dir / csv_name
 
-        if path.exists() and path.read_text(encoding="utf-8"):
-            history = self._load(path)
-            history += data
-            fieldnames = DataManager.extract_fieldnames(history)
-        else:
-            existing_data = DataManager.iterate_local_data(
-                data_type=DataManager.EXP_DATA, directory=self.save_dir
-            )
-            history = [d["exp_move_history"] for d in existing_data]
-            fieldnames = DataManager.extract_fieldnames(chain(*history))
-            history = chain(*history)
-
-        self._write(history, fieldnames, path)
+        with self.locked(path):
+            if path.exists() and path.stat().st_size:
+                if rows is None:
+                    rows = self.session_data(DataManager.HISTORY)
+                fieldnames = self._append(path, rows, order=lambda names: names)
+            else:
+                existing_data = DataManager.iterate_local_data(
+                    data_type=DataManager.EXP_DATA, directory=self.save_dir
+                )
+                history = [d["exp_move_history"] for d in existing_data]
+                fieldnames = DataManager.extract_fieldnames(chain(*history))
+                self._write(chain(*history), fieldnames, path)
+            self.write_header(path, fieldnames, self.delimiter)
         self.exp.log.info(f"Exported movement history to {path.parent.name}/{path.name}.")
 
-    def export_unlinked(self):
+    def export_unlinked(self, rows: List[dict] = None):
         csv_name = "unlinked.csv"
-        agent = self.exp.data_saver.unlinked.agents["local_unlinked"]
-        data = self.exp.data_manager.unlinked_data_with(agent)
-        data = self.exp.data_manager.flatten(data)
-        fieldnames = list(data.keys())
-        data = [data]
+        data = rows if rows is not None else self.session_data(DataManager.UNLINKED_DATA)
 
         path = self.csv_dir / csv_name
 
@@ -217,8 +358,9 @@ class Exporter:
         self._write(data, fieldnames, path)
         self.exp.log.info(f"Exported unlinked data to {path.parent.name}/{path.name}.")
 
-    def export_codebook(self):
-        data = self.exp.data_manager.codebook_data
+    def export_codebook(self, data: dict = None):
+        if data is None:
+            data = self.session_data(DataManager.CODEBOOK_DATA)
 
         version = self.exp.config.get("metadata", "version")
         csv_name = f"{DataManager.CODEBOOK_DATA}_{version}.csv"
@@ -254,6 +396,131 @@ class Exporter:
         self.exp.log.info(f"Exported codebook to {path.parent.name}/{path.name}.")
 
 
+class _ExportLock:
+    """
+    Holds a thread lock and, where available, an exclusive lock on a
+    lock file, such that exports from other processes wait as well.
+    """
+
+    def __init__(self, lock: threading.Lock, lockfile: Path):
+        self.lock = lock
+        self.lockfile = lockfile
+        self._fd = None
+
+    def __enter__(self):
+        self.lock.acquire()
+        if fcntl is not None:
+            try:
+                self._fd = os.open(self.lockfile, os.O_RDWR | os.O_CREAT)
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            except BaseException:
+                self.__exit__(None, None, None)
+                raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if self._fd is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+                os.close(self._fd)
+                self._fd = None
+        finally:
+            self.lock.release()
+
+
+class _ExportWorker:
+    """Exports data to csv in a background thread.
+
+    Exports that are scheduled within the same interval are combined,
+    such that a burst of finished sessions triggers only one export per
+    csv file. The data of each session is collected when the export is
+    scheduled, so the export does not depend on the session's state
+    afterwards.
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def schedule(self, exporter: Exporter, data_type: str, delay: float):
+        """Schedules the current session's data of type *data_type* to
+        be exported with *exporter* after at most *delay* seconds."""
+        data = exporter.session_data(data_type)
+        version = exporter.exp.config.get("metadata", "version")
+        key = (str(exporter.csv_dir), data_type, version)
+
+        with self._cond:
+            deadline = time.monotonic() + delay
+            if key in self._pending:
+                _, collected, first = self._pending[key]
+                collected.append(data)
+                deadline = min(deadline, first)
+                self._pending[key] = (exporter, collected, deadline)
+            else:
+                self._pending[key] = (exporter, [data], deadline)
+
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="Exporter")
+                self._thread.daemon = True
+                self._thread.start()
+
+            self._cond.notify()
+
+    def flush(self):
+        """Immediately carries out all scheduled exports."""
+        with self._cond:
+            due = list(self._pending.items())
+            self._pending.clear()
+        self._export(due)
+
+    def _reset(self):
+        # after a fork, the lock may be held by a thread that does not
+        # exist in the child process, so it is replaced instead of used
+        self.__init__()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+
+                now = time.monotonic()
+                due = [(key, entry) for key, entry in self._pending.items() if entry[2] <= now]
+                if not due:
+                    self._cond.wait(min(entry[2] for entry in self._pending.values()) - now)
+                    continue
+
+                for key, _ in due:
+                    del self._pending[key]
+
+            self._export(due)
+
+    @staticmethod
+    def _export(due: list):
+        for (_, data_type, _), (exporter, collected, _) in due:
+            if data_type == DataManager.CODEBOOK_DATA:
+                data = {}
+                for codebook in collected:
+                    data.update(codebook)
+            else:
+                data = list(chain(*collected))
+
+            try:
+                exporter.export(data_type, data)
+            except Exception:
+                exporter.exp.log.exception(f"Exception during background export of {data_type}.")
+
+
+export_worker = _ExportWorker()
+"""Global (application-wide) background exporter."""
+atexit.register(export_worker.flush)
+
+if hasattr(os, "register_at_fork"):
+    # Scheduled exports belong to the parent process
+    os.register_at_fork(after_in_child=export_worker._reset)
+
+
 def find_unique_name(directory, filename, exp_version=None, index: int = 1):
     filename = Path(filename)
     name = filename.stem
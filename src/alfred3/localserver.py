@@ -4,6 +4,12 @@ import logging
 import traceback
 import re
 import os
+import copy
+import time
+import threading
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
 
 from uuid import uuid4
 from pathlib import Path
@@ -20,7 +26,8 @@ from flask import (
     send_from_directory,
     jsonify
 )
-from uuid import uuid4
+from thesmuggler import smuggle
+
 from .config import ExperimentConfig, ExperimentSecrets
 from . import alfredlog
 
@@ -38,6 +45,173 @@ class Script:
     expdir = None
     config = None
     secrets = None
+    sessions = None
+    exp_used = False
+
+
+@dataclass
+class _SessionEntry:
+    """
+    Bookkeeping for one experiment session served by the local server.
+    """
+
+    exp_session: object
+    log: object
+    last_access: float = field(default_factory=time.time)
+    lock: threading.RLock = field(default_factory=threading.RLock)
+
+    @property
+    def idle_time(self) -> float:
+        return time.time() - self.last_access
+
+
+class SessionRegistry:
+    """
+    Keeps track of all experiment sessions served by one process.
+
+    Sessions are kept in least-recently-used order. A session is evicted
+    from the registry if it was idle for longer than its
+    :attr:`.ExperimentSession.session_timeout`, or if the registry grows
+    beyond *maxsize* (in which case the least recently used session is
+    evicted first).
+
+    Args:
+        maxsize: Maximum number of sessions held in the registry.
+            If *None*, the number of sessions is not limited.
+        idle_timeout: Idle timeout in seconds for sessions without a
+            session timeout of their own. If *None*, such sessions are
+            only evicted through *maxsize*.
+
+    The registry is thread-safe. Each entry carries a lock of its own,
+    which the routes use to serialize concurrent requests of the same
+    participant.
+    """
+
+    def __init__(self, maxsize: int = None, idle_timeout: float = None):
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self._sessions = OrderedDict()
+        self._lock = threading.RLock()
+        self.log = logging.getLogger("alfred3")
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def add(self, exp_session, log) -> _SessionEntry:
+        """
+        Registers an experiment session and returns its entry.
+        """
+        entry = _SessionEntry(exp_session=exp_session, log=log)
+        with self._lock:
+            self._sessions[exp_session.session_id] = entry
+            self._sessions.move_to_end(exp_session.session_id)
+            self.evict()
+        return entry
+
+    def get(self, session_id: str) -> _SessionEntry:
+        """
+        Returns the entry for *session_id* and marks it as recently used.
+
+        Returns *None*, if there is no (unexpired) session with the
+        given id.
+        """
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+
+            if self._expired(entry):
+                self.remove(session_id)
+                return None
+
+            entry.last_access = time.time()
+            self._sessions.move_to_end(session_id)
+            return entry
+
+    def remove(self, session_id: str):
+        """
+        Removes a session from the registry, if it is present.
+        """
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def evict(self):
+        """
+        Evicts idle sessions and, if necessary, the least recently used
+        sessions until the registry respects its *maxsize*.
+        """
+        with self._lock:
+            expired = [sid for sid, entry in self._sessions.items() if self._expired(entry)]
+            for sid in expired:
+                self.log.debug(f"Evicting idle session {sid}.")
+                del self._sessions[sid]
+
+            if self.maxsize is None:
+                return
+
+            while len(self._sessions) > self.maxsize:
+                sid, _ = self._sessions.popitem(last=False)
+                self.log.warning(
+                    f"Evicting session {sid}, because the session registry is full "
+                    f"(max_sessions = {self.maxsize})."
+                )
+
+    def _expired(self, entry: _SessionEntry) -> bool:
+        timeout = entry.exp_session.session_timeout or self.idle_timeout
+        if not timeout:
+            return False
+        return entry.idle_time > timeout
+
+
+def _registry() -> SessionRegistry:
+    if Script.sessions is None:
+        maxsize = script.config.getint("webserver", "max_sessions", fallback=0) or None
+        idle_timeout = script.config.getint("webserver", "idle_timeout", fallback=0) or None
+        Script.sessions = SessionRegistry(maxsize=maxsize, idle_timeout=idle_timeout)
+    return Script.sessions
+
+
+def _new_experiment():
+    """
+    Returns an experiment object for a new session.
+
+    Pages and sections are instantiated once, when script.py is executed,
+    and belong to the first session they are appended to. Thus, every
+    session but the first gets an experiment object of its own by
+    executing script.py anew.
+    """
+    if not Script.exp_used or Script.expdir is None:
+        Script.exp_used = True
+        return script.exp
+
+    return smuggle(str(Path(Script.expdir) / "script.py")).exp
+
+
+def _current_entry() -> _SessionEntry:
+    """
+    Returns the session entry belonging to the current request.
+
+    The session is identified via the session id stored in flask's
+    signed session cookie. For compatibility with setups that place
+    an experiment session in :attr:`Script.exp_session` directly
+    without calling the route /start, that session is used if the
+    request does not carry a session id.
+    """
+    session_id = session.get("session_id", None)
+    if session_id is not None:
+        return _registry().get(session_id)
+
+    if script.exp_session is not None:
+        registry = _registry()
+        entry = registry.get(script.exp_session.session_id)
+        if entry is None:
+            entry = registry.add(script.exp_session, script.exp_session.log)
+        return entry
+
+    return None
 
 
 app = Flask(__name__)
@@ -53,34 +227,40 @@ def start():
     # TODO: Remove try-except block in v2.0.0 (keep "try" part)
     # pylint: disable=unsubscriptable-object
     exp_id = script.config.get("metadata", "exp_id")
-    session_id = script.config.get("metadata", "session_id")
-    # session_id = uuid4().hex
+    session_id = "sid-" + uuid4().hex
     log = alfredlog.QueuedLoggingInterface("alfred3", f"exp.{exp_id}")
     log.session_id = session_id
-    script.log = log
 
     try:
-        script.exp_session = script.exp.create_session(session_id=session_id, config=script.config, secrets=script.secrets, **request.args)
+        exp = _new_experiment()
+        # each session gets its own config, because create_session may alter it
+        config = copy.deepcopy(script.config)
+        exp_session = exp.create_session(session_id=session_id, config=config, secrets=script.secrets, **request.args)
     except Exception:
-        script.log.exception("Expection during experiment generation.")
+        log.exception("Expection during experiment generation.")
         abort(500)
 
+    entry = _registry().add(exp_session, log)
+
     # start experiment
-    try:
-        script.exp_session._start()
-    except Exception:
-        log.exception("Exception during experiment startup.")
-        abort(500)
+    with entry.lock:
+        try:
+            exp_session._start()
+        except Exception:
+            log.exception("Exception during experiment startup.")
+            _registry().remove(session_id)
+            abort(500)
 
     # Experiment startup message
 
+    session["session_id"] = session_id
     session["page_tokens"] = []
 
     try:
         return redirect(url_for("experiment"))
     except Exception:
         log.exception("Exception during experiment startup.")
-        script.exp_session.abort(
+        exp_session.abort(
             reason="error",
             title="Oops - Something went wrong",
             icon="mug-hot",
@@ -91,6 +271,16 @@ def start():
 
 @app.route("/experiment", methods=["GET", "POST"])
 def experiment():
+    entry = _current_entry()
+    if entry is None:
+        return redirect(url_for("start", **request.args))
+
+    with entry.lock:
+        return _experiment(entry.exp_session, entry.log)
+
+
+def _experiment(exp_session, log):
+    page_token = None
     try:
         if request.method == "POST":
 
@@ -112,12 +302,12 @@ def experiment():
 
             # data = process_multiple_choice_lists(data=data)
 
-            script.exp_session.movement_manager.current_page._set_data(data)
+            exp_session.movement_manager.current_page._set_data(data)
 
             if move is None and not data:
                 pass
             elif move:
-                script.exp_session.movement_manager.move(direction=move)
+                exp_session.movement_manager.move(direction=move)
             else:
                 abort(400)
 
@@ -126,7 +316,7 @@ def experiment():
         elif request.method == "GET":
             url_pagename = request.args.get("page", None) # https://basepath.de/experiment?page=name
             if url_pagename:
-                script.exp_session.movement_manager.jump_by_name(name=url_pagename)
+                exp_session.movement_manager.jump_by_name(name=url_pagename)
 
             page_token = str(uuid4())
 
@@ -141,19 +331,19 @@ def experiment():
             token_list.append(page_token)
             session["page_tokens"] = token_list
 
-            html = script.exp_session.user_interface_controller.render_html(page_token)
+            html = exp_session.user_interface_controller.render_html(page_token)
             resp = make_response(html)
             resp.cache_control.no_cache = True
             return resp
     except Exception:
-        script.log.exception("Exception during experiment execution.")
-        script.exp_session.abort(
+        log.exception("Exception during experiment execution.")
+        exp_session.abort(
             reason="error",
             title="Oops - Something went wrong",
             icon="mug-hot",
             msg="Sorry, there was an error on our side (500)."
         )
-        html = script.exp_session.user_interface_controller.render_html(page_token)
+        html = exp_session.user_interface_controller.render_html(page_token)
         resp = make_response(html)
         resp.cache_control.no_cache = True
         return resp
@@ -162,7 +352,11 @@ def experiment():
 
 @app.route("/staticfile/<identifier>")
 def staticfile(identifier):
-    path, content_type = script.exp_session.user_interface_controller.get_static_file(identifier)
+    entry = _current_entry()
+    if entry is None:
+        abort(404)
+
+    path, content_type = entry.exp_session.user_interface_controller.get_static_file(identifier)
     dirname, filename = os.path.split(path)
     resp = make_response(send_from_directory(dirname, filename, mimetype=content_type))
     return resp
@@ -170,7 +364,11 @@ def staticfile(identifier):
 
 @app.route("/dynamicfile/<identifier>")
 def dynamicfile(identifier):
-    strIO, content_type = script.exp_session.user_interface_controller.get_dynamic_file(identifier)
+    entry = _current_entry()
+    if entry is None:
+        abort(404)
+
+    strIO, content_type = entry.exp_session.user_interface_controller.get_dynamic_file(identifier)
     resp = make_response(send_file(strIO, mimetype=content_type))
     resp.cache_control.no_cache = True
     return resp
@@ -178,14 +376,20 @@ def dynamicfile(identifier):
 
 @app.route("/callable/<identifier>", methods=["GET", "POST"])
 def callable(identifier):
-    f = script.exp_session.user_interface_controller.get_callable(identifier)
+    entry = _current_entry()
+    if entry is None:
+        abort(404)
+
+    with entry.lock:
+        f = entry.exp_session.user_interface_controller.get_callable(identifier)
     
-    if request.content_type == "application/json":
-        values = request.get_json()
-    else:
-        values = request.values.to_dict()
-    values.pop("_", None)
-    rv = f(**values)
+        if request.content_type == "application/json":
+            values = request.get_json()
+        else:
+            values = request.values.to_dict()
+        values.pop("_", None)
+        rv = f(**values)
+
     if rv is not None:
         resp = jsonify(rv)
     else:
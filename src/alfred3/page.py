@@ -90,6 +90,8 @@ class _PageCore(ExpMember):
             self.progress = progress
 
         self._data = {}
+        self._data_fragment = None
+        self._data_version = 0
         self._is_closed = False
         self.show_times = []
         self.hide_times = []
@@ -182,14 +184,34 @@ class _PageCore(ExpMember):
         of its parent sections. The page is only shown, if all
         conditions evaluate to *True*.
         """
-        thispage = super().should_be_shown
-        sections = [sec.should_be_shown for sec in self.uptree()]
-        return thispage and all(sections)
+        return self._shown()
 
     @should_be_shown.setter
     def should_be_shown(self, value: bool):
         self._should_be_shown = bool(value)
 
+        if self.section is not None:
+            self.section._tree_changed()
+
+    def _shown(self, section_shown=None) -> bool:
+        """
+        Evaluates the page's own settings and the status of its parent
+        sections, see :attr:`.should_be_shown`.
+
+        Args:
+            section_shown (callable): Takes a section and returns
+                *True*, if the section and all of its parent sections
+                should be shown. Allows for evaluating sections only once
+                for several pages. If *None*, the parent sections are
+                evaluated directly.
+        """
+        thispage = super().should_be_shown
+        if section_shown is not None:
+            return thispage and (self.section is None or section_shown(self.section))
+
+        sections = [sec.should_be_shown for sec in self.uptree()]
+        return thispage and all(sections)
+
     @property
     def must_be_shown(self) -> bool:
         """
@@ -252,6 +274,7 @@ class _PageCore(ExpMember):
                 self += jumplist
 
         self.on_each_show()
+        self._data_changed()
 
         if self.exp.aborted:
             raise AbortMove
@@ -302,6 +325,7 @@ class _PageCore(ExpMember):
         self.on_each_hide()
 
         self._has_been_hidden = True
+        self._data_changed()
 
         self.save_data()
 
@@ -443,6 +467,16 @@ class _PageCore(ExpMember):
         """
         pass
 
+    def _data_changed(self):
+        """
+        Marks the page's data as changed, such that the cached data
+        fragment is recomputed on the next access to :attr:`.data`.
+        """
+        self._data_fragment = None
+        self._data_version += 1
+        if self.exp is not None:
+            self.exp.data_manager._data_version += 1
+
 
 @inherit_kwargs
 class _CoreCompositePage(_PageCore):
@@ -546,6 +580,11 @@ class _CoreCompositePage(_PageCore):
                 elmnt.added_to_experiment(self.exp)
 
             self.elements[elmnt.name] = elmnt
+            self._data_changed()
+
+            if self.section is not None:
+                self.section._register(elements={elmnt.name: elmnt})
+                self.section._tree_changed()
 
     def _generate_element_name(self, element):
         i = self._element_name_counter
@@ -598,15 +637,23 @@ class _CoreCompositePage(_PageCore):
         Returns a dict of data for all input elements on the page. 
 
         If the page has not been shown yet, an empty dict is returned.
+
+        The data is cached until the page receives input, is shown or
+        hidden, or the input of one of its elements is set. The
+        element data dicts in the returned dict are shared with the
+        cache and must not be modified.
         """
 
         if not self.has_been_shown:
             return {}
-        else:
+
+        if self._data_fragment is None:
             data = {}
             for element in self.input_elements.values():
                 data.update(element.data)
-            return data
+            self._data_fragment = data
+
+        return dict(self._data_fragment)
 
     @property
     def unlinked_data(self) -> dict:
@@ -619,6 +666,7 @@ class _CoreCompositePage(_PageCore):
     def _set_data(self, dictionary: dict):
         for elmnt in self.input_elements.values():
             elmnt.set_data(dictionary)
+        self._data_changed()
 
     def custom_move(self):
         """
@@ -4,21 +4,44 @@ Module for quota functionality.
 
 import json
 import time
+import random
+import weakref
+from uuid import uuid4
 from dataclasses import dataclass, asdict, field
 from typing import List, Iterator
 from pathlib import Path
+from collections import Counter
 from traceback import format_exception
 
 from pymongo.collection import ReturnDocument
 
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
 from .exceptions import AllSlotsFull, SlotInconsistency
-from .data_manager import DataManager, saving_method
+from .data_manager import DataManager, saving_method, local_session_index
+from .saving_agent import write_json_atomic, SavingMetrics
+
+lock_metrics = SavingMetrics()
+"""Global (application-wide) wait times for quota locks, keyed by the
+type and name of the quota."""
+
+conflicts = Counter()
+"""Global (application-wide) number of failed conditional quota updates,
+keyed by the type and name of the quota."""
 
 @dataclass
 class SessionGroup:
 
     sessions: List[str]
 
+    STATUS_FIELDS = ["exp_session_id", "exp_start_time", "exp_finished", "exp_aborted", "exp_save_time"]
+
+    # session status prefetched by SlotManager.load_status, not serialized
+    _status = None
+
     def query(self, expid) -> dict:
         d = {}
         d["exp_id"] = expid
@@ -27,16 +50,23 @@ class SessionGroup:
 
         return d
 
-    def _load_local(self, exp) -> Iterator[dict]:
+    def _load_local(self, exp, fields: List[str] = None) -> Iterator[dict]:
         dt = DataManager.EXP_DATA
         directory = exp.config.get("local_saving_agent", "path")
         directory = exp.subpath(directory)
-        cursor = DataManager.iterate_local_data(dt, directory)
-        for data in cursor:
-            if data["exp_session_id"] in self.sessions:
-                yield data
+        index = local_session_index(exp)  # builds the index on first use
+        return DataManager.iterate_local_data(
+            dt, directory, fields=fields, session_ids=self.sessions, use_index=index is not None
+        )
 
     def _get_fields(self, exp, fields: List[str]) -> list:
+        if self._status is not None:
+            return [
+                {key: value for key, value in self._status[sid].items() if key in fields}
+                for sid in self.sessions
+                if sid in self._status
+            ]
+
         method = saving_method(exp)
         if method == "mongo":
             data = self._get_fields_mongo(exp, fields)
@@ -53,9 +83,7 @@ class SessionGroup:
         return cursor
 
     def _get_fields_local(self, exp, fields: List[str]) -> Iterator:
-        cursor = self._load_local(exp)
-        for sessiondata in cursor:
-            yield {key: value for key, value in sessiondata.items() if key in fields}
+        return self._load_local(exp, fields=fields)
 
     def finished(self, exp, data: List[dict] = None) -> bool:
         if not data:
@@ -173,12 +201,65 @@ class Slot:
         return any(group_contains_session)
 
 
+def encode_slots(slots: List[dict]) -> dict:
+    """
+    Encodes a list of slot dictionaries compactly.
+
+    The compact encoding stores each distinct label once ('labels'), 
+    the label index of each slot ('index'), and the session groups of
+    only those slots that have session groups ('groups', keyed by the
+    slot's position as a string)::
+
+        {"labels": ["a", "b"], "index": [1, 0, 0, 1], "groups": {"2": [["sid"]]}}
+
+    Returns:
+        dict: The compact encoding.
+    """
+    labels = {}
+    index = []
+    groups = {}
+    for i, slot in enumerate(slots):
+        index.append(labels.setdefault(slot["label"], len(labels)))
+        if slot.get("session_groups"):
+            groups[str(i)] = [group["sessions"] for group in slot["session_groups"]]
+
+    return {"labels": list(labels), "index": index, "groups": groups}
+
+
+def slot_labels(slots) -> List[str]:
+    """Returns the label of each slot in compact or list encoding."""
+    if isinstance(slots, dict):
+        labels = slots["labels"]
+        return [labels[i] for i in slots["index"]]
+    return [slot["label"] for slot in slots]
+
+
 @dataclass
 class SlotManager:
     slots: List[dict]
 
     def __post_init__(self):
-        self.slots = [Slot(**slot_data) for slot_data in self.slots]
+        # slot lists of earlier versions are converted on the fly
+        if isinstance(self.slots, dict):
+            self.encoded = self.slots
+        else:
+            self.encoded = encode_slots(self.slots)
+
+        labels = self.encoded["labels"]
+        groups = self.encoded["groups"]
+        self.slots = []
+        for i, label in enumerate(self.encoded["index"]):
+            session_groups = [{"sessions": sessions} for sessions in groups.get(str(i), [])]
+            self.slots.append(Slot(labels[label], session_groups))
+
+    def assign(self, slot: Slot, session_ids: List[str]):
+        """
+        Adds a session group to *slot*. Only the encoded entry of this 
+        slot is updated.
+        """
+        i = next(i for i, s in enumerate(self.slots) if s is slot)
+        slot.session_groups.append(SessionGroup(session_ids))
+        self.encoded["groups"].setdefault(str(i), []).append(list(session_ids))
 
     def open_slots(self, exp) -> Iterator[Slot]:
         return (slot for slot in self.slots if slot.open(exp))
@@ -186,6 +267,30 @@ class SlotManager:
     def pending_slots(self, exp) -> Iterator[Slot]:
         return (slot for slot in self.slots if slot.pending(exp))
 
+    def load_status(self, exp, status: dict = None) -> dict:
+        """
+        Fetches the status of all sessions in all slots with a single 
+        query. The status is used by all subsequent status checks.
+
+        Args:
+            status: Previously fetched status to be reused instead of
+                querying the database again.
+
+        Returns:
+            dict: The status fields of each session, keyed by session id.
+        """
+        groups = [group for slot in self.slots for group in slot.session_groups]
+        if status is None:
+            sessions = [sid for group in groups for sid in group.sessions]
+            status = {}
+            if sessions:
+                data = SessionGroup(sessions)._get_fields(exp, SessionGroup.STATUS_FIELDS)
+                status = {session["exp_session_id"]: session for session in data}
+
+        for group in groups:
+            group._status = status
+        return status
+
     def find_slot(self, session_ids: List[str]) -> Slot:
         for slot in self.slots:
             if session_ids in slot:
@@ -231,13 +336,47 @@ class QuotaData:
     slots: List[dict] = field(default_factory=list)
     busy: bool = False
     additional_info: dict = field(default_factory=dict)
+    version: int = 0
+    lock_owner: str = None
+    lock_expires: float = None
+
+
+@dataclass
+class QuotaStatus:
+    """Snapshot of the slot status of a quota."""
+
+    nopen: int
+    npending: int
+    timestamp: float = field(default_factory=time.time)
+
+
+_snapshots = weakref.WeakKeyDictionary()
+"""Status snapshots of quotas, per experiment session."""
 
 
 class QuotaIO:
+
+    TIMEOUT = 10
+    """Seconds after which QuotaIO gives up on loading quota data."""
+
+    LEASE = 5
+    """Seconds for which a lock on quota data is held at most. Expired
+    locks, e.g. of crashed processes, are taken over by other sessions."""
+
+    BACKOFF = 0.01
+    """Initial upper limit (in seconds) of the random waiting time 
+    between attempts to acquire a lock or to save data after a 
+    conflict. The limit doubles with every attempt up to 
+    :attr:`MAX_BACKOFF`."""
+
+    MAX_BACKOFF = 1
+
     def __init__(self, quota):
         self.quota = quota
         self.exp = quota.exp
         self.db = self.exp.db_misc
+        self.owner = None
+        self._lockfile = None
 
         if saving_method(self.exp) == "local":
             self.path.parent.mkdir(exist_ok=True)
@@ -278,13 +417,14 @@ class QuotaIO:
 
     def load_local(self, insert: QuotaData) -> QuotaData:
         if not self.path.exists():
-            self.save_local(asdict(insert))
+            # the file is created while the lock is held
+            with self as data:
+                return data
 
-        else:
-            with open(self.path, "r", encoding="utf-8") as fp:
-                data = json.load(fp)
+        with open(self.path, "r", encoding="utf-8") as fp:
+            data = json.load(fp)
 
-            return QuotaData(**data)
+        return QuotaData(**data)
 
     def load_markbusy(self) -> QuotaData:
         method = saving_method(self.exp)
@@ -295,34 +435,94 @@ class QuotaIO:
 
     def load_markbusy_mongo(self) -> QuotaData:
         q = self.query
-        q["busy"] = False
+        now = time.time()
+        q["$or"] = [{"busy": False}, {"lock_expires": {"$lt": now}}]
 
-        update = {"$set": {"busy": True}}
+        owner = uuid4().hex
+        lock = {"busy": True, "lock_owner": owner, "lock_expires": now + self.LEASE}
+        update = {"$set": lock}
         rd = ReturnDocument.AFTER
 
         data = self.db.find_one_and_update(filter=q, update=update, return_document=rd)
 
         if data is None:
+            self._expire_legacy_lock_mongo(now)
             return None
 
+        self.owner = owner
         data.pop("_id", None)
 
         return QuotaData(**data)
 
+    def _expire_legacy_lock_mongo(self, now: float):
+        """
+        Locks of earlier versions have no expiry. They are held for 
+        :attr:`LEASE` seconds from the moment they are first seen, 
+        before they can be taken over.
+        """
+        q = self.query
+        q["busy"] = True
+        q["lock_expires"] = None
+        self.db.update_one(q, {"$set": {"lock_expires": now + self.LEASE}})
+
+    @property
+    def lockfile(self) -> Path:
+        return self.path.with_name(self.path.name + ".lock")
+
     def load_markbusy_local(self) -> QuotaData:
+        if fcntl is not None:
+            return self._load_flock_local()
+
         if not self.path.exists():
-            data = asdict(self.rand.data)
+            self.save_local(asdict(self.quota._insert))
 
         with open(self.path, "r", encoding="utf-8") as fp:
             data = json.load(fp)
 
-        if data["busy"]:
+        now = time.time()
+        expires = data.get("lock_expires")
+        if data["busy"] and expires is None:
+            # locks of earlier versions have no expiry, see
+            # _expire_legacy_lock_mongo
+            data["lock_expires"] = now + self.LEASE
+            self.save_local(data)
+            return None
+        elif data["busy"] and expires >= now:
             return None
 
+        self.owner = uuid4().hex
         data["busy"] = True
+        data["lock_owner"] = self.owner
+        data["lock_expires"] = now + self.LEASE
         self.save_local(data)
         return QuotaData(**data)
 
+    def _load_flock_local(self) -> QuotaData:
+        """
+        Locks the quota file with an exclusive OS-level lock on a 
+        separate lock file. The lock is released by the operating 
+        system, if the process dies.
+        """
+        lockfile = open(self.lockfile, "a")
+        try:
+            fcntl.flock(lockfile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lockfile.close()
+            return None
+
+        self._lockfile = lockfile
+        try:
+            if not self.path.exists():
+                self.save_local(asdict(self.quota._insert))
+
+            with open(self.path, "r", encoding="utf-8") as fp:
+                data = json.load(fp)
+        except BaseException:
+            self.release_local()
+            raise
+
+        return QuotaData(**data)
+
     def save(self, data: QuotaData):
         data = asdict(data)
 
@@ -333,13 +533,22 @@ class QuotaIO:
             self.save_local(data)
 
     def save_local(self, data: dict):
-        with open(self.path, "w", encoding="utf-8") as fp:
-            json.dump(data, fp, indent=4)
+        config = self.exp.config
+        write_json_atomic(
+            self.path,
+            data,
+            fsync=config.get("local_saving_agent", "fsync", fallback="batched"),
+            fsync_interval=config.getint("local_saving_agent", "fsync_interval", fallback=200) / 1000,
+            indent=4,
+        )
 
     def save_mongo(self, data: dict):
         q = self.query
         q["busy"] = True
-        self.db.find_one_and_update(filter=q, update={"$set": data})
+        q["lock_owner"] = self.owner
+        saved = self.db.find_one_and_update(filter=q, update={"$set": data})
+        if saved is None:
+            raise IOError("Lock on quota data expired before saving.")
 
     def release(self):
         method = saving_method(self.exp)
@@ -347,46 +556,174 @@ class QuotaIO:
             self.release_mongo()
         elif method == "local":
             self.release_local()
+        self.owner = None
 
     def release_mongo(self):
         q = self.query
         q["busy"] = True
-        u = {"$set": {"busy": False}}
+        q["lock_owner"] = self.owner
+        u = {"$set": {"busy": False, "lock_owner": None, "lock_expires": None}}
         self.db.find_one_and_update(filter=q, update=u)
 
     def release_local(self):
+        if self._lockfile is not None:
+            fcntl.flock(self._lockfile, fcntl.LOCK_UN)
+            self._lockfile.close()
+            self._lockfile = None
+            return
+
         with open(self.path, "r", encoding="utf-8") as fp:
             data = json.load(fp)
 
+        # the lock may have expired and been taken over by another session
+        if data.get("lock_owner") != self.owner:
+            return
+
         data["busy"] = False
+        data["lock_owner"] = None
+        data["lock_expires"] = None
         self.save_local(data)
 
+    def save_if_unchanged_mongo(self, data: QuotaData, before: dict) -> bool:
+        """
+        Saves the changes to *data* since it was loaded (*before*), if 
+        the quota document has not been changed since. Returns *True*, 
+        if the data was saved.
+        """
+        q = self.query
+        # documents saved before version counting have no version field
+        q["version"] = data.version if data.version else {"$in": [0, None]}
+
+        u = self._update(before, asdict(data))
+        u["$inc"] = {"version": 1}
+        saved = self.db.find_one_and_update(filter=q, update=u)
+        if saved is not None:
+            data.version += 1
+            return True
+        return False
+
+    @staticmethod
+    def _update(before: dict, after: dict) -> dict:
+        """
+        Computes a mongo update for the changes from *before* to 
+        *after*. Session groups of compactly encoded slots are updated 
+        individually.
+        """
+        set_, push = {}, {}
+        for key, value in after.items():
+            old = before.get(key)
+            if key in ("busy", "version", "lock_owner", "lock_expires") or value == old:
+                continue
+
+            compact = key == "slots" and isinstance(value, dict) and isinstance(old, dict)
+            if (
+                not compact
+                or value["labels"] != old["labels"]
+                or value["index"] != old["index"]
+                or old["groups"].keys() - value["groups"].keys()
+            ):
+                set_[key] = value
+                continue
+
+            for i, groups in value["groups"].items():
+                old_groups = old["groups"].get(i)
+                if groups == old_groups:
+                    continue
+                elif old_groups and groups[: len(old_groups)] == old_groups:
+                    push[f"slots.groups.{i}"] = {"$each": groups[len(old_groups) :]}
+                else:
+                    set_[f"slots.groups.{i}"] = groups
+
+        update = {}
+        if set_:
+            update["$set"] = set_
+        if push:
+            update["$push"] = push
+        return update
+
+    def transaction(self, func):
+        """
+        Applies *func* to the quota data and saves the changed data.
+
+        *func* receives the current :class:`QuotaData` and may change it
+        in place. Its return value is returned. In mongo mode, the data
+        is saved with a conditional update: If another session changed
+        the quota document in the meantime, *func* is applied again to
+        the fresh data after a random waiting time (see 
+        :attr:`BACKOFF`). No lock is held. In local mode, the quota file 
+        is locked while *func* is applied.
+        """
+        if saving_method(self.exp) == "mongo":
+            return self._transaction_mongo(func)
+
+        with self as data:
+            before = asdict(data)
+            result = func(data)
+            if asdict(data) != before:
+                data.version += 1
+                self.save(data)
+            return result
+
+    def _transaction_mongo(self, func):
+        start = time.time()
+        attempt = 0
+        while time.time() - start < self.TIMEOUT:
+            data = self.load()
+            before = asdict(data)
+
+            try:
+                result = func(data)
+            except Exception as e:
+                self._handle_error(type(e), e, e.__traceback__)
+                raise
+
+            if asdict(data) == before or self.save_if_unchanged_mongo(data, before):
+                return result
+
+            conflicts[f"{self.quota.DATA_TYPE}:{self.quota.name}"] += 1
+            self._backoff(attempt)
+            attempt += 1
+
+        raise IOError("Could not save data.")
+
+    def _backoff(self, attempt: int):
+        """Waits before the next attempt to access the quota data."""
+        # exponential backoff with full jitter
+        backoff = min(self.MAX_BACKOFF, self.BACKOFF * 2 ** attempt)
+        time.sleep(random.uniform(0, backoff))
+
+    def _handle_error(self, exc_type, exc_value, traceback):
+        if exc_type == AllSlotsFull:
+            return
+
+        self.exp.abort(reason="quota_error")
+        tb = "".join(format_exception(exc_type, exc_value, traceback))
+        self.exp.log.error(
+            (
+                f"There was an error in a quota operation."
+                "I aborted the experiment."
+                f"{tb}"
+            )
+        )
+
     def __enter__(self):
-        data = self.load_markbusy()
         start = time.time()
+        data = self.load_markbusy()
+        attempt = 0
         while not data:
-            time.sleep(1)
-            data = self.load_markbusy()
-            if time.time() - start > 10:
+            if time.time() - start > self.TIMEOUT:
                 raise IOError("Could not load data.")
+            self._backoff(attempt)
+            attempt += 1
+            data = self.load_markbusy()
+
+        lock_metrics.record(f"{self.quota.DATA_TYPE}:{self.quota.name}", time.time() - start)
         return data
 
     def __exit__(self, exc_type, exc_value, traceback):
-
-        if exc_type and exc_type != AllSlotsFull:
-            self.release()
-            self.exp.abort(reason="quota_error")
-            tb = "".join(format_exception(exc_type, exc_value, traceback))
-            self.exp.log.error(
-                (
-                    f"There was an error in a locked operation."
-                    "I aborted the experiment and released the lock."
-                    f"{tb}"
-                )
-            )
-
-        else:
-            self.release()
+        self.release()
+        if exc_type:
+            self._handle_error(exc_type, exc_value, traceback)
 
 
 
@@ -446,6 +783,12 @@ class SessionQuota:
 
     DATA_TYPE = "quota_data"
 
+    status_ttl: float = 0
+    """Seconds for which a status snapshot (see :meth:`snapshot`) is
+    reused by :attr:`nopen`, :attr:`npending`, :attr:`full`, 
+    :attr:`nfinished` and :attr:`allfinished`. Increase it for pages 
+    that poll these statistics frequently, e.g. admin dashboards."""
+
     def __init__(self, nslots: int, exp, respect_version: bool = True, inclusive: bool = False, name: str = "quota", abort_page=None):
         self.nslots = nslots
         self.slot_label = "slot"
@@ -474,23 +817,47 @@ class SessionQuota:
     
     def _initialize_slots(self):
         self.io.load()
+        self.io.transaction(self._fill_slots)
 
-        with self.io as data:
-            if not data.slots:
-                data.slots = self._generate_slots()
-                self.io.save(data)
+    def _fill_slots(self, data: QuotaData):
+        if not data.slots:
+            data.slots = encode_slots(self._generate_slots())
 
     def _generate_slots(self) -> List[dict]:
         slots = [{"label": self.slot_label}] * self.nslots
         return slots
     
+    def snapshot(self) -> QuotaStatus:
+        """
+        Returns a snapshot of the quota's slot status.
+
+        The snapshot is computed from one read of the quota data and one
+        query for the status of all sessions in the slots. No lock is 
+        acquired. Snapshots are shared by all quota instances with the 
+        same name in the experiment session and reused for 
+        :attr:`status_ttl` seconds. Counting a session discards the 
+        snapshot.
+        """
+        snapshots = _snapshots.setdefault(self.exp, {})
+        snapshot = snapshots.get(self._snapshot_key)
+        if snapshot is not None and time.time() - snapshot.timestamp < self.status_ttl:
+            return snapshot
+
+        data = self.io.load()
+        snapshot = QuotaStatus(nopen=self._nopen(data), npending=self._npending(data))
+        snapshots[self._snapshot_key] = snapshot
+        return snapshot
+
+    @property
+    def _snapshot_key(self) -> tuple:
+        return (self.DATA_TYPE, self.name, self.exp_version)
+
     @property
     def nopen(self) -> int:
         """
         int: Number of open slots.
         """
-        with self.io as data:
-            return self._nopen(data)
+        return self.snapshot().nopen
     
     def _nopen(self, data) -> int:
         slot_manager = self._slot_manager(data)
@@ -502,8 +869,7 @@ class SessionQuota:
         """
         int: Number of slots in which a session is still ongoing.
         """
-        with self.io as data:
-            return self._npending(data)
+        return self.snapshot().npending
     
     def _npending(self, data) -> int:
         slot_manager = self._slot_manager(data)
@@ -515,20 +881,19 @@ class SessionQuota:
         """
         bool: *True*, if the randomizer has allocated all available slots.
         """
+        snapshot = self.snapshot()
         if self.inclusive:
-            return (self.nopen + self.npending) == 0
+            return (snapshot.nopen + snapshot.npending) == 0
         else:
-            return self.nopen == 0
+            return snapshot.nopen == 0
 
     @property
     def nfinished(self) -> int:
         """
         int: Number of finished slots.
         """
-        with self.io as data:
-            nopen = self._nopen(data)
-            npending = self._npending(data)
-            return self.nslots - (nopen + npending)
+        snapshot = self.snapshot()
+        return self.nslots - (snapshot.nopen + snapshot.npending)
         
     @property
     def allfinished(self) -> bool:
@@ -585,51 +950,55 @@ class SessionQuota:
                 
                 exp += al.Page(title = "Hello, World!", name="hello_world")
         """
-        with self.io as data:
-            self._validate(data)
+        _snapshots.get(self.exp, {}).pop(self._snapshot_key, None)
+        return self.io.transaction(lambda data: self._count(data, raise_exception))
 
-            slot_manager = self._slot_manager(data)
-            slot = self._own_slot(data)
-            
-            if slot:
-                return slot.label
-            
-            full = not self._accepts_sessions(data)
-            if full and raise_exception:
-                raise AllSlotsFull
-            elif full:
-                self._abort_exp()
-                return "__ABORTED__"
-            
-            slot = next(slot_manager.open_slots(self.exp), None)
+    def _count(self, data: QuotaData, raise_exception: bool) -> str:
+        self._validate(data)
 
-            if slot is None and self.inclusive:
-                slot = slot_manager.next_pending(self.exp)
+        slot_manager = self._slot_manager(data)
+        slot = self._own_slot(data)
+        
+        if slot:
+            return slot.label
+        
+        full = not self._accepts_sessions(data)
+        if full and raise_exception:
+            raise AllSlotsFull
+        elif full:
+            self._abort_exp()
+            return "__ABORTED__"
+        
+        slot = next(slot_manager.open_slots(self.exp), None)
 
-            if slot is None:
-                msg = "No slot found, even though the quota does not appear to be full."
-                raise SlotInconsistency(msg)
+        if slot is None and self.inclusive:
+            slot = slot_manager.next_pending(self.exp)
 
-            self._update_slot(slot)
+        if slot is None:
+            msg = "No slot found, even though the quota does not appear to be full."
+            raise SlotInconsistency(msg)
 
-            data.slots = asdict(slot_manager)["slots"]
-            self.io.save(data)
-            return slot.label
-    
-    def _update_slot(self, slot):
-        group = SessionGroup(self.session_ids)
-        slot.session_groups.append(group)
+        slot_manager.assign(slot, self.session_ids)
+        data.slots = slot_manager.encoded
+        return slot.label
     
     def _slot_manager(self, data: QuotaData) -> SlotManager:
-        return SlotManager(data.slots)
+        # slots and status are built once per loaded data and reused
+        cached = getattr(data, "_slot_manager", None)
+        if cached is not None and cached[0] is data.slots:
+            return cached[1]
+
+        slot_manager = SlotManager(data.slots)
+        status = getattr(data, "_session_status", None)
+        data._session_status = slot_manager.load_status(self.exp, status)
+        data._slot_manager = (data.slots, slot_manager)
+        return slot_manager
     
     def next(self) -> Slot:
         """
         Returns the next open slot.
         """
-        with self.io as data:
-            open_slots = self._slot_manager(data).open_slots(self.exp)
-        
+        open_slots = self.io.transaction(lambda data: self._slot_manager(data).open_slots(self.exp))
         return next(open_slots)
     
     def _own_slot(self, data: QuotaData) -> Slot:
@@ -9,7 +9,7 @@ from typing import List, Tuple
 from itertools import product
 from collections import Counter
 
-from .quota import SessionQuota, QuotaData, QuotaIO
+from .quota import SessionQuota, QuotaData, QuotaIO, encode_slots, slot_labels
 from .exceptions import ConditionInconsistency
 from .data_manager import saving_method
 from .compatibility.condition import ListRandomizer as OldListRandomizer
@@ -575,13 +575,9 @@ class ListRandomizer(SessionQuota):
         """
         return super().count(raise_exception=raise_exception)
 
-    def _initialize_slots(self):
-        self.io.load()
-
-        with self.io as data:
-            if not data.slots:
-                data.slots = self._randomize_slots()
-                self.io.save(data)
+    def _fill_slots(self, data: QuotaData):
+        if not data.slots:
+            data.slots = encode_slots(self._randomize_slots())
 
     def _generate_slots(self) -> List[dict]:
         slots = []
@@ -602,7 +598,7 @@ class ListRandomizer(SessionQuota):
                     "Experiment version and randomizer version do not match."
                 )
 
-        data_conditions = [slot["label"] for slot in data.slots]
+        data_conditions = slot_labels(data.slots)
         counted = Counter(data_conditions)
 
         instance = dict(self.conditions)
@@ -33,6 +33,18 @@ with arguments of your choice.
         runner.print_startup_message()
         runner.app.run(use_reloader=False, debug=False)
 
+For serving an experiment to many participants at once, use
+:meth:`ExperimentRunner.serve` (or ``alfred3 serve`` on the command 
+line), which handles requests in a pool of threads and, optionally, 
+in several worker processes:
+
+.. code-block:: python
+    from alfred3.run import ExperimentRunner
+
+    if __name__ == "__main__":
+        runner = ExperimentRunner()
+        runner.serve(host="0.0.0.0", port=8000, workers=2, threads=16)
+
 .. moduleauthor:: Johannes Brachem <jbrachem@posteo.de>
 """
 
@@ -44,15 +56,20 @@ import threading
 import logging
 import platform
 import subprocess
+import signal
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from uuid import uuid4
 
 import click
 from thesmuggler import smuggle
+from werkzeug.serving import BaseWSGIServer
 
 from alfred3._helper import socket_checker
 from alfred3 import localserver
 from alfred3 import alfredlog
+from alfred3 import saving_agent
+from alfred3.export import export_worker
 from alfred3.config import ExperimentConfig
 from alfred3.config import ExperimentSecrets
 
@@ -145,6 +162,8 @@ class ExperimentRunner:
         localserver.Script.config = self.config
         localserver.Script.secrets = self.secrets
         localserver.Script.exp = script.exp
+        localserver.Script.sessions = None
+        localserver.Script.exp_used = False
         
         self.app = localserver.app
         secret_key = self.secrets.get("flask", "secret_key", fallback=None)
@@ -213,6 +232,129 @@ class ExperimentRunner:
         self.print_startup_message()
         self.app.run(port=self.port, threaded=False, use_reloader=False, debug=debug)
 
+    def serve(self, host: str = None, port: int = None, workers: int = None, threads: int = None):
+        """
+        Serves the experiment for production use.
+
+        Args:
+            host: Hostname or IP address to listen on. Defaults to None,
+                which leads to taking the value from option 'host' in
+                section 'webserver' of config.conf.
+            port: Port to listen on. Defaults to None, which leads to
+                taking the value from config.conf.
+            workers: Number of worker processes. Defaults to None, which
+                leads to taking the value from config.conf.
+            threads: Number of request handling threads per worker 
+                process. Defaults to None, which leads to taking the 
+                value from config.conf.
+
+        Each worker process handles requests in a fixed pool of 
+        *threads* threads. Experiment sessions live in the memory of the
+        process that started them. Therefore, if you use more than one
+        worker, each worker listens on a port of its own (*port*,
+        *port* + 1, ...), and requests must be routed to the workers 
+        with sticky sessions, for example by a reverse proxy that
+        balances by client IP. Several workers are only available on
+        platforms that support :func:`os.fork`.
+
+        Upon SIGINT or SIGTERM, the server stops accepting requests,
+        finishes the requests in progress and drains the global saving
+        queue before it exits.
+        """
+        webserver = self.config["webserver"]
+        host = webserver.get("host", "127.0.0.1") if host is None else host
+        port = webserver.getint("port", 5000) if port is None else port
+        workers = webserver.getint("workers", 1) if workers is None else workers
+        threads = webserver.getint("threads", 8) if threads is None else threads
+
+        if workers > 1 and not hasattr(os, "fork"):
+            raise ValueError("Serving with more than one worker process requires os.fork.")
+
+        self.configure_logging()
+        self.create_experiment_app()
+
+        if workers == 1:
+            self._serve_worker(host, port, threads)
+            return
+
+        children = []
+        for i in range(workers):
+            pid = os.fork()
+            if pid == 0:
+                self._serve_worker(host, port + i, threads)
+                os._exit(0)
+            children.append(pid)
+
+        def terminate(signum, frame):
+            for pid in children:
+                os.kill(pid, signal.SIGTERM)
+
+        signal.signal(signal.SIGTERM, terminate)
+        signal.signal(signal.SIGINT, terminate)
+
+        for pid in children:
+            os.waitpid(pid, 0)
+
+    def _serve_worker(self, host: str, port: int, threads: int):
+        server = ThreadPoolServer(host, port, self.app, threads=threads)
+
+        def shutdown(signum, frame):
+            # shutdown() blocks until serve_forever() returns, so it
+            # must not be called from the serving thread itself
+            threading.Thread(target=server.shutdown, name="shutdown").start()
+
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+
+        msg = f" * Serving experiment on http://{host}:{port}/start (pid {os.getpid()}, {threads} threads)\n"
+        sys.stderr.writelines([msg])
+
+        try:
+            server.serve_forever()
+        finally:
+            # waits for requests in progress, which may still queue
+            # saves and exports, before these are drained
+            server.server_close()
+            saving_agent.stop_saving_thread()
+            export_worker.flush()
+
+
+class ThreadPoolServer(BaseWSGIServer):
+    """
+    WSGI server that handles requests in a fixed pool of threads.
+
+    Args:
+        host: Hostname or IP address to listen on.
+        port: Port to listen on.
+        app: The WSGI application to serve.
+        threads: Number of request handling threads.
+        **kwargs: Further keyword arguments are passed on to
+            :class:`werkzeug.serving.BaseWSGIServer`.
+    
+    Closing the server waits for all requests in progress to finish.
+    """
+
+    multithread = True
+
+    def __init__(self, host: str, port: int, app, threads: int = 8, **kwargs):
+        super().__init__(host, port, app, **kwargs)
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="alfred3-request")
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._process_request_thread, request, client_address)
+
+    def _process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
 
 class ChromeKiosk:
     """Open a Chrome window in kiosk mode.
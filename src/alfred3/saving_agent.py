@@ -11,16 +11,24 @@ import os
 import json
 import copy
 import re
+import itertools
+import atexit
+import tempfile
+import sqlite3
+import stat
 
 from abc import ABC, abstractmethod
 from configparser import ConfigParser, SectionProxy
+from collections import deque
 from pathlib import Path
-from typing import Union, Tuple
+from typing import Union, Tuple, Iterator
 from uuid import uuid4
 from configparser import NoSectionError
 
 import pymongo
+from pymongo import ReplaceOne, UpdateOne
 from pymongo.collection import ReturnDocument
+from pymongo.errors import BulkWriteError
 import bson
 
 from . import alfredlog
@@ -29,76 +37,1048 @@ from .exceptions import SavingAgentException, SavingAgentRunException
 
 _logger = logging.getLogger(__name__)
 
-# task = (priority, save_time, level, task_id, e, data, self, agent)
+# task = (priority, save_time, level, task_id, e, data, self, agent, enqueue_time)
 # def _do_saving(self, data: dict, name: str, level: int, data_time: float):
 
 
-def _save_worker():
-    """Takes a data dictionary and saving_agent_controller from the
-    global saving queue and calls the saving method of the controller.
+class SavingMetrics:
+    """Collects latency metrics for saving tasks.
+
+    The latency of a task is the time between putting the task into the
+    saving queue and the completion of the task. Metrics are collected 
+    per saving lane (see :class:`_SavingLane`).
+
+    Args:
+        window: Number of most recent latencies per lane that are kept
+            for the computation of percentiles.
     """
-    try:
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._lock = threading.Lock()
+        self._lanes = {}
+
+    def record(self, lane: str, latency: float):
+        """Records the latency (in seconds) of one task."""
+        with self._lock:
+            m = self._lanes.setdefault(
+                lane, {"count": 0, "total": 0.0, "max": 0.0, "recent": deque(maxlen=self.window)}
+            )
+            m["count"] += 1
+            m["total"] += latency
+            m["max"] = max(m["max"], latency)
+            m["recent"].append(latency)
+
+    def summary(self) -> dict:
+        """
+        dict: A dictionary with one entry per lane, containing the
+        number of tasks, and the mean, median, 95th percentile and 
+        maximum latency in seconds.
+        """
+        with self._lock:
+            summary = {}
+            for lane, m in self._lanes.items():
+                recent = sorted(m["recent"])
+                summary[lane] = {
+                    "count": m["count"],
+                    "mean": m["total"] / m["count"],
+                    "p50": recent[int(0.5 * (len(recent) - 1))],
+                    "p95": recent[int(0.95 * (len(recent) - 1))],
+                    "max": m["max"],
+                }
+            return summary
+
+    def reset(self):
+        """Discards all collected metrics."""
+        with self._lock:
+            self._lanes = {}
+
+
+metrics = SavingMetrics()
+"""Global (application-wide) latency metrics for saving tasks."""
+
+
+_QUIT = (0,)
+"""Quit signal for saving lanes. It has the highest priority of all
+tasks and is thus taken from a lane's queue before any saving task."""
+
+
+class _SavingLane:
+    """A saving thread with a queue of its own.
+
+    The thread blocks until a task is put into its queue, then takes
+    all queued tasks at once and processes them as one batch.
+
+    Args:
+        name: Name of the lane and its thread.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.queue = queue.PriorityQueue()
+        self.quit_event = _quit_event
+        self.thread = threading.Thread(target=self._loop, name=name)
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        """Signals the thread to stop after saving the queued tasks."""
+        self.queue.put(_QUIT)
+
+    def put(self, task: tuple):
+        self.queue.put(task)
+        if self.quit_event.is_set():
+            # the thread stops after the quit signal, so the task is
+            # saved in the calling thread
+            self._work([])
+
+    def _loop(self):
+        while True:
+            task = self.queue.get()
+            if task is _QUIT:
+                self.queue.task_done()
+                # tasks that were put while the thread stopped
+                self._work([])
+                return
+
+            if self._work([task]):
+                return
+
+    def _work(self, tasks: list) -> bool:
+        """Takes all remaining saving tasks from the queue and hands 
+        them over to :func:`_process_tasks`.
+
+        Returns:
+            bool: True, if the quit signal was taken from the queue.
+        """
+        quit = False
         while True:
             try:
-                (
-                    _,
-                    t,
-                    lvl,
-                    _,
-                    event,
-                    data,
-                    sa_controller,
-                    agent_name,
-                ) = _queue.get_nowait()
+                task = self.queue.get_nowait()
             except queue.Empty:
                 break
+
+            if task is _QUIT:
+                quit = True
+                self.queue.task_done()
+            else:
+                tasks.append(task)
+
+        try:
+            _process_tasks(tasks)
+        except Exception:
+            _logger.critical("CRITICAL ERROR: Exception occured during save worker execution.")
+            _logger.exception("")
+        finally:
+            now = time.time()
+            for task in tasks:
+                metrics.record(self.name, now - task[8])
+                task[4].set()
+                self.queue.task_done()
+
+        return quit
+
+
+def _coalesce(tasks: list) -> list:
+    """Reduces a list of saving tasks to the newest task per saving agent.
+
+    Every data snapshot contains the full data of a session, so older
+    snapshots for the same agent are superseded by newer ones. The
+    remaining task inherits the highest level of the tasks it replaces,
+    because the older snapshots would have been saved at that level.
+
+    Returns:
+        list: The coalesced tasks, sorted by priority and data time.
+    """
+    newest = {}
+    for task in tasks:
+        priority, t, lvl, task_id, event, data, sa_controller, agent_name, enqueued = task
+        key = (id(sa_controller), agent_name)
+        previous = newest.get(key)
+
+        if previous is None:
+            newest[key] = task
+            continue
+
+        keep = task if t >= previous[1] else previous
+        newest[key] = (
+            min(priority, previous[0]),
+            keep[1],
+            max(lvl, previous[2]),
+            keep[3],
+            keep[4],
+            keep[5],
+            sa_controller,
+            agent_name,
+            min(enqueued, previous[8]),
+        )
+
+    return sorted(newest.values(), key=lambda task: (task[0], task[1]))
+
+
+def _process_tasks(tasks: list):
+    """Coalesces saving tasks and saves them in one batch.
+    
+    Tasks for :class:`MongoSavingAgent` instances that write to the same
+    collection are saved with a single bulk write. All other tasks are
+    saved one after another.
+    """
+    batches = {}
+
+    for task in _coalesce(tasks):
+        _, t, lvl, _, _, data, sa_controller, agent_name, _ = task
+        agent = sa_controller.agents.get(agent_name)
+
+        if isinstance(agent, MongoSavingAgent):
+            batches.setdefault(agent.batch_key, []).append(task)
+        else:
             sa_controller._do_saving(data=data, agent_name=agent_name, level=lvl, data_time=t)
-            event.set()
-            _queue.task_done()
-    except Exception as e:
-        _logger.critical("CRITICAL ERROR: Exception occured during save worker execution.")
-        _logger.exception("")
-        raise e
 
+    for batch in batches.values():
+        SavingAgentController._do_batch_saving(batch)
+
+
+def _lane_for(agent) -> _SavingLane:
+    """Returns the saving lane responsible for *agent*.
+
+    Local saving agents share the first lane. Mongo saving agents are
+    distributed round-robin across the remaining lanes, so that a slow
+    database cannot stall local saving. An agent always stays in the 
+    same lane, which guarantees that no agent is saved by two lanes
+    concurrently.
+    """
+    if agent._save_lane is None or agent._save_lane >= len(_lanes):
+        if isinstance(agent, MongoSavingAgent):
+            agent._save_lane = 1 + next(_lane_counter) % (len(_lanes) - 1)
+        else:
+            agent._save_lane = 0
+    
+    return _lanes[agent._save_lane]
 
-def _save_looper(sleeptime: int = 1):
-    """Makes continuous calls to the :func:`_save_worker`.
+
+def set_saving_workers(n: int):
+    """
+    Sets the number of threads used for saving with mongo saving agents.
+
+    This limits the number of concurrent database writes. The number of
+    threads can only be increased during runtime. Local saving agents
+    are always served by a thread of their own.
 
     Args:
-        sleeptime: Seconds between two calls to :func:`_save_worker`.
+        n: Number of mongo saving threads.
     """
-    while not _quit_event.is_set():
-        _save_worker()
-        time.sleep(sleeptime)
+    with _lanes_lock:
+        while len(_lanes) - 1 < n:
+            lane = _SavingLane(name=f"DataSaver-mongo-{len(_lanes) - 1}")
+            lane.start()
+            _lanes.append(lane)
 
 
 def wait_for_saving_thread():
     """
+    Blocks until all queued saving tasks have been processed.
+
     .. todo:: implement end_session of Logger into this method and execute for all experiment types!
     """
-    # _logger.info("waiting until saving queue is empty. %s items left." % _queue.qsize())
-    _queue.join()
+    for lane in list(_lanes):
+        lane.queue.join()
+
 
+def stop_saving_thread(timeout: float = None):
+    """
+    Drains the global saving queues and stops the saving threads.
 
-# Setup an aplication wide saving thread
-_queue = queue.PriorityQueue()
-"""Global (application-wide) queue for saving tasks."""
+    Args:
+        timeout: Maximum number of seconds to wait for each saving 
+            thread to terminate after the queues have been drained. 
+            If *None*, waits until the threads have terminated.
+
+    Intended for a graceful shutdown of long-running servers: All
+    queued saving tasks are processed before the function returns.
+    """
+    wait_for_saving_thread()
+    _quit_event.set()
+    for lane in _lanes:
+        lane.stop()
+    for lane in _lanes:
+        lane.thread.join(timeout)
+    _SegmentWriter.close_all()
+    _fsync_batcher.flush()
+    _logger.info("Global alfred3 saving threads stopped.")
+
+
+def _start_saving_thread():
+    """
+    Sets up the global saving lanes and starts their threads.
+    """
+    global _lanes, _lanes_lock, _lane_counter, _quit_event
 
-_quit_event = threading.Event()
-"""Event for signalling the :func:`_save_looper` to stop."""
+    # Event for signalling the saving threads to stop
+    _quit_event = threading.Event()
 
-_thread = threading.Thread(target=_save_looper, name="DataSaver")
-"""Thread for executing the :func:`_save_looper` in the background."""
+    # One lane for local saving agents and one for mongo saving agents.
+    # The threads are daemon threads, because the entire Python program
+    # exits when only daemon threads are left.
+    _lanes = [_SavingLane(name="DataSaver")]
+    _lanes[0].start()
+    _lanes_lock = threading.Lock()
+    _lane_counter = itertools.count()
+    set_saving_workers(1)
 
-_thread.daemon = True
-"""The entire Python program exits 
-when only daemon threads are left. (From threading documentation)"""
+    _logger.info("Global alfred3 saving threads started.")
 
-_thread.start()
-"""The saving thread gets startet as soon as the alfred module is
+
+_start_saving_thread()
+"""The saving threads get startet as soon as the alfred module is
 imported."""
 
-_logger.info("Global alfred3 saving thread started.")
+if hasattr(os, "register_at_fork"):
+    # Threads do not survive a fork, so worker processes need their own
+    # saving threads
+    os.register_at_fork(after_in_child=_start_saving_thread)
+
+
+FSYNC_POLICIES = ("always", "batched", "never")
+"""Available policies for flushing local files to disk."""
+
+
+def _fsync_path(path: Path):
+    """Flushes a file or directory to disk."""
+    try:
+        fd = os.open(str(path), os.O_RDONLY)
+    except OSError:
+        # e.g. directories on Windows, or files that were replaced since
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class _FsyncBatcher:
+    """Flushes files to disk in the background.
+
+    Files scheduled for flushing within the same interval are flushed
+    together, such that many saves within a short time cost only one
+    flush per file.
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def schedule(self, path: Path, delay: float):
+        """Schedules *path* and its directory to be flushed to disk 
+        after at most *delay* seconds."""
+        with self._cond:
+            deadline = time.monotonic() + delay
+            self._pending[path] = min(deadline, self._pending.get(path, deadline))
+
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="FsyncBatcher")
+                self._thread.daemon = True
+                self._thread.start()
+            
+            self._cond.notify()
+
+    def flush(self):
+        """Immediately flushes all scheduled files."""
+        with self._cond:
+            due = list(self._pending)
+            self._pending.clear()
+        self._sync(due)
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                
+                now = time.monotonic()
+                due = [path for path, deadline in self._pending.items() if deadline <= now]
+                if not due:
+                    self._cond.wait(min(self._pending.values()) - now)
+                    continue
+                
+                for path in due:
+                    del self._pending[path]
+
+            self._sync(due)
+
+    @staticmethod
+    def _sync(paths: list):
+        for directory in {path.parent for path in paths}:
+            _fsync_path(directory)
+        for path in paths:
+            _fsync_path(path)
+
+
+_fsync_batcher = _FsyncBatcher()
+atexit.register(_fsync_batcher.flush)
+
+
+def _current_umask() -> int:
+    # the umask can only be read by setting it
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+_UMASK = _current_umask()
+
+
+def _file_mode(path: Path) -> int:
+    """
+    Returns the permissions for a file that replaces *path*: The mode
+    of the existing file, or the default mode for new files. Files
+    created by :func:`tempfile.mkstemp` are only accessible to their
+    owner, so they must be given this mode before replacing *path*.
+    """
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        return 0o666 & ~_UMASK
+
+
+def _apply_fsync_policy(path: Path, fileobj=None, fsync: str = "batched", fsync_interval: float = 0.2):
+    if fsync == "always":
+        if fileobj is not None:
+            os.fsync(fileobj.fileno())
+        else:
+            _fsync_path(path)
+    elif fsync == "batched":
+        _fsync_batcher.schedule(path, fsync_interval)
+
+
+def write_json_atomic(
+    path: Union[str, Path], data, fsync: str = "batched", fsync_interval: float = 0.2, **kwargs
+):
+    """
+    Writes *data* to a .json file atomically.
+
+    The data is first written to a temporary file in the same 
+    directory, which then replaces the target file. Thus, a crash 
+    during writing never leaves a truncated file behind: Readers see 
+    either the old or the new version.
+
+    Args:
+        path: Path of the target file.
+        data: JSON-serializable data.
+        fsync: Policy for flushing the file to disk. "always" flushes
+            the file before it replaces the target file. "batched" 
+            flushes the file (and its directory) in the background 
+            within *fsync_interval* seconds, bundling all writes in that
+            interval. "never" leaves flushing to the operating system.
+        fsync_interval: Seconds within which files are flushed to disk
+            under the "batched" policy.
+        **kwargs: Passed on to :func:`json.dump`.
+    """
+    if fsync not in FSYNC_POLICIES:
+        raise ValueError(f"Parameter 'fsync' must be one of {FSYNC_POLICIES}.")
+
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with open(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, **kwargs)
+            f.flush()
+            _apply_fsync_policy(path, fileobj=f, fsync=fsync, fsync_interval=fsync_interval)
+        os.chmod(tmp, _file_mode(path))
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+    if fsync == "always":
+        # makes the new directory entry durable
+        _fsync_path(path.parent)
+
+
+def _valid_fields(*dicts) -> bool:
+    """Checks, whether all keys can be used in dotted field paths."""
+    for d in dicts:
+        for key in d:
+            if not isinstance(key, str) or "." in key or key.startswith("$"):
+                return False
+    return True
+
+
+def update_document(base: dict, data: dict) -> dict:
+    """
+    Computes an update document that transforms *base* into *data*.
+
+    Dictionaries on the first level of the document (e.g. 
+    ``exp_data``) are compared entry by entry, such that only changed
+    entries are updated via ``$set``. Lists that only grew at their
+    end (e.g. ``exp_move_history``) are extended via ``$push``. The 
+    update document uses MongoDB's update operator syntax.
+
+    Returns:
+        dict: An update document, or *None*, if there are no changes.
+    """
+    set_, unset, push = {}, {}, {}
+    for key, value in data.items():
+        if key == "_id":
+            continue
+
+        old = base.get(key)
+        if value == old:
+            continue
+
+        if isinstance(value, dict) and isinstance(old, dict) and _valid_fields(value, old):
+            for subkey, subvalue in value.items():
+                if old.get(subkey) != subvalue:
+                    set_[f"{key}.{subkey}"] = subvalue
+            for subkey in old.keys() - value.keys():
+                unset[f"{key}.{subkey}"] = ""
+
+        elif isinstance(value, list) and isinstance(old, list) and value[: len(old)] == old:
+            push[key] = {"$each": value[len(old) :]}
+
+        else:
+            set_[key] = value
+
+    for key in base.keys() - data.keys():
+        unset[key] = ""
+
+    update = {}
+    if set_:
+        update["$set"] = set_
+    if unset:
+        update["$unset"] = unset
+    if push:
+        update["$push"] = push
+
+    return update or None
+
+
+UNCHANGED = object()
+"""Returned by :meth:`SavingAgent.delta`, if the data did not change 
+since the agent's last save."""
+
+
+def apply_update(doc: dict, update: dict) -> dict:
+    """
+    Applies an update document, as created by :func:`update_document`,
+    to *doc* in place.
+
+    Returns:
+        dict: The updated document.
+    """
+    for path, value in update.get("$set", {}).items():
+        key, _, subkey = path.partition(".")
+        if subkey:
+            doc.setdefault(key, {})[subkey] = value
+        else:
+            doc[key] = value
+
+    for path in update.get("$unset", {}):
+        key, _, subkey = path.partition(".")
+        if subkey:
+            doc.get(key, {}).pop(subkey, None)
+        else:
+            doc.pop(key, None)
+
+    for key, value in update.get("$push", {}).items():
+        doc.setdefault(key, []).extend(value["$each"])
+
+    return doc
+
+
+SEGMENT_PREFIX = "segment_"
+"""Filename prefix of append-only segment files."""
+
+
+class _SegmentWriter:
+    """Appends records to rotating .jsonl segment files.
+
+    There is one writer per directory and process, such that several
+    processes never append to the same file. Records of one saving 
+    agent are always written by the same process, in order.
+
+    Args:
+        directory: Directory of the segment files.
+        max_size: Size in bytes, after which a new segment is started.
+        fsync: Policy for flushing segments to disk (see 
+            :func:`write_json_atomic`).
+        fsync_interval: Seconds within which segments are flushed to
+            disk under the "batched" policy.
+    """
+
+    _writers = {}
+    _writers_lock = threading.Lock()
+
+    def __init__(self, directory: Path, max_size: int, fsync: str = "batched", fsync_interval: float = 0.2):
+        self.directory = directory
+        self.max_size = max_size
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.file = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def get(cls, directory: Path, max_size: int, **kwargs):
+        key = (str(directory), os.getpid())
+        with cls._writers_lock:
+            if key not in cls._writers:
+                cls._writers[key] = cls(directory, max_size, **kwargs)
+            return cls._writers[key]
+
+    @classmethod
+    def close(cls, directory: Path):
+        """Closes the current process' writer for *directory*, if any."""
+        key = (str(directory), os.getpid())
+        with cls._writers_lock:
+            writer = cls._writers.pop(key, None)
+        
+        if writer is not None:
+            writer._close()
+
+    @classmethod
+    def close_all(cls):
+        """Flushes the current process' writers to disk and closes them."""
+        pid = os.getpid()
+        with cls._writers_lock:
+            keys = [key for key in cls._writers if key[1] == pid]
+            writers = [cls._writers.pop(key) for key in keys]
+
+        for writer in writers:
+            writer._close()
+
+    def _close(self):
+        with self.lock:
+            if self.file is None:
+                return
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+            self.file = None
+
+    def append(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self.lock:
+            if self.file is None or self.file.tell() >= self.max_size:
+                self._rotate()
+
+            try:
+                self.file.write(line)
+                self.file.flush()
+                _apply_fsync_policy(
+                    Path(self.file.name), self.file, fsync=self.fsync, fsync_interval=self.fsync_interval
+                )
+            except Exception:
+                # a partially written record must not swallow the next one
+                self._rotate()
+                raise
+
+    def _rotate(self):
+        if self.file is not None:
+            self.file.close()
+        name = f"{SEGMENT_PREFIX}{time.time_ns()}_{os.getpid()}.jsonl"
+        self.file = open(self.directory / name, "a", encoding="utf-8")
+
+
+def _segment_files(directory: Path) -> list:
+    files = [fp for fp in directory.iterdir() if fp.name.startswith(SEGMENT_PREFIX) and fp.suffix == ".jsonl"]
+    return sorted(files, key=lambda fp: fp.name)
+
+
+def read_segments(directory: Union[str, Path]) -> Iterator[dict]:
+    """
+    Reads all segment files in *directory* and yields the latest 
+    snapshot of each saved document.
+
+    Incomplete records, e.g. after a crash during writing, are skipped.
+    """
+    directory = Path(directory)
+    if not directory.is_dir():
+        return
+
+    yield from _read_segment_docs(directory).values()
+
+
+def _read_segment_docs(directory: Path) -> dict:
+    docs = {}
+    for fp in _segment_files(directory):
+        with open(fp, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.decoder.JSONDecodeError:
+                    continue
+
+                key = record["key"]
+                if "doc" in record:
+                    docs[key] = record["doc"]
+                elif key in docs:
+                    apply_update(docs[key], record["update"])
+
+    return docs
+
+
+def compact_segments(directory: Union[str, Path]) -> Path:
+    """
+    Replaces all segment files in *directory* by a single segment that 
+    contains only the latest snapshot of each saved document.
+
+    Compaction must only be run while no experiment sessions save data 
+    to *directory*.
+
+    Returns:
+        Path: Path to the compacted segment file, or *None*, if there 
+        were no segment files.
+    """
+    directory = Path(directory)
+    _SegmentWriter.close(directory)
+    old = _segment_files(directory)
+    if not old:
+        return None
+
+    # zero timestamp: the compacted segment sorts before all others
+    compacted = directory / f"{SEGMENT_PREFIX}0_compacted_{time.time_ns()}.jsonl"
+    tmp = compacted.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        for key, doc in _read_segment_docs(directory).items():
+            record = {"key": key, "doc": doc}
+            f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, compacted)
+    _fsync_path(directory)
+
+    for fp in old:
+        fp.unlink()
+
+    return compacted
+
+
+class SessionIndex:
+    """
+    Persistent index of the sessions saved in a local data directory.
+
+    The index is an SQLite database next to the data files. It maps the
+    session id of each saved document to the file that holds the data
+    and to the session's status fields. Thus, single sessions can be
+    found without parsing every file in the directory.
+    :class:`LocalSavingAgent` updates the index on every save. Files
+    that were written without updating the index, e.g. by agents with
+    a switched off index, are indexed when the directory changed since
+    the last sync, or when a lookup misses a session. An index that 
+    does not exist yet is built from the files in the directory.
+
+    Further, the index holds a header record for each session: the 
+    saved document without the fields listed in 
+    :attr:`PAYLOAD_FIELDS`. Metadata can thus be read without touching
+    element data and movement history.
+
+    Use :meth:`SessionIndex.get` to obtain the index for a directory.
+
+    Args:
+        directory: The local data directory.
+    """
+
+    FILENAME = ".session_index.sqlite3"
+
+    FIELDS = ("exp_finished", "exp_aborted", "exp_start_time", "exp_save_time")
+    """Status fields that are stored in the index."""
+
+    PAYLOAD_FIELDS = ("exp_data", "exp_move_history", "additional_data")
+    """Fields that are not part of the header records."""
+
+    _COLUMNS = ("exp_session_id", "type", "file", "segment_key") + FIELDS + ("header",)
+
+    _indices = {}
+    _indices_lock = threading.Lock()
+
+    def __init__(self, directory: Union[str, Path]):
+        self.directory = Path(directory)
+        self.path = self.directory / self.FILENAME
+        self._local = threading.local()
+        self._sync()
+
+    @classmethod
+    def get(cls, directory: Union[str, Path]):
+        """Returns the session index of *directory* for the current 
+        process."""
+        key = (str(Path(directory).resolve()), os.getpid())
+        with cls._indices_lock:
+            if key not in cls._indices:
+                cls._indices[key] = cls(directory)
+            return cls._indices[key]
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite connections must not be shared between threads
+        con = getattr(self._local, "con", None)
+        if con is not None:
+            return con
+
+        con = sqlite3.connect(str(self.path), timeout=30)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "exp_session_id TEXT NOT NULL, type TEXT NOT NULL, "
+            "file TEXT, segment_key TEXT, "
+            "exp_finished INTEGER, exp_aborted INTEGER, "
+            "exp_start_time REAL, exp_save_time REAL, header TEXT, "
+            "PRIMARY KEY (exp_session_id, type))"
+        )
+        # modification times of the indexed data files
+        con.execute("CREATE TABLE IF NOT EXISTS files (name TEXT PRIMARY KEY, mtime_ns INTEGER)")
+        con.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        con.commit()
+        self._local.con = con
+        return con
+
+    @classmethod
+    def _row(cls, doc: dict, file: str = None, segment_key: str = None) -> tuple:
+        header = {key: value for key, value in doc.items() if key not in cls.PAYLOAD_FIELDS}
+        return (
+            doc["exp_session_id"],
+            doc.get("type", ""),
+            file,
+            segment_key,
+            doc.get("exp_finished"),
+            doc.get("exp_aborted"),
+            doc.get("exp_start_time"),
+            doc.get("exp_save_time"),
+            json.dumps(header, ensure_ascii=False),
+        )
+
+    def update(self, doc: dict, file: str = None, segment_key: str = None):
+        """
+        Records the current state of a saved document.
+
+        Args:
+            doc: The saved document. Documents without a session id are
+                ignored.
+            file: Name of the .json file that holds the document.
+            segment_key: Key of the document in the directory's 
+                segment files.
+        """
+        if not doc.get("exp_session_id"):
+            return
+
+        con = self._connect()
+        with con:
+            con.execute(
+                "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                self._row(doc, file, segment_key),
+            )
+            if file is not None:
+                mtime = self._mtime(self.directory / file)
+                if mtime is not None:
+                    con.execute("INSERT OR REPLACE INTO files VALUES (?, ?)", [file, mtime])
+
+    def rebuild(self):
+        """Rebuilds the index from the data files in the directory."""
+        con = self._connect()
+        with con:
+            con.execute("DELETE FROM sessions")
+            con.execute("DELETE FROM files")
+            con.execute("DELETE FROM meta")
+        self._sync()
+
+    @staticmethod
+    def _mtime(path: Path) -> int:
+        try:
+            return path.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    @staticmethod
+    def _is_data_file(name: str) -> bool:
+        if name.startswith(SEGMENT_PREFIX):
+            return name.endswith(".jsonl")
+        return name.endswith(".json")
+
+    def _sync(self):
+        """
+        Indexes the data files that were added, changed, or removed 
+        since the last sync. Files are only compared, if the 
+        modification time of the directory changed since then.
+        """
+        mtime = self._mtime(self.directory)
+        if mtime is None:
+            return
+
+        con = self._connect()
+        synced = con.execute("SELECT value FROM meta WHERE key = 'directory_mtime'").fetchone()
+        if synced is not None and int(synced[0]) == mtime:
+            return
+
+        current = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if self._is_data_file(entry.name):
+                    try:
+                        current[entry.name] = entry.stat().st_mtime_ns
+                    except OSError:
+                        continue
+
+        known = dict(con.execute("SELECT name, mtime_ns FROM files"))
+        changed = {name: m for name, m in current.items() if known.get(name) != m}
+        removed = [name for name in known if name not in current]
+        self._index_files(changed, removed)
+
+        with con:
+            con.execute("INSERT OR REPLACE INTO meta VALUES ('directory_mtime', ?)", [str(mtime)])
+
+    def _index_files(self, changed: dict, removed: list):
+        """
+        Updates the index entries of changed and removed data files.
+
+        Args:
+            changed: Dictionary of file names and modification times.
+            removed: List of file names.
+        """
+        rows = []
+        indexed = {}
+        for name, mtime in changed.items():
+            if name.startswith(SEGMENT_PREFIX):
+                continue
+            try:
+                with open(self.directory / name, "r", encoding="utf-8") as f:
+                    doc = json.load(f)
+            except (json.decoder.JSONDecodeError, OSError):
+                # not recorded, such that the file is read again next time
+                continue
+
+            indexed[name] = mtime
+            if isinstance(doc, dict) and doc.get("exp_session_id"):
+                rows.append(self._row(doc, file=name))
+
+        segments = [name for name in [*changed, *removed] if name.startswith(SEGMENT_PREFIX)]
+        if segments:
+            indexed.update({name: m for name, m in changed.items() if name.startswith(SEGMENT_PREFIX)})
+            for key, doc in _read_segment_docs(self.directory).items():
+                if doc.get("exp_session_id"):
+                    rows.append(self._row(doc, segment_key=key))
+
+        con = self._connect()
+        with con:
+            con.executemany("DELETE FROM sessions WHERE file = ?", [[name] for name in removed])
+            con.executemany("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            con.executemany("DELETE FROM files WHERE name = ?", [[name] for name in removed])
+            con.executemany("INSERT OR REPLACE INTO files VALUES (?, ?)", list(indexed.items()))
+
+    def _select(self, data_type: str, session_ids: list = None) -> list:
+        if session_ids is None:
+            self._sync()
+            return self._query(data_type)
+
+        session_ids = list(session_ids)
+        entries = self._query(data_type, session_ids)
+        if self._refresh(entries) or len(entries) < len(set(session_ids)):
+            self._sync()
+            entries = self._query(data_type, session_ids)
+        return entries
+
+    def _refresh(self, entries: list) -> bool:
+        """
+        Re-indexes the files of *entries* that changed since they were
+        indexed. Returns *True*, if there were such files.
+        """
+        names = {entry["file"] for entry in entries if entry["file"] is not None}
+        if not names:
+            return False
+
+        con = self._connect()
+        known = {}
+        names = list(names)
+        for i in range(0, len(names), 500):
+            chunk = names[i : i + 500]
+            placeholders = ", ".join("?" * len(chunk))
+            known.update(con.execute(f"SELECT name, mtime_ns FROM files WHERE name IN ({placeholders})", chunk))
+
+        changed = {}
+        removed = []
+        for name in names:
+            mtime = self._mtime(self.directory / name)
+            if mtime is None:
+                removed.append(name)
+            elif known.get(name) != mtime:
+                changed[name] = mtime
+
+        if not changed and not removed:
+            return False
+        self._index_files(changed, removed)
+        return True
+
+    def _query(self, data_type: str, session_ids: list = None) -> list:
+        con = self._connect()
+        query = f"SELECT {', '.join(self._COLUMNS)} FROM sessions WHERE type = ?"
+        if session_ids is None:
+            rows = con.execute(query, [data_type]).fetchall()
+            return [dict(zip(self._COLUMNS, row)) for row in rows]
+
+        rows = []
+        # stay below sqlite's limit for the number of query parameters
+        for i in range(0, len(session_ids), 500):
+            chunk = session_ids[i : i + 500]
+            placeholders = ", ".join("?" * len(chunk))
+            cursor = con.execute(f"{query} AND exp_session_id IN ({placeholders})", [data_type, *chunk])
+            rows += cursor.fetchall()
+        return [dict(zip(self._COLUMNS, row)) for row in rows]
+
+    def find(self, session_ids: list, data_type: str) -> list:
+        """
+        Returns the index entries for the given sessions.
+
+        Returns:
+            list: A list of dictionaries with the keys 'exp_session_id',
+            'type', 'file', 'segment_key', and the status fields 
+            listed in :attr:`FIELDS`.
+        """
+        entries = []
+        for entry in self._select(data_type, session_ids):
+            del entry["header"]
+            for field in ("exp_finished", "exp_aborted"):
+                if entry[field] is not None:
+                    entry[field] = bool(entry[field])
+            entries.append(entry)
+
+        return entries
+
+    def headers(self, data_type: str, session_ids: list = None) -> Iterator[dict]:
+        """
+        Yields the header records of the given sessions, or of all 
+        indexed sessions of *data_type*, if *session_ids* is *None*.
+        """
+        for entry in self._select(data_type, session_ids):
+            if entry["header"] is not None:
+                yield json.loads(entry["header"])
+
+    def load(self, session_ids: list, data_type: str) -> Iterator[dict]:
+        """
+        Yields the saved documents of the given sessions. Only the files
+        that hold these sessions are read.
+        """
+        segment_keys = set()
+        for entry in self.find(session_ids, data_type):
+            if entry["file"] is None:
+                segment_keys.add(entry["segment_key"])
+                continue
+
+            try:
+                with open(self.directory / entry["file"], "r", encoding="utf-8") as f:
+                    yield json.load(f)
+            except (json.decoder.JSONDecodeError, OSError):
+                continue
+
+        if segment_keys:
+            docs = _read_segment_docs(self.directory)
+            for key in segment_keys:
+                if key in docs:
+                    yield docs[key]
 
 
 class SavingAgent(ABC):
@@ -161,9 +1141,16 @@ class SavingAgent(ABC):
         self.log.add_queue_logger(self, __name__)
         self._lock = threading.Lock()
         self._latest_save_time = None
+        self._save_lane = None
         self._fallback_agents = []
         self.encrypt = encrypt
 
+        self.delta_saves = False
+        self._delta_base = None
+        self._delta_base_time = None
+        self._pending_base = None
+        self._pending_update = None
+
         if self.encrypt and not self._experiment.secrets.get("encryption", "key"):
             
             raise ValueError(
@@ -224,12 +1211,11 @@ class SavingAgent(ABC):
                     initially, but succeed with at least one fallback
                     saving agent.
         """
-        if self._experiment.config.getboolean("general", "debug"):
-            if self._experiment.config.getboolean("debug", "disable_saving"):
-                self.log.debug(
-                    f"Saving disabled. 'save_data' was called on {self}, but not executed."
-                )
-                return (True, "success")
+        if self._saving_disabled():
+            self.log.debug(
+                f"Saving disabled. 'save_data' was called on {self}, but not executed."
+            )
+            return (True, "success")
 
         self._lock.acquire()
 
@@ -238,12 +1224,41 @@ class SavingAgent(ABC):
             msg = f"No data_time provided in save_data call to {self}. Inserting current time."
             self.log.debug(msg)
 
+        rejected = self._reject(level=level, data_time=data_time)
+        if rejected:
+            self._lock.release()
+            return rejected
+
+        try:
+            self._save(data)
+        except Exception:
+            self._lock.release()
+            self.log.exception(f"Running {self} failed. Using fallback agents.")
+            return self._save_with_fallbacks(data=data, level=level, data_time=data_time)
+
+        self._succeeded(data_time)
+        self._lock.release()
+        return (True, "success")
+
+    def _saving_disabled(self) -> bool:
+        config = self._experiment.config
+        return config.getboolean("general", "debug") and config.getboolean("debug", "disable_saving")
+
+    def _reject(self, level: int, data_time: float) -> tuple:
+        """
+        Checks, whether a saving task should be rejected. 
+        
+        Must be called while holding the agent's lock.
+
+        Returns:
+            A tuple *(False, reason)* as described in :meth:`save_data`,
+            if the task is rejected, or *None* otherwise.
+        """
         data_is_newer_than_previous = self._latest_save_time is None or self._latest_save_time < data_time
         if not data_is_newer_than_previous:
             if self.exp.movement_manager.current_page is not self.exp.movement_manager.last_page:
                 msg = f"Data snapshot from {data_time} was not saved, because there was a newer one."
                 self.log.info(msg)
-            self._lock.release()
             return (False, "time")
 
         if level < self.activation_level:
@@ -252,30 +1267,90 @@ class SavingAgent(ABC):
                 f"activation level ({level} < {self.activation_level})."
             )
             self.log.debug(msg)
-            self._lock.release()
             return (False, "level")
 
-        try:
-            self._save(data)
-        except Exception:
-            self._lock.release()
-            self.log.exception(f"Running {self} failed. Using fallback agents.")
+        return None
+
+    def _succeeded(self, data_time: float):
+        """
+        Bookkeeping after a successful save. Must be called while
+        holding the agent's lock.
+        """
+        self.log.info(f"Running {self} succeeded.")
+        self._latest_save_time = data_time
+
+        if self.delta_saves:
+            self._delta_base = self._next_delta_base()
+            self._delta_base_time = data_time
+        self._pending_base = None
+        self._pending_update = None
+
+    def _next_delta_base(self) -> dict:
+        """
+        Returns a private copy of the data of the current save, which
+        is the base of the next delta.
 
-            saved = False
-            for agent in self._fallback_agents:
-                saved, _ = agent.save_data(data=data, level=level, data_time=data_time)
-                if saved:
-                    break
+        Element and page data may be changed in place between two saves,
+        so the base never shares values with the saved data. After a 
+        delta save, only the updated values are copied into the previous
+        base. The full document is copied only after a full save.
+        """
+        update = self._pending_update
+        if update is UNCHANGED:
+            return self._delta_base
+        elif update is not None:
+            return apply_update(self._delta_base, copy.deepcopy(update))
+        else:
+            return copy.deepcopy(self._pending_base)
+
+    def delta(self, data: dict) -> dict:
+        """
+        Computes an update document that transforms the data of the
+        agent's last successful save into *data* (see 
+        :func:`update_document`).
 
+        Returns:
+            dict: An update document, or *None*, if delta saves are
+            turned off or a full replacement of the document is needed.
+            This is the case for the first save and after a save 
+            that might have been lost. If the data did not change, 
+            :data:`UNCHANGED` is returned. The result is remembered
+            to update the agent's base after a successful save.
+        """
+        base = self._delta_base
+        self._pending_update = None
+        if not self.delta_saves or base is None or self._delta_base_time != self._latest_save_time:
+            return None
+
+        update = update_document(base, data)
+        self._pending_update = UNCHANGED if update is None else update
+        return self._pending_update
+
+    def _lose_delta_base(self):
+        """
+        Discards the data of the last save, which leads to a full 
+        replacement of the document on the next save.
+        """
+        self._delta_base = None
+        self._delta_base_time = None
+        self._pending_base = None
+        self._pending_update = None
+
+    def _save_with_fallbacks(self, data: dict, level: int, data_time: float) -> tuple:
+        """
+        Tries to save data with the agent's fallback agents after
+        saving with the agent itself failed.
+        """
+        saved = False
+        for agent in self._fallback_agents:
+            saved, _ = agent.save_data(data=data, level=level, data_time=data_time)
             if saved:
-                return (True, "fallback")
-            else:
-                return (False, "error")
+                break
 
-        self.log.info(f"Running {self} succeeded.")
-        self._latest_save_time = data_time
-        self._lock.release()
-        return (True, "success")
+        if saved:
+            return (True, "fallback")
+        else:
+            return (False, "error")
 
     @property
     def fallback_agents(self):
@@ -321,6 +1396,21 @@ class LocalSavingAgent(SavingAgent):
         name: Name of the saving agent instance.
         encrypt: Should data be encrypted before saving? (Currently
             only available for unlinked data)
+        segments: If *True*, the agent does not write a .json file, but 
+            appends compact records to shared, append-only .jsonl
+            segment files in *directory*. Only the first record of a
+            session contains the full data, later records contain only
+            the changes. Defaults to *False*.
+        segment_size: Size in bytes, after which a new segment file is
+            started. Defaults to 64 MB.
+        fsync: Policy for flushing saved data to disk. Can be "always",
+            "batched", or "never" (see :func:`write_json_atomic`).
+            Defaults to "batched".
+        fsync_interval: Seconds within which data is flushed to disk
+            under the "batched" policy. Defaults to 0.2.
+        session_index: If *True*, the agent keeps a :class:`SessionIndex`
+            of the sessions saved in *directory* up to date. Defaults 
+            to *True*.
 
     Attributes:
         filename: Full name of the .json file in which data is saved.
@@ -342,12 +1432,26 @@ class LocalSavingAgent(SavingAgent):
         experiment=None,
         name: str = None,
         encrypt: bool = False,
+        segments: bool = False,
+        segment_size: int = 64 * 1024 * 1024,
+        fsync: str = "batched",
+        fsync_interval: float = 0.2,
+        session_index: bool = True,
     ):
         """Constructor method."""
         super().__init__(activation_level, experiment, name, encrypt)
 
         self.directory = directory
         self.filename = filename
+        self.segments = segments
+        self.segment_size = segment_size
+        self.delta_saves = segments
+
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Parameter 'fsync' must be one of {FSYNC_POLICIES}.")
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.session_index = session_index
 
     @property
     def filename(self):
@@ -386,8 +1490,55 @@ class LocalSavingAgent(SavingAgent):
     def _save(self, data: dict):
         """Write data to file."""
         self._check_directory()
-        with open(self.file, "w", encoding="utf-8") as outfile:
-            json.dump(data, outfile, indent=4, sort_keys=False, ensure_ascii=False)
+
+        if self.segments:
+            self._append(data)
+        else:
+            write_json_atomic(
+                self.file,
+                data,
+                fsync=self.fsync,
+                fsync_interval=self.fsync_interval,
+                indent=4,
+                sort_keys=False,
+                ensure_ascii=False,
+            )
+
+        if self.session_index:
+            self._update_index(data)
+
+    def _update_index(self, data: dict):
+        """Records the saved data in the directory's session index."""
+        try:
+            index = SessionIndex.get(self.directory)
+            if self.segments:
+                index.update(data, segment_key=self.filename.stem)
+            else:
+                index.update(data, file=self.filename.name)
+        except sqlite3.Error:
+            # the data itself is saved, so saving does not fail here
+            self.log.exception(f"Failed to update the session index in {self.directory}.")
+
+    def _append(self, data: dict):
+        """Append a record to the current segment file."""
+        update = self.delta(data)
+        self._pending_base = data
+
+        if update is UNCHANGED:
+            return
+        elif update is not None:
+            record = {"key": self.filename.stem, "update": update}
+        else:
+            record = {"key": self.filename.stem, "doc": data}
+
+        try:
+            writer = _SegmentWriter.get(
+                self.directory, self.segment_size, fsync=self.fsync, fsync_interval=self.fsync_interval
+            )
+            writer.append(record)
+        except Exception:
+            self._lose_delta_base()
+            raise
 
     @property
     def file(self):
@@ -414,6 +1565,11 @@ class AutoLocalSavingAgent(LocalSavingAgent):
             experiment=experiment,
             name=config.get("name"),
             encrypt=config.getboolean("encrypt", fallback=False),
+            segments=config.get("format", fallback="json") == "jsonl",
+            segment_size=config.getint("segment_size", fallback=64) * 1024 * 1024,
+            fsync=config.get("fsync", fallback="batched"),
+            fsync_interval=config.getint("fsync_interval", fallback=200) / 1000,
+            session_index=config.getboolean("session_index", fallback=True),
         )
 
 
@@ -455,6 +1611,16 @@ class MongoSavingAgent(SavingAgent):
         name: Name of the saving agent instance.
         encrypt: Should data be encrypted before saving? (Currently
             only available for unlinked data)
+        misc_collection: Name of the collection for miscellaneous data.
+        delta: If *True*, the agent only sends the changes since its
+            last successful save to the database (see :meth:`delta`).
+            Defaults to *False*.
+        verify: Strategy for verifying that a full document was saved.
+            "acknowledged" relies on the matched and upserted counts
+            reported by the database. "projection" reads back only the
+            fields ``_id`` and ``exp_session_id`` of the saved document
+            and compares the session id. "document" reads back the full
+            saved document. Defaults to "projection".
 
     Attributes:
         name: The name of the saving agent.
@@ -472,6 +1638,9 @@ class MongoSavingAgent(SavingAgent):
 
     client_pattern = re.compile(r"host=\['(?P<host>.+):(?P<port>\d+)'\]")
 
+    #: Available strategies for the verification of saved documents
+    verification_strategies = ("acknowledged", "projection", "document")
+
     def __init__(
         self,
         client: pymongo.MongoClient,
@@ -482,6 +1651,8 @@ class MongoSavingAgent(SavingAgent):
         name: str = None,
         encrypt: bool = False,
         misc_collection: str = None,
+        delta: bool = False,
+        verify: str = "projection",
     ):
         """Constructor method."""
         super().__init__(
@@ -492,6 +1663,12 @@ class MongoSavingAgent(SavingAgent):
         self._col = self._db[collection]
         self._misc_col = misc_collection
         self.doc_id = uuid4().hex
+        
+        if verify not in self.verification_strategies:
+            raise ValueError(f"Parameter 'verify' must be one of {self.verification_strategies}.")
+        self.verify = verify
+
+        self.delta_saves = delta
 
         self._identifier = {"_id": self.doc_id}
 
@@ -506,18 +1683,169 @@ class MongoSavingAgent(SavingAgent):
         else:
             self._identifier = identifier
 
+    def _prepare(self, data: dict) -> dict:
+        data.update(self.identifier)
+        data["_id"] = self.doc_id
+        return data
+
     def _save(self, data):
         f = self.identifier
-        data.update(f)
-        data["_id"] = self.doc_id
+        data = self._prepare(data)
+        update = self.delta(data)
+        self._pending_base = data
+
+        if update is UNCHANGED:
+            return self.doc_id
+
+        try:
+            if update is not None:
+                result = self._col.update_one(filter=f, update=update)
+                if result.matched_count == 1:
+                    return self.doc_id
+                self.log.warning(f"Delta save of {self} did not match a document. Saving full document.")
 
-        check = self._col.find_one_and_replace(filter=f, replacement=data, upsert=True, return_document=ReturnDocument.AFTER)
+            return self._replace(f, data)
+        
+        except Exception:
+            self._lose_delta_base()
+            raise
+
+    def _replace(self, f: dict, data: dict):
+        """Replaces the full document and verifies the result."""
+        if self.verify == "acknowledged":
+            result = self._col.replace_one(filter=f, replacement=data, upsert=True)
+            saved = result.matched_count == 1 or result.upserted_id is not None
+            if not result.acknowledged or not saved:
+                raise SavingAgentRunException("Failed to validate data saving.")
+            return self.doc_id
+
+        projection = ["_id", "exp_session_id"] if self.verify == "projection" else None
+        check = self._col.find_one_and_replace(
+            filter=f,
+            replacement=data,
+            projection=projection,
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
 
         if not check.get("exp_session_id") == data.get("exp_session_id"):
             raise SavingAgentRunException("Failed to validate data saving.")
 
         doc_id = check.pop("_id")
         return doc_id
+    
+    @property
+    def batch_key(self) -> tuple:
+        """
+        tuple: Agents with equal batch keys write to the same collection
+        through the same client and can share a bulk write.
+        """
+        return (id(self._mc), self._db.name, self._col.name)
+
+    @staticmethod
+    def save_batch(tasks: list) -> list:
+        """
+        Saves the data of several agents with a single bulk write.
+
+        All agents must share the same :attr:`.batch_key`. Every task 
+        is checked and, if saving fails, handed over to the agent's 
+        fallback agents just as in :meth:`.save_data`.
+
+        Args:
+            tasks: A list of tuples of the form 
+                *(agent, data, level, data_time)*.
+
+        Returns:
+            list: A list of tuples *(saved, reason)*, one for each task,
+            as described in :meth:`.save_data`.
+        """
+        results = [None] * len(tasks)
+        accepted = []
+
+        for i, (agent, data, level, data_time) in enumerate(tasks):
+            if agent._saving_disabled():
+                results[i] = (True, "success")
+                continue
+
+            agent._lock.acquire()
+            rejected = agent._reject(level=level, data_time=data_time)
+            if rejected:
+                agent._lock.release()
+                results[i] = rejected
+                continue
+
+            accepted.append(i)
+
+        if not accepted:
+            return results
+
+        requests = []
+        replacements = []
+        written = []  # positions in *accepted* of the tasks with requests
+        for n, i in enumerate(accepted):
+            agent, data, _, _ = tasks[i]
+            data = agent._prepare(data)
+            agent._pending_base = data
+            update = agent.delta(data)
+            if update is UNCHANGED:
+                continue
+
+            written.append(n)
+            replacement = ReplaceOne(filter=agent.identifier, replacement=data, upsert=True)
+            if update is not None:
+                requests.append(UpdateOne(filter=agent.identifier, update=update))
+            else:
+                requests.append(replacement)
+            replacements.append(replacement)
+
+        failed = set()
+        if requests:
+            first_agent = tasks[accepted[0]][0]
+            failed = {written[k] for k in first_agent._bulk_write(requests, replacements)}
+
+        for n, i in enumerate(accepted):
+            agent, data, level, data_time = tasks[i]
+
+            if n in failed:
+                agent._lose_delta_base()
+                agent._lock.release()
+                agent.log.error(f"Running {agent} failed. Using fallback agents.")
+                results[i] = agent._save_with_fallbacks(data=data, level=level, data_time=data_time)
+            else:
+                agent._succeeded(data_time)
+                agent._lock.release()
+                results[i] = (True, "success")
+
+        return results
+
+    def _bulk_write(self, requests: list, replacements: list) -> set:
+        """
+        Writes *requests* with a single bulk write. If delta updates do
+        not match all documents, the full *replacements* are written.
+
+        Returns:
+            set: Positions of the failed requests.
+        """
+        try:
+            result = self.col.bulk_write(requests, ordered=False)
+            
+            # every operation must either match a document or insert one
+            if result.matched_count + result.upserted_count != len(requests):
+                if requests == replacements:
+                    raise SavingAgentRunException("Failed to validate data saving.")
+                
+                self.log.warning("Delta saves did not match all documents. Saving full documents.")
+                result = self.col.bulk_write(replacements, ordered=False)
+                if result.matched_count + result.upserted_count != len(replacements):
+                    raise SavingAgentRunException("Failed to validate data saving.")
+
+        except BulkWriteError as e:
+            return {error["index"] for error in e.details.get("writeErrors", [])}
+        except Exception:
+            self.log.exception(f"Bulk write of {len(requests)} documents failed.")
+            return set(range(len(requests)))
+
+        return set()
 
     @property
     def client(self):
@@ -600,6 +1928,8 @@ class AutoMongoSavingAgent(MongoSavingAgent):
     - collection
     - level
     - name
+    - delta (optional, defaults to *false*)
+    - verify (optional, defaults to *projection*)
 
     Args:
         config: A :class:`configparser.SectionProxy` with appropriate
@@ -631,7 +1961,9 @@ class AutoMongoSavingAgent(MongoSavingAgent):
             experiment=experiment,
             name=config.get("name"),
             encrypt=config.getboolean("encrypt", fallback=False),
-            misc_collection=config.get("misc_collection")
+            misc_collection=config.get("misc_collection"),
+            delta=config.getboolean("delta", fallback=False),
+            verify=config.get("verify", fallback="projection") or "projection",
         )
 
 
@@ -873,8 +2205,8 @@ class SavingAgentController:
         priority = 1 if sync else 5
         e = threading.Event()
 
-        task = (priority, save_time, level, task_id, e, data, self, agent_name)
-        _queue.put(task)
+        task = (priority, save_time, level, task_id, e, data, self, agent_name, time.time())
+        _lane_for(self.agents[agent_name]).put(task)
         
         if sync:
             e.wait()
@@ -895,7 +2227,39 @@ class SavingAgentController:
 
         agent = self.agents[agent_name]
         saved, reason = agent.save_data(data=data, level=level, data_time=data_time)
+        self._handle_result(saved, reason, agent=agent, data=data, level=level, data_time=data_time)
+
+    @staticmethod
+    def _do_batch_saving(tasks: list):
+        """
+        Saves several tasks for :class:`MongoSavingAgent` instances
+        that write to the same collection with a single bulk write.
+
+        Args:
+            tasks: A list of tasks as found in the global saving queue.
+        """
+        batch = []
+        for _, t, lvl, _, _, data, sa_controller, agent_name, _ in tasks:
+            if not sa_controller.experiment.config.getboolean("data", "save_data"):
+                sa_controller.log.debug("Option 'save_data' was 'false'. Not saving any data.")
+                continue
+            
+            agent = sa_controller.agents[agent_name]
+            batch.append((sa_controller, agent, data, lvl, t))
 
+        if not batch:
+            return
+
+        results = MongoSavingAgent.save_batch([task[1:] for task in batch])
+
+        for (sa_controller, agent, data, lvl, t), (saved, reason) in zip(batch, results):
+            sa_controller._handle_result(saved, reason, agent=agent, data=data, level=lvl, data_time=t)
+
+    def _handle_result(self, saved: bool, reason: str, agent: SavingAgent, data: dict, level: int, data_time: float):
+        """
+        Calls the failure saving agents, if saving with *agent* and its
+        fallbacks failed.
+        """
         if not saved and not reason == "time":
             self.log.warning(
                 f"Saving with {agent} failed. Attempting to save with failure saving agent now."
@@ -959,6 +2323,7 @@ class DataSaver:
 
         self.experiment = experiment
         self.exp = experiment
+        set_saving_workers(experiment.config.getint("data", "saving_workers", fallback=1))
         self.mongo_manager = MongoManager(self.experiment)
         self.main = self._init_main_controller()
         self.unlinked = self._init_unlinked_controller()
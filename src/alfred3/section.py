@@ -6,6 +6,7 @@ Sections organize movement between pages in an experiment.
 """
 import time
 import typing as t
+from dataclasses import dataclass
 
 from ._core import ExpMember
 from ._helper import inherit_kwargs
@@ -82,6 +83,10 @@ class Section(ExpMember):
 
         self._members = {}
         self._should_be_shown = True
+        self._tree_version = 0
+        self._tree_cache = {}
+        self._member_registry = {}
+        self._element_registry = {}
 
         #: bool: Boolean flag, indicating whether the experiment session
         #: is currently operating within this section
@@ -94,16 +99,17 @@ class Section(ExpMember):
 
     def __contains__(self, member):
         try:
-            return member.name in self.all_members or member.name in self.all_elements
+            name = member.name
         except AttributeError:
-            return member in self.all_members or member in self.all_elements
+            name = member
+        return name in self._member_registry or name in self._element_registry
 
     def __iadd__(self, other):
         self.append(other)
         return self
 
     def __getitem__(self, name):
-        return self.all_members[name]
+        return self._member_registry[name]
 
     def __setitem__(self, name, value):
         if "members" in self.__dict__ and name in self.members:
@@ -122,7 +128,7 @@ class Section(ExpMember):
 
     def __getattr__(self, name):
         try:
-            return self.all_members[name]
+            return self.__dict__["_member_registry"][name]
         except KeyError:
             raise AttributeError(f"{self} has no attribute '{name}'.")
 
@@ -142,6 +148,57 @@ class Section(ExpMember):
         members = list(self.members.items())
         shuffle(members)
         self._members = dict(members)
+        self._tree_changed()
+
+    def _tree_changed(self):
+        """
+        Marks the tree below this section as changed, such that cached
+        member, page, and element dicts of this section and all its
+        parent sections are rebuilt on next access.
+        """
+        section = self
+        while section is not None:
+            section._tree_version += 1
+            section = section.section
+
+    def _cached(self, key: str, build) -> dict:
+        """
+        Returns a copy of the dict returned by *build*, which is only
+        called again after the tree below this section has changed.
+        """
+        cache = self._tree_cache.get(key)
+        if cache is None or cache[0] != self._tree_version:
+            cache = self._tree_cache[key] = (self._tree_version, build())
+        return dict(cache[1])
+
+    def _register(self, members: dict = None, elements: dict = None):
+        """
+        Adds members and elements to the name registries of this section
+        and all its parent sections.
+        """
+        section = self
+        while section is not None:
+            section._member_registry.update(members or {})
+            section._element_registry.update(elements or {})
+            section = section.section
+
+    def _rebuild_registry(self):
+        """
+        Rebuilds the name registries of this section from its members
+        and updates the registries of all parent sections.
+        """
+        self._member_registry = {}
+        self._element_registry = {}
+        for name, member in self.members.items():
+            self._member_registry[name] = member
+            if isinstance(member, Section):
+                self._member_registry.update(member._member_registry)
+                self._element_registry.update(member._element_registry)
+            elif isinstance(member, _PageCore):
+                self._element_registry.update(member.elements)
+
+        if self.section is not None:
+            self.section._rebuild_registry()
 
     @property
     def members(self) -> dict:
@@ -153,6 +210,8 @@ class Section(ExpMember):
     @members.setter
     def members(self, value):
         self._members = value
+        self._rebuild_registry()
+        self._tree_changed()
 
     @property
     def empty(self) -> bool:
@@ -203,14 +262,18 @@ class Section(ExpMember):
 
         The order is preserved, i.e. members are listed in this dict in
         the same order in which they appear in the experiment.
+
+        The dict is cached until members are added to or shuffled in
+        this section or one of its subsections.
         """
-        members = {}
+        return self._cached("all_members", self._build_all_members)
 
+    def _build_all_members(self) -> dict:
+        members = {}
         for name, member in self.members.items():
             members[name] = member
             if isinstance(member, Section):
                 members.update(member.all_members)
-
         return members
 
     @property
@@ -262,14 +325,18 @@ class Section(ExpMember):
 
         The order is preserved, i.e. sections are listed in this dict in
         the same order in which they appear in the experiment.
+
+        The dict is cached until members are added to or shuffled in
+        this section or one of its subsections.
         """
-        subsections = {}
+        return self._cached("all_subsections", self._build_all_subsections)
 
+    def _build_all_subsections(self) -> dict:
+        subsections = {}
         for name, member in self.members.items():
             if isinstance(member, Section):
                 subsections[name] = member
                 subsections.update(member.all_subsections)
-
         return subsections
 
     @property
@@ -289,15 +356,19 @@ class Section(ExpMember):
 
         The order is preserved, i.e. pages are listed in this dict in
         the same order in which they appear in the experiment.
+
+        The dict is cached until members are added to or shuffled in
+        this section or one of its subsections.
         """
+        return self._cached("all_pages", self._build_all_pages)
 
+    def _build_all_pages(self) -> dict:
         pages = {}
         for name, member in self.members.items():
             if isinstance(member, _PageCore):
                 pages[name] = member
             elif isinstance(member, Section):
                 pages.update(member.all_pages)
-
         return pages
 
     @property
@@ -339,8 +410,13 @@ class Section(ExpMember):
 
         Recursive: Includes elements from pages in this section and all
         its subsections.
+
+        The dict is cached until members or elements are added to this
+        section or one of its subsections.
         """
+        return self._cached("all_elements", self._build_all_elements)
 
+    def _build_all_elements(self) -> dict:
         elements = {}
         for page in self.all_pages.values():
             elements.update(page.elements)
@@ -353,8 +429,13 @@ class Section(ExpMember):
 
         Recursive: Includes elements from pages in this section and all
         its subsections.
+
+        The dict is cached until members or elements are added to this
+        section or one of its subsections.
         """
+        return self._cached("all_input_elements", self._build_all_input_elements)
 
+    def _build_all_input_elements(self) -> dict:
         elements = {}
         for page in self.all_pages.values():
             elements.update(page.input_elements)
@@ -447,6 +528,11 @@ class Section(ExpMember):
             item.added_to_section(self)
 
             self.members[item.name] = item
+            if isinstance(item, Section):
+                self._register({item.name: item, **item._member_registry}, item._element_registry)
+            elif isinstance(item, _PageCore):
+                self._register({item.name: item}, item.elements)
+            self._tree_changed()
 
             if self.experiment is not None:
                 item.added_to_experiment(self.experiment)
@@ -960,6 +1046,28 @@ class _AbortSection(Section):
     allow_jumpto: bool = True
 
 
+@dataclass
+class _PageIndex:
+    """
+    Snapshot of the page order in an experiment.
+
+    Attributes:
+        version (int): Tree version of the root section, for which the
+            index was built.
+        names (list): Page names, in order.
+        pages (list): Pages, in order.
+        positions (dict): Mapping of page names to positions.
+        spans (dict): Mapping of section names to the range of positions
+            *(start, stop)* of the pages in the section.
+    """
+
+    version: int
+    names: list
+    pages: list
+    positions: dict
+    spans: dict
+
+
 @inherit_kwargs
 class _RootSection(Section):
     """
@@ -984,8 +1092,7 @@ class _RootSection(Section):
         self.finished_section = _FinishedSection(name="__finished_section")
         self.finished_section += _DefaultFinalPage(name="_final_page")
 
-        self._all_pages_list = None
-        self._all_page_names = None
+        self._page_index = None
 
     def append_root_sections(self):
         if self.exp.admin_mode:
@@ -997,48 +1104,59 @@ class _RootSection(Section):
             self += self.finished_section
 
     @property
-    def all_page_names(self):
-        """
-        Improvised caching mechanism for the list of all page names.
-        
-        Danger: The caching is not compatible with sections that shuffle their members.
-        The shuffling does not affect this list, which is unexpected
-        behavior in most cases.
+    def page_index(self) -> "_PageIndex":
+        """
+        _PageIndex: Index of all pages in the experiment, mapping page
+        names to positions and positions to pages.
+
+        The index is versioned: It is rebuilt on the first access after
+        pages were added, members of a section were shuffled, or the
+        visibility of a page or section was set via *should_be_shown*.
+        """
+        if self._page_index is None or self._page_index.version != self._tree_version:
+            pages = self.all_pages
+            spans = {}
+            for i, page in enumerate(pages.values()):
+                for section in page.uptree():
+                    start, _ = spans.get(section.name, (i, None))
+                    spans[section.name] = (start, i + 1)
+
+            self._page_index = _PageIndex(
+                version=self._tree_version,
+                names=list(pages),
+                pages=list(pages.values()),
+                positions={name: i for i, name in enumerate(pages)},
+                spans=spans,
+            )
+        return self._page_index
 
-        For this reason, the caching is currently deactivated.
+    def position_of(self, name: str) -> int:
         """
+        Returns the position of a page in the experiment.
 
-        return list(self.all_pages.keys())
-
-        # if not self._all_page_names:
-        #     self._all_page_names = list(self.all_pages.keys())
-
-        # elif not len(self._all_page_names) == len(self.all_pages):
-        #     self._all_page_names = list(self.all_pages.keys())
-
-        # return self._all_page_names
+        Raises:
+            ValueError: If there is no page of this name.
+        """
+        try:
+            return self.page_index.positions[name]
+        except KeyError:
+            raise ValueError(f"'{name}' is not a page in the experiment.")
 
     @property
-    def all_pages_list(self):
+    def all_page_names(self) -> list:
         """
-        Improvised caching mechanism for the list of all pages.
-
-        Danger: The caching is not compatible with sections that shuffle their members.
-        The shuffling does not affect this list, which is unexpected
-        behavior in most cases.
-
-        For this reason, the caching is currently deactivated.
+        list: Names of all pages in the experiment, in order. Served
+        from :attr:`.page_index`. The list must not be modified.
         """
+        return self.page_index.names
 
-        return list(self.all_pages.values())
-        
-        # if not self._all_pages_list:
-        #     self._all_pages_list = list(self.all_pages.values())
-
-        # elif not len(self._all_pages_list) == len(self.all_pages):
-        #     self._all_pages_list = list(self.all_pages.values())
-
-        # return self._all_pages_list
+    @property
+    def all_pages_list(self) -> list:
+        """
+        list: All pages in the experiment, in order. Served from
+        :attr:`.page_index`. The list must not be modified.
+        """
+        return self.page_index.pages
 
     @property
     def final_page(self):
@@ -20,6 +20,7 @@ import importlib.resources
 from jinja2 import Environment, PackageLoader
 
 from .alfredlog import QueuedLoggingInterface
+from .page import _PageCore
 from .static import js
 from .static import css
 from .static import img
@@ -101,6 +102,62 @@ class Move:
     section_allows_jumpto: bool = None
 
 
+class _Visibility:
+    """
+    Visibility of the pages and sections in an experiment.
+
+    Pages and sections are evaluated lazily and at most once. An
+    instance is valid only as long as neither the tree of sections
+    nor any page data changes, see :meth:`MovementManager._visibility`.
+
+    Args:
+        key (tuple): Tree version and data version, for which the
+            instance is valid.
+        index (alfred3.section._PageIndex): Page index of the experiment.
+    """
+
+    UNKNOWN, SHOWN, HIDDEN = 0, 1, 2
+
+    def __init__(self, key: tuple, index):
+        self.key = key
+        self.index = index
+        self.pages = bytearray(len(index.pages))
+        self.sections = {}
+
+    def section_shown(self, section) -> bool:
+        """True, if the section and all its parent sections should be shown."""
+        shown = self.sections.get(section.name)
+        if shown is None:
+            parent = section.section
+            shown = section.should_be_shown and (parent is None or self.section_shown(parent))
+            self.sections[section.name] = shown
+        return shown
+
+    def page_shown(self, i: int) -> bool:
+        """True, if the page at position *i* should be shown."""
+        state = self.pages[i]
+        if state == self.UNKNOWN:
+            page = self.index.pages[i]
+            if type(page).should_be_shown is _PageCore.should_be_shown:
+                shown = page._shown(self.section_shown)
+            else:
+                shown = page.should_be_shown
+            state = self.pages[i] = self.SHOWN if shown else self.HIDDEN
+        return state == self.SHOWN
+
+    def hidden_section(self, i: int):
+        """
+        Returns the outermost section of the page at position *i* that
+        should not be shown, or *None*.
+        """
+        hidden = None
+        for section in self.index.pages[i].uptree():
+            if self.section_shown(section):
+                break
+            hidden = section
+        return hidden
+
+
 class MovementManager:
     instance_log = False
 
@@ -115,6 +172,7 @@ class MovementManager:
         self.history: list = []
 
         self._current_page = None
+        self._visibility_cache = None
     
     @property
     def current_page(self):
@@ -149,13 +207,13 @@ class MovementManager:
         return self.exp.final_page
     
     def page_after(self, page):
-        i = self.exp.root_section.all_page_names.index(page.name) + 1
+        i = self.index_of(page) + 1
         return self.exp.root_section.all_pages_list[i]
     
     def page_before(self, page):
         if self.current_page is self.first_page:
             return None
-        i = self.exp.root_section.all_page_names.index(page.name) - 1
+        i = self.index_of(page) - 1
         return self.exp.root_section.all_pages_list[i]
 
     def find_page(self, query: Union[str, int]):
@@ -165,18 +223,19 @@ class MovementManager:
         Args:
             query: Can be either a page name or a page index.
         """
-        page = self.experiment.root_section.all_pages.get(query, None)
-        if page is not None:
-            return page
+        index = self.exp.root_section.page_index
+        i = index.positions.get(query, None)
+        if i is not None:
+            return index.pages[i]
         else:
             try:
-                page = self.exp.root_section.all_pages_list[int(query)]
+                page = index.pages[int(query)]
                 return page
             except (IndexError, TypeError, ValueError):
                 return None
 
     def index_of(self, page):
-        return self.experiment.root_section.all_page_names.index(page.name)
+        return self.experiment.root_section.position_of(page.name)
 
     @property
     def first_page(self):
@@ -184,11 +243,7 @@ class MovementManager:
     
     @property
     def first_visible_page(self):
-        i = 0
-        pages = self.exp.root_section.all_pages_list
-        while not pages[i].should_be_shown:
-            i += 1
-        return pages[i]
+        return self.find_page(self._visible_position(0, direction="forward"))
     
     @property
     def last_page(self):
@@ -238,26 +293,51 @@ class MovementManager:
     def _abort_move(self):
         return self.previous_index, self.current_index
     
+    def _visibility(self) -> _Visibility:
+        """
+        Returns the visibility of pages and sections for the current
+        state of the experiment. The visibility is reused until pages
+        are added or shuffled, *should_be_shown* is set, the data of a
+        page changes, or a new move starts.
+        """
+        root = self.exp.root_section
+        key = (root._tree_version, self.exp.data_manager._data_version)
+        if self._visibility_cache is None or self._visibility_cache.key != key:
+            self._visibility_cache = _Visibility(key, root.page_index)
+        return self._visibility_cache
+
+    def _visible_position(self, i: int, direction: str) -> int:
+        """
+        Returns the position of the first page at or after (direction
+        'forward') or at or before (direction 'backward') position *i*
+        that should be shown. Hidden sections are skipped as a whole.
+
+        Raises:
+            AbortMove: If there is no such page.
+        """
+        visibility = self._visibility()
+        step = 1 if direction == "forward" else -1
+        while 0 <= i < len(visibility.pages):
+            section = visibility.hidden_section(i)
+            if section is not None:
+                self.log.debug(f"{section} should not be shown. Skipping section in direction '{direction}'.")
+                start, stop = visibility.index.spans[section.name]
+                i = stop if step > 0 else start - 1
+            elif not visibility.page_shown(i):
+                self.log.debug(f"{self.find_page(i)} should not be shown. Skipping page in direction '{direction}'.")
+                i += step
+            else:
+                return i
+        raise AbortMove
+
     def target_page(self, direction: str):
         if direction == "forward":
-            target_page = self.next_page
-            i = self.index_of(target_page)
-            while not target_page.should_be_shown or not target_page.section.should_be_shown: # skip pages that should not be shown
-                self.log.debug(f"{target_page} should not be shown. Skipping page in direction 'forward'.")
-                i += 1
-                target_page = self.find_page(i)
-            return target_page
+            i = self.index_of(self.next_page)
+            return self.find_page(self._visible_position(i, direction="forward"))
 
         elif direction == "backward":
-            target_page = self.page_before(self.current_page)
-            i = self.index_of(target_page)
-            while not target_page.should_be_shown or not target_page.section.should_be_shown: # skip pages that should not be shown
-                self.log.debug(f"{target_page} should not be shown. Skipping page in direction 'backward'.")
-                i -= 1
-                if i < 0:
-                    raise AbortMove
-                target_page = self.find_page(i)
-            return target_page
+            i = self.index_of(self.page_before(self.current_page))
+            return self.find_page(self._visible_position(i, direction="backward"))
 
         elif direction.startswith("jump"):
             target_page_name = direction[5:]
@@ -422,6 +502,7 @@ class MovementManager:
             self.log.debug("Movement direction was 'stay' - no move conducted.")
             return
         
+        self._visibility_cache = None
         try:
             self._move(direction=direction)
         except AbortMove:
@@ -429,6 +510,7 @@ class MovementManager:
     
     def start(self):
 
+        self._visibility_cache = None
         self.current_index = self.index_of(self.first_visible_page)
         self.exp.root_section._enter()
         self.current_page._on_showing_widget(show_time=time.time())
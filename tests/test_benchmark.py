@@ -0,0 +1,47 @@
+"""
+Tests for the quota benchmark.
+"""
+
+import pytest
+
+from alfred3.benchmark import simulate, BenchmarkResult
+
+
+def test_quota_is_not_overbooked(tmp_path):
+    result = simulate(nslots=5, sessions=12, concurrency=4, directory=tmp_path, seed=1)
+
+    assert result.overbooked == 0
+    assert sum(result.allocated.values()) + result.rejected == 12
+    assert result.latency["count"] == 12
+    assert result.lock_wait["count"] > 0
+
+
+def test_randomizer_balance(tmp_path):
+    result = simulate(
+        conditions=[("a", 3), ("b", 3)],
+        sessions=12,
+        concurrency=4,
+        abort_rate=0,
+        timeout_rate=0,
+        directory=tmp_path,
+        seed=1,
+    )
+
+    assert result.finished == {"a": 3, "b": 3}
+    assert result.balance == 1
+
+
+def test_mongo_storage():
+    pytest.importorskip("mongomock")
+    result = simulate(nslots=5, sessions=12, concurrency=4, storage="mongo", seed=1)
+
+    assert result.overbooked == 0
+    assert sum(result.allocated.values()) + result.rejected == 12
+
+
+def test_balance():
+    result = BenchmarkResult("local", 4, 1, {}, {}, 0, targets={"a": 2, "b": 2})
+    result.finished = {"a": 3, "b": 1}
+
+    assert result.balance == 0.75
+    assert result.overbooked == 1
@@ -355,4 +355,55 @@ class TestNumberEntry:
 #         exp.testpage._set_data({f"test": ["1", "2"]})
 
 #         assert exp.values["test"]["choice1"] == True
-#         assert exp.values["test"]["choice2"] == True 
\ No newline at end of file
+#         assert exp.values["test"]["choice2"] == True 
+
+class TestShowif:
+
+    @pytest.fixture
+    def first(self, exp):
+        page = al.Page(name="first")
+        page += al.TextEntry(name="el1")
+        exp += page
+        page._on_showing_widget()
+        return page
+
+    def test_previous_page(self, exp, first):
+        exp.testpage += al.Text("text", name="text", showif={"el1": "yes"})
+
+        first._set_data({"el1": "yes"})
+        assert exp.testpage.text.should_be_shown
+
+        first._set_data({"el1": "no"})
+        assert not exp.testpage.text.should_be_shown
+
+    def test_compiled_once(self, exp, first):
+        exp.testpage += al.Text("text", name="text", showif={"el1": "yes"})
+        text = exp.testpage.text
+
+        text.should_be_shown
+        compiled = text._compiled_showif
+        first._set_data({"el1": "yes"})
+
+        assert text.should_be_shown
+        assert text._compiled_showif is compiled
+        assert compiled.dependencies == {"el1"}
+
+        text.showif = {"el1": "no"}
+        assert not text.should_be_shown
+        assert text._compiled_showif is not compiled
+
+    def test_metadata(self, exp):
+        exp.testpage += al.Text("text", name="text", showif={"exp_condition": "a"})
+
+        exp.condition = "a"
+        assert exp.testpage.text.should_be_shown
+
+        exp.condition = "b"
+        assert not exp.testpage.text.should_be_shown
+
+    def test_current_page_is_skipped(self, exp):
+        exp.testpage += al.TextEntry(name="el2")
+        exp.testpage += al.Text("text", name="text", showif={"el2": "yes"})
+
+        assert exp.testpage.text.should_be_shown
+        assert exp.testpage.text._compiled_showif.dependencies == set()
@@ -0,0 +1,226 @@
+"""
+Tests for the csv export of local data.
+"""
+
+import csv
+import json
+import stat
+import subprocess
+
+import pytest
+
+from alfred3.export import Exporter, export_worker
+from alfred3.cli.extract import Extractor
+from alfred3.data_manager import DataManager
+from alfred3.testutil import get_exp_session
+
+
+@pytest.fixture
+def exp_factory(tmp_path):
+    script = "tests/res/script-hello_world.py"
+
+    def factory():
+        exp = get_exp_session(tmp_path, script_path=script, secrets_path="")
+        exp.start()
+        exp._save_data(sync=True)
+        return exp
+
+    yield factory
+
+
+def read(path, delimiter=";"):
+    with open(path, encoding="utf-8", newline="") as f:
+        return list(csv.DictReader(f, delimiter=delimiter))
+
+
+class TestExpDataExport:
+
+    def test_append_without_rewrite(self, exp_factory, monkeypatch):
+        exp1 = exp_factory()
+        Exporter(exp1).export(DataManager.EXP_DATA)
+
+        def fail(*args, **kwargs):
+            raise AssertionError("csv file was rewritten")
+
+        monkeypatch.setattr(Exporter, "_rewrite", fail)
+        exp2 = exp_factory()
+        exporter = Exporter(exp2)
+        exporter.export(DataManager.EXP_DATA)
+
+        path = exporter.csv_dir / "exp_data.csv"
+        rows = read(path, exporter.delimiter)
+        assert [row["exp_session_id"] for row in rows] == [exp1.session_id, exp2.session_id]
+
+        header = json.loads(Exporter.header_path(path).read_text())
+        assert header["fieldnames"] == list(rows[0])
+        assert header["size"] == path.stat().st_size
+
+    def test_new_column_rewrites(self, exp_factory):
+        exp1 = exp_factory()
+        Exporter(exp1).export(DataManager.EXP_DATA)
+
+        exp2 = exp_factory()
+        exp2.adata["new_column"] = "value"
+        exporter = Exporter(exp2)
+        exporter.export(DataManager.EXP_DATA)
+
+        path = exporter.csv_dir / "exp_data.csv"
+        rows = read(path, exporter.delimiter)
+        new = [name for name in rows[0] if "new_column" in name]
+        assert len(new) == 1
+        assert rows[0][new[0]] == ""
+        assert rows[1][new[0]] == "value"
+
+        header = json.loads(Exporter.header_path(path).read_text())
+        assert new[0] in header["fieldnames"]
+
+    def test_rewrite_keeps_file_mode(self, exp_factory):
+        exp1 = exp_factory()
+        exporter = Exporter(exp1)
+        exporter.export(DataManager.EXP_DATA)
+        path = exporter.csv_dir / "exp_data.csv"
+        path.chmod(0o640)
+
+        exp2 = exp_factory()
+        exp2.adata["new_column"] = "value"
+        Exporter(exp2).export(DataManager.EXP_DATA)
+
+        assert len(read(path, exporter.delimiter)) == 2
+        assert stat.S_IMODE(path.stat().st_mode) == 0o640
+
+    def test_missing_header_sidecar(self, exp_factory):
+        exp1 = exp_factory()
+        exporter = Exporter(exp1)
+        exporter.export(DataManager.EXP_DATA)
+        path = exporter.csv_dir / "exp_data.csv"
+        Exporter.header_path(path).unlink()
+
+        exp2 = exp_factory()
+        Exporter(exp2).export(DataManager.EXP_DATA)
+
+        rows = read(path, exporter.delimiter)
+        assert len(rows) == 2
+        assert Exporter.header_path(path).exists()
+
+
+class TestBackgroundExport:
+
+    def test_burst_is_exported_once(self, exp_factory, monkeypatch):
+        calls = []
+        export = Exporter.export
+
+        def count(self, data_type, data=None):
+            calls.append(data_type)
+            export(self, data_type, data)
+
+        monkeypatch.setattr(Exporter, "export", count)
+
+        exp1 = exp_factory()
+        Exporter(exp1).export(DataManager.EXP_DATA)
+        calls.clear()
+
+        exp2 = exp_factory()
+        exp3 = exp_factory()
+        export_worker.schedule(Exporter(exp2), DataManager.EXP_DATA, delay=60)
+        export_worker.schedule(Exporter(exp3), DataManager.EXP_DATA, delay=60)
+        export_worker.flush()
+
+        assert calls == [DataManager.EXP_DATA]
+        path = Exporter(exp1).csv_dir / "exp_data.csv"
+        sids = [row["exp_session_id"] for row in read(path)]
+        assert sids == [exp1.session_id, exp2.session_id, exp3.session_id]
+
+    def test_finish_does_not_wait_for_export(self, exp_factory):
+        exp = exp_factory()
+        exp.config.set("data", "export_delay", "60")
+        exp.finish()
+
+        path = Exporter(exp).csv_dir / "exp_data.csv"
+        assert not path.exists()
+
+        export_worker.flush()
+        assert [row["exp_session_id"] for row in read(path)] == [exp.session_id]
+
+
+def test_export_command(exp_factory, tmp_path):
+    exp1 = exp_factory()
+    exp2 = exp_factory()
+
+    cmd = ["alfred3", "export", f"--path={tmp_path}", "--dtype=exp_data", "--dtype=move_history"]
+    subprocess.run(cmd, check=True)
+
+    path = tmp_path / "data" / "exp_data.csv"
+    sids = sorted(row["exp_session_id"] for row in read(path))
+    assert sids == sorted([exp1.session_id, exp2.session_id])
+    assert Exporter.header_path(path).exists()
+    assert (tmp_path / "data" / "move_history.csv").exists()
+
+
+@pytest.fixture
+def json_dir(exp_factory, tmp_path):
+    exp = exp_factory()
+    doc = json.loads(next((tmp_path / "save" / "exp").glob("*.json")).read_text())
+
+    directory = tmp_path / "json"
+    directory.mkdir()
+    for i in range(25):
+        doc["exp_session_id"] = f"session-{i}"
+        doc["additional_data"] = {f"var{i % 3}": i}
+        (directory / f"{i}.json").write_text(json.dumps(doc))
+
+    doc["exp_session_id"] = "segment-session"
+    record = {"key": "segment-session", "doc": doc}
+    (directory / "segment_0000.jsonl").write_text(json.dumps(record) + "\n")
+    yield directory
+
+
+class TestExtractor:
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_exp_data(self, json_dir, tmp_path, workers):
+        ex = Extractor(in_path=json_dir, out_path=tmp_path, workers=workers)
+        ex.chunksize = 4
+        csvname = ex.extract_exp_data()
+
+        docs = list(DataManager.iterate_local_data(DataManager.EXP_DATA, json_dir))
+        with open(tmp_path / csvname, encoding="utf-8", newline="") as f:
+            reader = csv.DictReader(f, delimiter=";")
+            rows = list(reader)
+
+        assert reader.fieldnames == DataManager.extract_ordered_fieldnames(docs)
+        assert [row["exp_session_id"] for row in rows] == [doc["exp_session_id"] for doc in docs]
+
+    def test_files_are_read_once(self, json_dir, tmp_path, monkeypatch):
+        read = []
+        read_local_file = DataManager.read_local_file
+        monkeypatch.setattr(
+            DataManager, "read_local_file", lambda fp, data_type: read.append(fp) or read_local_file(fp, data_type)
+        )
+
+        ex = Extractor(in_path=json_dir, out_path=tmp_path, workers=1)
+        csvname = ex.extract_exp_data()
+
+        assert len(read) == 25
+        with open(tmp_path / csvname, encoding="utf-8", newline="") as f:
+            assert len(list(csv.DictReader(f, delimiter=";"))) == 26
+
+    def test_mongo_id_is_removed(self, json_dir, tmp_path):
+        doc = json.loads((json_dir / "0.json").read_text())
+        doc["_id"] = "mongo-id"
+        (json_dir / "0.json").write_text(json.dumps(doc))
+
+        ex = Extractor(in_path=json_dir, out_path=tmp_path, workers=1)
+        rows = list(ex._rows(lambda doc: [doc], DataManager.EXP_DATA))
+        assert len(rows) == 26
+        assert not any("_id" in row for row in rows)
+
+    def test_parallel_output_equals_sequential(self, json_dir, tmp_path):
+        names = []
+        for workers in (1, 3):
+            ex = Extractor(in_path=json_dir, out_path=tmp_path, workers=workers)
+            ex.chunksize = 2
+            names.append(ex.extract_move_history())
+
+        first, second = (tmp_path / name for name in names)
+        assert first.read_text() == second.read_text()
+        assert len(read(first)) == 26 * len(json.loads((json_dir / "0.json").read_text())["exp_move_history"])
@@ -7,6 +7,7 @@ import pytest
 import alfred3 as al
 
 from alfred3.testutil import *
+from alfred3.export import export_worker
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -49,6 +50,7 @@ class TestHelloWorld:
     def test_local_data_export(self, client, tmp_path):
         client.get("/start", follow_redirects=True)
         forward(client)
+        export_worker.flush()
 
         contents = [p.name for p in tmp_path.iterdir()]
         assert "data" in contents
@@ -0,0 +1,133 @@
+"""
+Tests for serving several experiment sessions from one local server.
+"""
+
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from alfred3.localserver import SessionRegistry, Script
+from alfred3.run import ThreadPoolServer
+from alfred3.testutil import get_app, forward
+
+
+@pytest.fixture
+def app(tmp_path):
+    script = "tests/res/script-basic_movement.py"
+    app = get_app(tmp_path, script_path=script, secrets_path="")
+    yield app
+
+
+def fake_session(sid: str, timeout: int = None):
+    return SimpleNamespace(session_id=sid, session_timeout=timeout)
+
+
+class TestSessionRegistry:
+
+    def test_get(self):
+        registry = SessionRegistry()
+        registry.add(fake_session("a"), log=None)
+
+        assert registry.get("a").exp_session.session_id == "a"
+        assert registry.get("b") is None
+
+    def test_lru_eviction(self):
+        registry = SessionRegistry(maxsize=2)
+        registry.add(fake_session("a"), log=None)
+        registry.add(fake_session("b"), log=None)
+        registry.get("a")
+        registry.add(fake_session("c"), log=None)
+
+        assert "a" in registry
+        assert "b" not in registry
+        assert "c" in registry
+
+    def test_idle_eviction(self):
+        registry = SessionRegistry()
+        entry = registry.add(fake_session("a", timeout=10), log=None)
+        entry.last_access -= 11
+
+        assert registry.get("a") is None
+        assert len(registry) == 0
+
+    def test_idle_timeout_fallback(self):
+        registry = SessionRegistry(idle_timeout=10)
+        registry.add(fake_session("a"), log=None)
+        entry = registry.add(fake_session("b"), log=None)
+        entry.last_access -= 11
+        registry.evict()
+
+        assert "a" in registry
+        assert "b" not in registry
+
+
+class TestMultipleSessions:
+
+    def test_sessions_are_independent(self, app):
+        client1 = app.test_client()
+        client2 = app.test_client()
+        client1.get("/start", follow_redirects=True)
+        client2.get("/start", follow_redirects=True)
+        forward(client1)
+
+        sessions = [entry.exp_session for entry in Script.sessions._sessions.values()]
+        current_pages = sorted(exp.current_page.name for exp in sessions)
+        assert current_pages == ["Page1", "Page2"]
+
+    def test_experiment_without_session_redirects_to_start(self, app):
+        with app.test_client() as client:
+            client.get("/experiment", follow_redirects=True)
+            assert len(Script.sessions) == 1
+
+
+class TestThreadPoolServer:
+
+    def test_concurrent_requests(self):
+        barrier = threading.Barrier(4, timeout=5)
+
+        def app(environ, start_response):
+            # only returns, if four requests are handled at the same time
+            barrier.wait()
+            start_response("200 OK", [("Content-Type", "text/plain")])
+            return [b"ok"]
+
+        server = ThreadPoolServer("127.0.0.1", 0, app, threads=4)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+
+        url = f"http://127.0.0.1:{server.server_port}/"
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(lambda _: urllib.request.urlopen(url).read(), range(4)))
+
+        server.shutdown()
+        thread.join()
+        assert results == [b"ok"] * 4
+
+    def test_worker_closes_server_before_draining(self, monkeypatch):
+        import alfred3.run as run
+
+        calls = []
+
+        class FakeServer:
+            def __init__(self, *args, **kwargs):
+                pass
+
+            def serve_forever(self):
+                calls.append("serve")
+
+            def server_close(self):
+                calls.append("close")
+
+        monkeypatch.setattr(run, "ThreadPoolServer", FakeServer)
+        monkeypatch.setattr(run.signal, "signal", lambda *args: None)
+        monkeypatch.setattr(run.saving_agent, "stop_saving_thread", lambda: calls.append("saves"))
+        monkeypatch.setattr(run.export_worker, "flush", lambda: calls.append("exports"))
+
+        runner = run.ExperimentRunner.__new__(run.ExperimentRunner)
+        runner.app = None
+        runner._serve_worker("127.0.0.1", 0, threads=1)
+
+        assert calls == ["serve", "close", "saves", "exports"]
@@ -181,6 +181,61 @@ class TestBasicMovement:
         assert not "test2: on_first_hide executed" in caplog.text
         assert not "test2: on_each_show executed" in caplog.text
 
+
+class TestSkipping:
+
+    def test_skip_hidden_section(self, blank_exp):
+        exp = blank_exp
+        calls = []
+
+        class HiddenSection(al.Section):
+            def showif(self):
+                calls.append(self.name)
+                return False
+
+        class CountingPage(al.Page):
+            def showif(self):
+                calls.append(self.name)
+                return True
+
+        hidden = HiddenSection(name="hidden")
+        for i in range(50):
+            hidden += CountingPage(name=f"hidden{i}")
+
+        exp += al.Page(name="first")
+        exp += hidden
+        exp += al.Page(name="last")
+
+        exp.start()
+        exp.forward()
+        assert exp.current_page.name == "last"
+        assert not any(name.startswith("hidden") and name != "hidden" for name in calls)
+
+        exp.backward()
+        assert exp.current_page.name == "first"
+
+    def test_showif_follows_input(self, blank_exp):
+        exp = blank_exp
+
+        class ShowifPage(al.Page):
+            def showif(self):
+                return self.exp.values.get("el1") == "yes"
+
+        page = al.Page(name="first")
+        page += al.TextEntry(name="el1")
+        exp += page
+        exp += ShowifPage(name="conditional")
+        exp += al.Page(name="last")
+
+        exp.start()
+        assert exp.movement_manager.target_page("forward").name == "last"
+
+        exp.current_page._set_data({"el1": "yes"})
+        assert exp.movement_manager.target_page("forward").name == "conditional"
+
+        exp.forward()
+        assert exp.current_page.name == "conditional"
+
         
 
 class TestCustomMove:
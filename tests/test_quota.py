@@ -1,10 +1,21 @@
+import multiprocessing
+import time
+
 import pytest
-from alfred3.quota import SessionQuota
+from alfred3 import quota as quota_module
+from alfred3.quota import SessionQuota, SessionGroup, lock_metrics
 from alfred3.testutil import get_exp_session, clear_db
 from dotenv import load_dotenv
 
 load_dotenv()
 
+@pytest.fixture(autouse=True)
+def snapshots():
+    quota_module._snapshots.clear()
+    yield quota_module._snapshots
+    quota_module._snapshots.clear()
+
+
 @pytest.fixture
 def exp(tmp_path):
     script = "tests/res/script-hello_world.py"
@@ -131,4 +142,185 @@ class TestQuota:
         quota2 = SessionQuota(1, exp2)
         label = quota2.count()
 
-        assert label == quota2.slot_label
\ No newline at end of file
+        assert label == quota2.slot_label
+
+    def test_count_does_not_lock(self, exp):
+        quota = SessionQuota(3, exp)
+        quota.count()
+
+        data = exp.db_misc.find_one(quota.io.query)
+        assert not data["busy"]
+        assert data["version"] == 2
+
+    def test_count_retries_on_conflict(self, exp_factory):
+        exp1 = exp_factory()
+        exp2 = exp_factory()
+
+        quota1 = SessionQuota(2, exp1)
+        quota2 = SessionQuota(2, exp2)
+
+        # quota1 counts after quota2 loaded the data, but before quota2 saves
+        load = quota2.io.load
+        def load_and_interfere():
+            data = load()
+            if data.version == 1:
+                quota1.count()
+            return data
+
+        quota2.io.load = load_and_interfere
+        quota2.count()
+
+        assert quota2.nopen == 0
+        assert quota2.npending == 2
+
+    def test_conflicts_back_off(self, exp_factory, monkeypatch):
+        quota1 = SessionQuota(2, exp_factory())
+        quota2 = SessionQuota(2, exp_factory())
+
+        load = quota2.io.load
+        def load_and_interfere():
+            data = load()
+            if data.version == 1:
+                quota1.count()
+            return data
+
+        sleeps = []
+        quota2.io.load = load_and_interfere
+        monkeypatch.setattr(quota_module.time, "sleep", sleeps.append)
+        quota2.count()
+
+        assert len(sleeps) == 1
+        assert 0 <= sleeps[0] <= quota2.io.BACKOFF
+
+    def test_expired_lock_is_taken_over(self, exp):
+        quota = SessionQuota(3, exp)
+        lock = {"busy": True, "lock_owner": "crashed", "lock_expires": time.time() - 1}
+        exp.db_misc.update_one(quota.io.query, {"$set": lock})
+
+        start = time.time()
+        with quota.io as data:
+            assert data.lock_owner != "crashed"
+        assert time.time() - start < 1
+
+        data = exp.db_misc.find_one(quota.io.query)
+        assert not data["busy"]
+        assert data["lock_owner"] is None
+
+    def test_legacy_lock_is_held_for_lease(self, exp, monkeypatch):
+        quota = SessionQuota(3, exp)
+        lock = {"busy": True, "lock_owner": None, "lock_expires": None}
+        exp.db_misc.update_one(quota.io.query, {"$set": lock})
+
+        assert quota.io.load_markbusy() is None
+        data = exp.db_misc.find_one(quota.io.query)
+        assert data["busy"]
+        assert data["lock_expires"] > time.time()
+
+        monkeypatch.setattr(quota_module.time, "time", lambda: data["lock_expires"] + 1)
+        assert quota.io.load_markbusy() is not None
+        quota.io.release()
+
+    def test_lock_metrics(self, exp):
+        lock_metrics.reset()
+        quota = SessionQuota(3, exp)
+        with quota.io:
+            pass
+
+        assert lock_metrics.summary()["quota_data:quota"]["count"] == 1
+
+    def test_one_status_query_per_count(self, exp_factory, monkeypatch):
+        for _ in range(3):
+            SessionQuota(5, exp_factory()).count()
+
+        queries = []
+        get_fields = SessionGroup._get_fields_mongo
+        def counting_get_fields(group, exp, fields):
+            queries.append(group.sessions)
+            return get_fields(group, exp, fields)
+        
+        monkeypatch.setattr(SessionGroup, "_get_fields_mongo", counting_get_fields)
+        SessionQuota(5, exp_factory()).count()
+        
+        assert len(queries) == 1
+        assert len(queries[0]) == 3
+
+    def test_properties_do_not_lock(self, exp):
+        quota = SessionQuota(3, exp)
+        with quota.io:
+            assert quota.nopen == 3
+            assert not quota.full
+
+    def test_next_does_not_lock(self, exp):
+        quota = SessionQuota(3, exp)
+        with quota.io:
+            start = time.time()
+            assert quota.next().label == "slot"
+            assert time.time() - start < 1
+
+    def test_status_snapshot(self, exp):
+        quota = SessionQuota(3, exp)
+        quota.status_ttl = 60
+
+        loads = []
+        load = quota.io.load
+        def counting_load():
+            loads.append(1)
+            return load()
+        quota.io.load = counting_load
+
+        assert quota.nopen == 3
+        assert quota.npending == 0
+        assert not quota.full
+        assert quota.nfinished == 0
+        assert len(loads) == 1
+
+        quota.count()
+        assert quota.nopen == 2
+
+    def test_snapshots_are_not_shared_between_sessions(self, exp_factory):
+        quota1 = SessionQuota(3, exp_factory())
+        quota1.status_ttl = 60
+        assert quota1.nopen == 3
+
+        quota2 = SessionQuota(3, exp_factory())
+        quota2.status_ttl = 60
+        quota2.count()
+        assert quota2.nopen == 2
+        assert quota1.nopen == 3
+
+    def test_snapshot_is_not_reused_without_ttl(self, exp, monkeypatch):
+        quota = SessionQuota(3, exp)
+        first = quota.snapshot()
+        monkeypatch.setattr(quota_module.time, "time", lambda: first.timestamp)
+
+        assert quota.snapshot() is not first
+
+
+def count_local(exp, nslots, queue):
+    exp._start()
+    exp._save_data(sync=True)
+    label = SessionQuota(nslots, exp).count()
+    queue.put(label)
+
+
+class TestLocalQuota:
+
+    def test_concurrent_processes(self, tmp_path):
+        script = "tests/res/script-hello_world.py"
+        exps = [get_exp_session(tmp_path, script_path=script, secrets_path="") for _ in range(9)]
+        
+        # forked processes inherit the experiment sessions
+        ctx = multiprocessing.get_context("fork")
+        queue = ctx.Queue()
+        processes = [ctx.Process(target=count_local, args=(exp, 4, queue)) for exp in exps[1:]]
+        for p in processes:
+            p.start()
+        labels = [queue.get(timeout=60) for _ in processes]
+        for p in processes:
+            p.join()
+
+        assert sorted(labels) == ["__ABORTED__"] * 4 + ["slot"] * 4
+
+        quota = SessionQuota(4, exps[0])
+        assert quota.npending == 4
+        assert quota.nopen == 0
@@ -1,10 +1,11 @@
+import copy
 import random
 from typing import Counter
 import pytest
 import time
 
 import alfred3 as al
-from alfred3.quota import SlotManager
+from alfred3.quota import SlotManager, QuotaIO, encode_slots, slot_labels
 from alfred3.randomizer import ConditionInconsistency
 import alfred3.randomizer as rdmzr
 from alfred3.quota import SessionQuota
@@ -559,3 +560,35 @@ class TestSessionGroup:
         c2 = rd2.get_condition()
 
         assert c1 == c2
+
+
+class TestSlotEncoding:
+
+    def test_encode(self):
+        slots = [{"label": "a"}, {"label": "b"}, {"label": "a", "session_groups": [{"sessions": ["s1"]}]}]
+        encoded = encode_slots(slots)
+
+        assert encoded == {"labels": ["a", "b"], "index": [0, 1, 0], "groups": {"2": [["s1"]]}}
+        assert slot_labels(encoded) == slot_labels(slots) == ["a", "b", "a"]
+
+    def test_list_encoding_is_read(self):
+        slots = [{"label": "a", "session_groups": [{"sessions": ["s1"]}]}, {"label": "b"}]
+        manager = SlotManager(slots)
+
+        assert [slot.label for slot in manager.slots] == ["a", "b"]
+        assert manager.find_slot(["s1"]) is manager.slots[0]
+        assert manager.encoded == encode_slots(slots)
+
+    def test_assign_updates_only_assigned_slot(self):
+        before = {"slots": encode_slots([{"label": "a"}] * 1000)}
+        manager = SlotManager(copy.deepcopy(before["slots"]))
+        manager.assign(manager.slots[500], ["s1"])
+        manager.assign(manager.slots[500], ["s2"])
+
+        update = QuotaIO._update(before, {"slots": manager.encoded})
+        assert update == {"$set": {"slots.groups.500": [["s1"], ["s2"]]}}
+
+        before = {"slots": copy.deepcopy(manager.encoded)}
+        manager.assign(manager.slots[500], ["s3"])
+        update = QuotaIO._update(before, {"slots": manager.encoded})
+        assert update == {"$push": {"slots.groups.500": {"$each": [["s3"]]}}}
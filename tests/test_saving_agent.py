@@ -0,0 +1,561 @@
+"""
+Tests for the global saving queue and saving agents.
+"""
+
+import copy
+import json
+import stat
+import threading
+import time
+from types import SimpleNamespace
+
+import bson
+import pytest
+from pymongo import UpdateOne
+
+from alfred3 import saving_agent
+from alfred3.saving_agent import MongoSavingAgent, LocalSavingAgent
+from alfred3.saving_agent import read_segments, compact_segments, write_json_atomic
+from alfred3.saving_agent import SessionIndex
+from alfred3.data_manager import DataManager, get_session_local
+from alfred3.testutil import get_exp_session
+
+mongomock = pytest.importorskip("mongomock")
+
+
+@pytest.fixture
+def exp(tmp_path):
+    script = "tests/res/script-hello_world.py"
+    exp = get_exp_session(tmp_path, script_path=script, secrets_path="")
+    yield exp
+
+
+@pytest.fixture
+def client():
+    yield mongomock.MongoClient()
+
+
+def mongo_agent(exp, client, name: str = "mongo", delta: bool = False):
+    agent = MongoSavingAgent(client=client, database="db", collection="col", experiment=exp, name=name, delta=delta)
+    agent._col = BulkCollection(agent.col)
+    return agent
+
+
+class BulkCollection:
+    """
+    Wraps a mongomock collection, executes bulk writes of ReplaceOne 
+    operations and counts them.
+    """
+
+    def __init__(self, col, delay: float = 0):
+        self.col = col
+        self.delay = delay
+        self.bulk_writes = 0
+
+    def bulk_write(self, requests, **kwargs):
+        time.sleep(self.delay)
+        self.bulk_writes += 1
+        matched, upserted = 0, 0
+        for request in requests:
+            if isinstance(request, UpdateOne):
+                result = self.col.update_one(request._filter, request._doc, upsert=request._upsert)
+            else:
+                result = self.col.replace_one(request._filter, request._doc, upsert=request._upsert)
+            matched += result.matched_count
+            upserted += 1 if result.upserted_id is not None else 0
+        return SimpleNamespace(matched_count=matched, upserted_count=upserted)
+
+    def __getattr__(self, name):
+        return getattr(self.col, name)
+
+
+class TestCoalesce:
+
+    def test_newest_task_per_agent(self, exp):
+        controller = exp.data_saver.main
+        tasks = [
+            (5, 1.0, 1, "a", None, {"v": 1}, controller, "data", 0.0),
+            (5, 3.0, 99, "b", None, {"v": 3}, controller, "data", 0.0),
+            (1, 2.0, 1, "c", None, {"v": 2}, controller, "data", 0.0),
+            (5, 1.0, 1, "d", None, {"v": 1}, controller, "other", 0.0),
+        ]
+
+        coalesced = saving_agent._coalesce(tasks)
+        assert len(coalesced) == 2
+
+        data_task = next(task for task in coalesced if task[7] == "data")
+        assert data_task[5] == {"v": 3}
+        assert data_task[0] == 1
+        assert data_task[2] == 99
+
+    def test_queue_saves_newest_snapshot(self, exp):
+        controller = exp.data_saver.main
+        agent = controller.agents["data"]
+        t = time.time()
+
+        for i in range(5):
+            controller.save_with_agent(data={"v": i}, name="data", level=99, data_time=t + i)
+        saving_agent.wait_for_saving_thread()
+
+        assert agent._latest_save_time == t + 4
+        assert '"v": 4' in agent.file.read_text()
+
+
+class TestMongoBatch:
+
+    def test_bulk_write(self, tmp_path, client):
+        script = "tests/res/script-hello_world.py"
+        sessions = []
+        for i in range(3):
+            path = tmp_path / str(i)
+            path.mkdir()
+            sessions.append(get_exp_session(path, script_path=script, secrets_path=""))
+        
+        agents = [mongo_agent(exp, client) for exp in sessions]
+        col = agents[0].col
+        for agent in agents:
+            agent._col = col
+
+        tasks = [(agent, {"exp_session_id": exp.session_id}, 99, time.time()) for agent, exp in zip(agents, sessions)]
+        results = MongoSavingAgent.save_batch(tasks)
+
+        assert results == [(True, "success")] * 3
+        assert col.bulk_writes == 1
+        assert col.count_documents({}) == 3
+
+    def test_outdated_snapshot_is_rejected(self, exp, client):
+        agent = mongo_agent(exp, client)
+        t = time.time()
+        agent.save_batch([(agent, {"v": 2}, 99, t)])
+        results = agent.save_batch([(agent, {"v": 1}, 99, t - 1)])
+
+        assert results == [(False, "time")]
+        assert agent.col.find_one({"_id": agent.doc_id})["v"] == 2
+
+
+class TestSavingLanes:
+
+    def test_slow_mongo_does_not_block_local_saving(self, exp, client):
+        agent = mongo_agent(exp, client)
+        agent._col.delay = 1
+        controller = exp.data_saver.main
+        controller.append(agent)
+
+        controller.save_with_agent(data={"v": 1}, name="mongo", level=99)
+        
+        start = time.time()
+        controller.save_with_agent(data={"v": 1}, name="data", level=99, sync=True)
+        assert time.time() - start < 0.5
+
+        saving_agent.wait_for_saving_thread()
+        assert agent.col.bulk_writes == 1
+
+    def test_stopped_lane_saves_remaining_tasks(self, exp, monkeypatch):
+        quit_event = threading.Event()
+        monkeypatch.setattr(saving_agent, "_quit_event", quit_event)
+        lane = saving_agent._SavingLane(name="stopped")
+        lane.start()
+        quit_event.set()
+        lane.stop()
+        lane.thread.join(2)
+        assert not lane.thread.is_alive()
+
+        controller = exp.data_saver.main
+        task = (5, time.time(), 99, "id", threading.Event(), {"v": 1}, controller, "data", time.time())
+        lane.put(task)
+
+        assert lane.queue.unfinished_tasks == 0
+        assert task[4].is_set()
+        assert '"v": 1' in controller.agents["data"].file.read_text()
+
+    def test_metrics(self, exp):
+        saving_agent.metrics.reset()
+        controller = exp.data_saver.main
+        controller.save_with_agent(data={"v": 1}, name="data", level=99, sync=True)
+
+        summary = saving_agent.metrics.summary()
+        assert summary["DataSaver"]["count"] == 1
+        assert summary["DataSaver"]["max"] < 1
+
+
+class MeasuringCollection:
+    """
+    Wraps a mongomock collection and measures the bytes that a real
+    database would send back for each full-document save.
+    """
+
+    def __init__(self, col):
+        self.col = col
+        self.received = 0
+
+    def replace_one(self, *args, **kwargs):
+        result = self.col.replace_one(*args, **kwargs)
+        self.received += len(bson.encode({"n": 1, "nModified": 1, "ok": 1.0}))
+        return result
+
+    def find_one_and_replace(self, *args, **kwargs):
+        result = self.col.find_one_and_replace(*args, **kwargs)
+        self.received += len(bson.encode({"value": result, "ok": 1.0}))
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self.col, name)
+
+
+def snapshot(v1, moves: int) -> dict:
+    data = {"exp_session_id": "sid", "exp_save_time": time.time()}
+    data["exp_data"] = {"el1": {"value": v1}, "el2": {"value": "b"}}
+    data["exp_move_history"] = [{"move": i} for i in range(moves)]
+    return data
+
+
+class TestDeltaSaves:
+
+    def test_first_save_is_full(self, exp, client):
+        agent = mongo_agent(exp, client, delta=True)
+        assert agent.delta(snapshot("a", 1)) is None
+
+    def test_delta(self, exp, client):
+        agent = mongo_agent(exp, client, delta=True)
+        agent.save_data(snapshot("a", 1), level=99, data_time=1)
+        
+        update = agent.delta(snapshot("x", 3))
+        assert update["$set"]["exp_data.el1"] == {"value": "x"}
+        assert "exp_data.el2" not in update["$set"]
+        assert update["$push"]["exp_move_history"]["$each"] == [{"move": 1}, {"move": 2}]
+
+    def test_delta_saves_result_in_full_document(self, exp, client):
+        agent = mongo_agent(exp, client, delta=True)
+        agent.save_data(snapshot("a", 1), level=99, data_time=1)
+        agent.save_data(snapshot("b", 2), level=99, data_time=2)
+        data = snapshot("c", 4)
+        data.pop("exp_data")
+        agent.save_data(data, level=99, data_time=3)
+
+        doc = agent.col.find_one({"_id": agent.doc_id})
+        assert doc == data
+
+    def test_delta_batch(self, exp, client):
+        agent = mongo_agent(exp, client, delta=True)
+        agent.save_batch([(agent, snapshot("a", 1), 99, 1)])
+        data = snapshot("b", 2)
+        agent.save_batch([(agent, data, 99, 2)])
+
+        assert agent.col.find_one({"_id": agent.doc_id}) == data
+
+    def test_delta_detects_changes_in_place(self, exp, client):
+        agent = mongo_agent(exp, client, delta=True)
+        data = snapshot("a", 1)
+        data["additional_data"] = {"a": [1]}
+        agent.save_data(data, level=99, data_time=1)
+
+        data["exp_data"]["el1"]["value"] = "x"
+        data["additional_data"]["a"].append(2)
+        agent.save_data(data, level=99, data_time=2)
+
+        data["exp_data"]["el1"]["value"] = "y"
+        update = agent.delta(data)
+        assert update["$set"] == {"exp_data.el1": {"value": "y"}}
+        agent.save_data(data, level=99, data_time=3)
+
+        assert agent.col.find_one({"_id": agent.doc_id}) == data
+        assert agent._delta_base == data
+        assert agent._delta_base["exp_data"]["el1"] is not data["exp_data"]["el1"]
+
+    def test_unchanged_data_is_not_written(self, exp, client):
+        agents = [mongo_agent(exp, client, name=name, delta=True) for name in ("a", "b")]
+        col = agents[0].col
+        agents[1]._col = col
+        data = snapshot("a", 1)
+        for agent in agents:
+            agent.save_data(copy.deepcopy(data), level=99, data_time=1)
+
+        changed = snapshot("b", 2)
+        writes = col.bulk_writes
+        results = MongoSavingAgent.save_batch([(agents[0], copy.deepcopy(data), 99, 2), (agents[1], changed, 99, 2)])
+
+        assert results == [(True, "success")] * 2
+        assert col.bulk_writes == writes + 1
+        assert col.find_one({"_id": agents[1].doc_id}) == changed
+
+    def test_full_save_after_lost_save(self, exp, client):
+        agent = mongo_agent(exp, client, delta=True)
+        agent.save_data(snapshot("a", 1), level=99, data_time=1)
+        agent.col.delete_many({})
+
+        data = snapshot("b", 2)
+        agent.save_data(data, level=99, data_time=2)
+        assert agent.col.find_one({"_id": agent.doc_id}) == data
+
+
+class TestVerification:
+
+    @pytest.mark.parametrize("verify", MongoSavingAgent.verification_strategies)
+    def test_save(self, exp, client, verify):
+        agent = MongoSavingAgent(client=client, database="db", collection="col", experiment=exp, name="mongo", verify=verify)
+        data = snapshot("a", 1)
+        agent.save_data(data, level=99, data_time=1)
+        
+        assert agent.col.find_one({"_id": agent.doc_id}) == data
+
+    def test_invalid_strategy(self, exp, client):
+        with pytest.raises(ValueError):
+            MongoSavingAgent(client=client, database="db", collection="col", experiment=exp, name="mongo", verify="x")
+
+    def test_bandwidth_benchmark(self, exp, client):
+        """
+        Compares the bytes received from the database for 50 saves of a
+        200-element experiment with different verification strategies.
+        """
+        data = {"exp_session_id": exp.session_id, "exp_move_history": []}
+        data["exp_data"] = {
+            f"el{i}": {"value": "x" * 20, "label": f"Label {i}", "page_name": f"page{i // 10}", "element_type": "TextEntry"}
+            for i in range(200)
+        }
+
+        received = {}
+        for verify in MongoSavingAgent.verification_strategies:
+            agent = MongoSavingAgent(client=client, database="db", collection=verify, experiment=exp, name=verify, verify=verify)
+            agent._col = MeasuringCollection(agent.col)
+            
+            for i in range(50):
+                agent.save_data(copy.deepcopy(data), level=99, data_time=i + 1)
+            
+            received[verify] = agent.col.received
+
+        assert received["projection"] < received["document"] / 50
+        assert received["acknowledged"] < received["document"] / 50
+
+
+class TestSegments:
+
+    def segment_agent(self, exp, tmp_path, name: str):
+        agent = LocalSavingAgent(
+            filename=name, directory=tmp_path / "segments", experiment=exp, name=name, segments=True
+        )
+        return agent
+
+    def test_append(self, exp, tmp_path):
+        agent = self.segment_agent(exp, tmp_path, "a")
+        for i in range(3):
+            data = snapshot(str(i), i + 1)
+            data["type"] = DataManager.EXP_DATA
+            agent.save_data(data, level=99, data_time=i + 1)
+
+        files = list((tmp_path / "segments").glob("segment_*"))
+        assert len(files) == 1
+
+        lines = files[0].read_text().splitlines()
+        assert len(lines) == 3
+        assert '"update"' in lines[2]
+
+        docs = list(read_segments(tmp_path / "segments"))
+        assert docs == [data]
+
+        docs = list(DataManager.iterate_local_data(DataManager.EXP_DATA, tmp_path / "segments"))
+        assert docs == [data]
+
+    def test_incomplete_record_is_skipped(self, exp, tmp_path):
+        agent = self.segment_agent(exp, tmp_path, "a")
+        data = snapshot("a", 1)
+        agent.save_data(data, level=99, data_time=1)
+
+        segment = next((tmp_path / "segments").glob("segment_*"))
+        with open(segment, "a") as f:
+            f.write('{"key": "a", "upd')
+
+        assert list(read_segments(tmp_path / "segments")) == [data]
+
+    def test_unchanged_data_is_not_appended(self, exp, tmp_path):
+        agent = self.segment_agent(exp, tmp_path, "a")
+        data = snapshot("a", 1)
+        for i in range(3):
+            agent.save_data(copy.deepcopy(data), level=99, data_time=i + 1)
+
+        assert agent.delta(copy.deepcopy(data)) is saving_agent.UNCHANGED
+        segment = next((tmp_path / "segments").glob("segment_*"))
+        assert len(segment.read_text().splitlines()) == 1
+
+    def test_writers_are_closed(self, exp, tmp_path):
+        agent = self.segment_agent(exp, tmp_path, "a")
+        agent.save_data(snapshot("a", 1), level=99, data_time=1)
+        writer = saving_agent._SegmentWriter.get(agent.directory, agent.segment_size)
+        file = writer.file
+
+        saving_agent._SegmentWriter.close_all()
+        assert file.closed
+        assert saving_agent._SegmentWriter.get(agent.directory, agent.segment_size) is not writer
+
+    def test_compaction(self, exp, tmp_path):
+        agents = [self.segment_agent(exp, tmp_path, name) for name in ("a", "b")]
+        for i in range(3):
+            for agent in agents:
+                agent.save_data(snapshot(agent.name + str(i), i + 1), level=99, data_time=i + 1)
+
+        before = list(read_segments(tmp_path / "segments"))
+        compacted = compact_segments(tmp_path / "segments")
+
+        assert list((tmp_path / "segments").glob("segment_*")) == [compacted]
+        assert list(read_segments(tmp_path / "segments")) == before
+        assert len(compacted.read_text().splitlines()) == 2
+
+
+class TestAtomicWrites:
+
+    def test_write(self, tmp_path):
+        path = tmp_path / "data.json"
+        write_json_atomic(path, {"a": 1}, fsync="never")
+        write_json_atomic(path, {"a": 2}, fsync="never")
+
+        assert json.loads(path.read_text()) == {"a": 2}
+        assert list(tmp_path.iterdir()) == [path]
+
+    def test_failed_write_keeps_old_file(self, tmp_path):
+        path = tmp_path / "data.json"
+        write_json_atomic(path, {"a": 1}, fsync="always")
+
+        with pytest.raises(TypeError):
+            write_json_atomic(path, {"a": object()}, fsync="always")
+
+        assert json.loads(path.read_text()) == {"a": 1}
+        assert list(tmp_path.iterdir()) == [path]
+
+    def test_file_mode(self, tmp_path):
+        path = tmp_path / "data.json"
+        write_json_atomic(path, {"a": 1}, fsync="never")
+        assert stat.S_IMODE(path.stat().st_mode) == 0o666 & ~saving_agent._UMASK
+
+        path.chmod(0o640)
+        write_json_atomic(path, {"a": 2}, fsync="never")
+        assert stat.S_IMODE(path.stat().st_mode) == 0o640
+
+    def test_batched_fsync(self, tmp_path, monkeypatch):
+        synced = []
+        monkeypatch.setattr(saving_agent, "_fsync_path", synced.append)
+
+        for i in range(10):
+            write_json_atomic(tmp_path / "data.json", {"a": i}, fsync="batched", fsync_interval=0.05)
+        time.sleep(0.2)
+
+        synced = [path for path in synced if tmp_path in (path, path.parent)]
+        assert sorted(synced) == [tmp_path, tmp_path / "data.json"]
+
+    def test_invalid_policy(self, tmp_path):
+        with pytest.raises(ValueError):
+            write_json_atomic(tmp_path / "data.json", {}, fsync="sometimes")
+
+    def test_local_agent(self, exp, tmp_path):
+        agent = LocalSavingAgent(
+            filename="a", directory=tmp_path / "local", experiment=exp, fsync="always"
+        )
+        data = snapshot("a", 1)
+        agent.save_data(data, level=99, data_time=1)
+
+        assert json.loads(agent.file.read_text()) == data
+
+
+class TestSessionIndex:
+
+    def save(self, directory, exp, sid: str, finished: bool = False, **kwargs):
+        agent = LocalSavingAgent(filename=sid, directory=directory, experiment=exp, **kwargs)
+        data = snapshot("a", 1)
+        data.update(exp_session_id=sid, type=DataManager.EXP_DATA, exp_finished=finished)
+        agent.save_data(data, level=99, data_time=time.time())
+        return data
+
+    def test_lookup(self, exp, tmp_path):
+        saved = [self.save(tmp_path, exp, f"s{i}", finished=i == 1) for i in range(3)]
+        index = SessionIndex.get(tmp_path)
+
+        entries = index.find(["s1"], DataManager.EXP_DATA)
+        assert len(entries) == 1
+        assert entries[0]["file"] == "s1.json"
+        assert entries[0]["exp_finished"] is True
+        assert list(index.load(["s1", "s2"], DataManager.EXP_DATA)) == saved[1:]
+
+    def test_update(self, exp, tmp_path):
+        self.save(tmp_path, exp, "s1")
+        self.save(tmp_path, exp, "s1", finished=True)
+
+        entries = SessionIndex.get(tmp_path).find(["s1"], DataManager.EXP_DATA)
+        assert [entry["exp_finished"] for entry in entries] == [True]
+
+    def test_segments(self, exp, tmp_path):
+        saved = self.save(tmp_path, exp, "s1", segments=True)
+
+        index = SessionIndex.get(tmp_path)
+        assert index.find(["s1"], DataManager.EXP_DATA)[0]["segment_key"] == "s1"
+        assert list(index.load(["s1"], DataManager.EXP_DATA)) == [saved]
+
+    def test_built_from_existing_files(self, exp, tmp_path):
+        saved = self.save(tmp_path, exp, "s1", session_index=False)
+        assert not (tmp_path / SessionIndex.FILENAME).exists()
+
+        index = SessionIndex(tmp_path)
+        assert list(index.load(["s1"], DataManager.EXP_DATA)) == [saved]
+
+    def test_sessions_saved_without_index(self, exp, tmp_path):
+        self.save(tmp_path, exp, "s1")
+        index = SessionIndex.get(tmp_path)
+        saved = self.save(tmp_path, exp, "s2", session_index=False)
+
+        assert list(index.load(["s2"], DataManager.EXP_DATA)) == [saved]
+        headers = index.headers(DataManager.EXP_DATA)
+        assert sorted(header["exp_session_id"] for header in headers) == ["s1", "s2"]
+
+    def test_files_changed_without_index(self, exp, tmp_path):
+        self.save(tmp_path, exp, "s1")
+        self.save(tmp_path, exp, "s2")
+        index = SessionIndex.get(tmp_path)
+        self.save(tmp_path, exp, "s1", finished=True, session_index=False)
+        (tmp_path / "s2.json").unlink()
+
+        entries = index.find(["s1", "s2"], DataManager.EXP_DATA)
+        assert [entry["exp_finished"] for entry in entries] == [True]
+        assert [header["exp_session_id"] for header in index.headers(DataManager.EXP_DATA)] == ["s1"]
+
+    def test_get_session_local(self, exp, tmp_path):
+        exp.config.read_dict({"local_saving_agent": {"path": str(tmp_path)}})
+        self.save(tmp_path, exp, "s1")
+        SessionIndex.get(tmp_path)
+        saved = self.save(tmp_path, exp, "s2", session_index=False)
+
+        assert get_session_local(exp, "s2") == saved
+
+
+class TestProjection:
+
+    @pytest.fixture
+    def directory(self, exp, tmp_path):
+        for i in range(3):
+            TestSessionIndex().save(tmp_path, exp, f"s{i}")
+        yield tmp_path
+
+    def test_header_fields_are_served_from_index(self, directory, monkeypatch):
+        def fail(*args, **kwargs):
+            raise AssertionError("data files must not be read")
+        
+        monkeypatch.setattr(DataManager, "_read_local_data", fail)
+        monkeypatch.setattr(SessionIndex, "load", fail)
+
+        docs = DataManager.iterate_local_data(
+            DataManager.EXP_DATA, directory, fields=["exp_session_id", "exp_finished"]
+        )
+        assert sorted(docs, key=lambda d: d["exp_session_id"]) == [
+            {"exp_session_id": f"s{i}", "exp_finished": False} for i in range(3)
+        ]
+
+    def test_session_filter(self, directory):
+        docs = DataManager.iterate_local_data(DataManager.EXP_DATA, directory, session_ids=["s1"])
+        assert [doc["exp_session_id"] for doc in docs] == ["s1"]
+
+    @pytest.mark.parametrize("use_index", [True, False])
+    def test_payload_projection(self, directory, use_index):
+        docs = DataManager.iterate_local_data(
+            DataManager.EXP_DATA,
+            directory,
+            fields=["exp_data"],
+            session_ids=["s1", "s2"],
+            use_index=use_index,
+        )
+        assert [list(doc) for doc in docs] == [["exp_data"], ["exp_data"]]
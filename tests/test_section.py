@@ -111,3 +111,160 @@ class TestHideOnForwardSection:
         assert exp.current_page.name == "third"
 
         assert exp.second.is_closed
+
+
+@pytest.fixture
+def exp_local(tmp_path):
+    script = "tests/res/script-shuffle.py"
+    exp = get_exp_session(tmp_path, script_path=script, secrets_path="")
+    yield exp
+
+
+class TestPageIndex:
+
+    def test_index_is_cached(self, exp_local):
+        root = exp_local.root_section
+        assert root.page_index is root.page_index
+        assert root.all_page_names == list(root.all_pages)
+
+    def test_shuffle_invalidates_index(self, exp_local):
+        root = exp_local.root_section
+        index = root.page_index
+
+        random.seed(1)
+        exp_local.start()
+
+        assert root.page_index is not index
+        assert root.all_page_names == list(root.all_pages)
+        for page in exp_local.Main.members.values():
+            assert root.all_pages_list[root.position_of(page.name)] is page
+
+    def test_append_invalidates_index(self, exp_local):
+        root = exp_local.root_section
+        n = len(root.all_page_names)
+
+        exp_local.Main += al.Page(name="new_page")
+
+        assert len(root.all_page_names) == n + 1
+        assert exp_local.movement_manager.page_after(exp_local.Main.p03) is exp_local.Main.new_page
+        assert exp_local.movement_manager.find_page("new_page") is exp_local.Main.new_page
+
+    def test_visibility_invalidates_index(self, exp_local):
+        root = exp_local.root_section
+        index = root.page_index
+        exp_local.Main.p02.should_be_shown = False
+
+        assert root.page_index is not index
+
+    def test_position_of_unknown_page(self, exp_local):
+        with pytest.raises(ValueError):
+            exp_local.root_section.position_of("unknown")
+
+
+class TestRegistry:
+
+    def test_lookup(self, exp_local):
+        assert exp_local.Main is exp_local.root_section.all_members["Main"]
+        assert exp_local["p01"] is exp_local.Main.p01
+        assert exp_local.Main in exp_local
+        assert "p02" in exp_local.root_section
+
+        with pytest.raises(AttributeError):
+            exp_local.unknown_member
+
+    def test_session_lookups_agree(self, exp_local):
+        for name in exp_local.root_section.all_members:
+            assert name in exp_local
+            assert exp_local[name] is getattr(exp_local, name)
+
+    def test_append_section(self, exp_local):
+        sub = al.Section(name="sub")
+        page = al.Page(name="sub_page")
+        page += al.TextEntry(name="sub_entry")
+        sub += page
+
+        exp_local.Main += sub
+
+        assert exp_local.sub_page is page
+        assert exp_local.root_section["sub_page"] is page
+        assert "sub_entry" in exp_local
+        assert "sub" in exp_local.root_section.all_subsections
+
+    def test_append_element(self, exp_local):
+        root = exp_local.root_section
+        assert "new_entry" not in root.all_input_elements
+
+        exp_local.Main.p01 += al.TextEntry(name="new_entry")
+
+        assert "new_entry" in exp_local
+        assert "new_entry" in root.all_elements
+        assert "new_entry" in root.all_input_elements
+
+    def test_cached_dicts_follow_order(self, exp_local):
+        root = exp_local.root_section
+        members = root.all_members
+        assert root.all_members == members
+        assert root.all_members is not members
+
+        random.seed(1)
+        exp_local.start()
+
+        pages = [name for name in root.all_members if name.startswith("p0")]
+        assert pages == list(exp_local.Main.members)
+
+
+class TestDataCache:
+
+    @pytest.fixture
+    def page(self, exp_local):
+        page = al.Page(name="data_page")
+        page += al.TextEntry(name="entry")
+        exp_local.Main += page
+        page._on_showing_widget()
+        return page
+
+    def test_fragment_is_cached(self, page):
+        entry = page.data["entry"]
+        assert entry["value"] is None
+        assert page.data["entry"] is entry
+
+    def test_input_invalidates_fragment(self, page):
+        page._set_data({"entry": "a"})
+        assert page.data["entry"]["value"] == "a"
+
+        page.entry.input = "b"
+        assert page.data["entry"]["value"] == "b"
+
+    def test_append_invalidates_fragment(self, exp_local, page):
+        page += al.Value("v", name="val")
+        assert page.data["val"]["value"] == "v"
+        assert exp_local.data_manager.session_data["exp_data"]["val"]["value"] == "v"
+
+    def test_encrypt_values_does_not_modify_fragment(self, exp_local, page, monkeypatch):
+        page._set_data({"entry": "a"})
+        monkeypatch.setattr(exp_local, "encrypt", lambda value: "encrypted")
+
+        data = exp_local.data_manager.encrypt_values(exp_local.data_manager.session_data)
+
+        assert data["exp_data"]["entry"]["value"] == "encrypted"
+        assert page.data["entry"]["value"] == "a"
+
+    def test_codebook_does_not_modify_fragment(self, exp_local, page):
+        page._set_data({"entry": "a"})
+
+        codebook = exp_local.data_manager.codebook_data
+
+        assert "value" not in codebook["entry"]
+        assert page.data["entry"]["value"] == "a"
+        assert exp_local.values["entry"] == "a"
+
+    def test_move_history_is_cached(self, exp_local):
+        exp_local.start()
+        exp_local.forward()
+        history = exp_local.data_manager.move_history
+        assert len(history) == 1
+
+        exp_local.forward()
+        updated = exp_local.data_manager.move_history
+        assert len(updated) == 2
+        assert updated[0] is history[0]